@@ -0,0 +1,44 @@
+import hashlib
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response, \
+                               patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Return a quoted ETag derived from the given validator parts"""
+    value = ':'.join(str(part) for part in parts)
+    return quote_etag(hashlib.sha1(value.encode('utf-8')).hexdigest())
+
+
+def timestamp(value):
+    """Return a datetime as whole seconds since the epoch, or None"""
+    return timegm(value.utctimetuple()) if value else None
+
+
+def not_modified(request, etag, last_modified=None):
+    """Return a 304 response if the client's copy is still current.
+
+    Returns None when the resource has to be sent.
+    """
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=timestamp(last_modified)
+    )
+    if response is not None:
+        add_validators(response, etag, last_modified)
+
+    return response
+
+
+def add_validators(response, etag, last_modified=None):
+    """Set the validator and caching headers of a response"""
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(timestamp(last_modified))
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Authorization',))
+
+    return response
@@ -0,0 +1,152 @@
+import csv
+import datetime
+import decimal
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from core.models import Bovid
+
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+BOVID_EXPORT_FIELDS = (
+    'id', 'mothers_name', 'fathers_name', 'dam', 'sire', 'type_of_bovid',
+    'breed', 'name', 'breeder', 'price', 'date_of_birth', 'date_of_death',
+    'date_of_purchase', 'date_sold', 'created', 'updated',
+)
+
+LIFEEVENT_EXPORT_FIELDS = (
+    'id', 'bovid', 'event_type', 'notes', 'event_date', 'created',
+)
+
+
+class Echo:
+    """File-like object that returns what is written instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def export_value(value):
+    """Return a value as text the way the API would render it"""
+    if value is None:
+        return ''
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+
+    return value
+
+
+def bovid_rows(queryset, chunk_size=2000):
+    """Yield bovid dicts with their tag names, one chunk at a time.
+
+    Rows are read from a server-side cursor, and the tag names of each
+    chunk are fetched with a single query, so memory stays flat.
+    """
+    BovidTag = Bovid.tags.through
+    rows = queryset.values(*BOVID_EXPORT_FIELDS).iterator(
+        chunk_size=chunk_size
+    )
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield from _with_tag_names(BovidTag, chunk)
+            chunk = []
+    if chunk:
+        yield from _with_tag_names(BovidTag, chunk)
+
+
+def _with_tag_names(through, chunk):
+    """Yield the rows of a chunk with a `tags` list of tag names"""
+    names = {}
+    links = through.objects.filter(
+        bovid_id__in=[row['id'] for row in chunk]
+    ).order_by('tag__name').values_list('bovid_id', 'tag__name')
+    for bovid_id, name in links:
+        names.setdefault(bovid_id, []).append(name)
+
+    for row in chunk:
+        row['tags'] = names.get(row['id'], [])
+        yield row
+
+
+def lifeevent_rows(queryset, chunk_size=2000):
+    """Yield life event dicts from a server-side cursor"""
+    return queryset.values(*LIFEEVENT_EXPORT_FIELDS).iterator(
+        chunk_size=chunk_size
+    )
+
+
+def csv_lines(rows, fields):
+    """Yield CSV encoded lines, starting with a header"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        values = []
+        for field in fields:
+            value = row[field]
+            if isinstance(value, list):
+                value = '|'.join(value)
+            values.append(export_value(value))
+        yield writer.writerow(values)
+
+
+def ndjson_lines(rows, fields):
+    """Yield one JSON document per line"""
+    for row in rows:
+        yield json.dumps(
+            {field: row[field] for field in fields},
+            cls=DjangoJSONEncoder
+        ) + '\n'
+
+
+def encode(lines, compress=False, buffer_size=64 * 1024):
+    """Encode lines to bytes in buffers, gzipping them on the fly"""
+    gzip = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= buffer_size:
+            data = b''.join(buffer)
+            yield gzip.compress(data) if gzip else data
+            buffer, size = [], 0
+
+    data = b''.join(buffer)
+    if gzip:
+        yield gzip.compress(data) + gzip.flush()
+    elif data:
+        yield data
+
+
+def streaming_export(rows, fields, export_format, filename, compress=False):
+    """Return a streaming response for rows in the given format"""
+    if export_format == 'csv':
+        lines = csv_lines(rows, fields)
+    else:
+        lines = ndjson_lines(rows, fields)
+
+    filename = f'{filename}.{export_format}'
+    content_type = EXPORT_FORMATS[export_format]
+    if compress:
+        filename += '.gz'
+        content_type = 'application/gzip'
+
+    response = StreamingHttpResponse(
+        encode(lines, compress),
+        content_type=content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    return response
@@ -0,0 +1,251 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, Exists, Max, OuterRef
+from django.utils.dateparse import parse_date
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from core.models import BOVID_STATUSES, Bovid
+
+
+def param_to_int(params, name):
+    """Return a query parameter as an integer, or None if it is absent"""
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: _('A valid integer is required.')})
+
+
+def param_to_ints(params, name):
+    """Return a comma separated query parameter as a list of distinct
+    integers, or None if it is absent
+    """
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        values = sorted({int(part) for part in value.split(',')})
+    except ValueError:
+        raise ValidationError({
+            name: _('Enter a comma separated list of integers.')
+        })
+    limit = getattr(settings, 'CATTLE_MAX_FILTER_IDS', 100)
+    if len(values) > limit:
+        raise ValidationError({
+            name: _('Enter at most %(limit)d ids.') % {'limit': limit}
+        })
+
+    return values
+
+
+def param_to_date(params, name):
+    """Return a query parameter as a date, or None if it is absent"""
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: _('Enter a valid date (YYYY-MM-DD).')})
+
+    return parsed
+
+
+def param_to_decimal(params, name):
+    """Return a query parameter as a Decimal, or None if it is absent"""
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        parsed = Decimal(value)
+    except InvalidOperation:
+        parsed = None
+    if parsed is None or not parsed.is_finite():
+        raise ValidationError({name: _('A valid number is required.')})
+
+    return parsed
+
+
+class LifeEventFilter(BaseFilterBackend):
+    """Filter life events by bovid, event type and event date range"""
+
+    def filter_queryset(self, request, queryset, view):
+        """Apply the filters present in the query string"""
+        params = request.query_params
+
+        bovid = param_to_int(params, 'bovid')
+        if bovid is not None:
+            queryset = queryset.filter(bovid_id=bovid)
+
+        event_type = params.get('event_type')
+        if event_type:
+            queryset = queryset.filter(event_type=event_type)
+
+        after = param_to_date(params, 'event_date_after')
+        if after is not None:
+            queryset = queryset.filter(event_date__gte=after)
+
+        before = param_to_date(params, 'event_date_before')
+        if before is not None:
+            queryset = queryset.filter(event_date__lte=before)
+
+        return queryset
+
+
+class BovidTagFilter(BaseFilterBackend):
+    """Filter bovids by their tags.
+
+    `tags_any` (or `tags`) keeps bovids with any of the given tags,
+    `tags_all` those with all of them and `tags_none` those with none.
+    Each is a subquery on the bovid-tag table, so a bovid is returned
+    once however many of its tags match.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        """Apply the tag filters present in the query string"""
+        params = request.query_params
+        any_ids = param_to_ints(params, 'tags_any')
+        if any_ids is None:
+            any_ids = param_to_ints(params, 'tags')
+        all_ids = param_to_ints(params, 'tags_all')
+        none_ids = param_to_ints(params, 'tags_none')
+        BovidTag = Bovid.tags.through
+
+        if any_ids is not None:
+            queryset = queryset.annotate(has_any_tag=Exists(
+                BovidTag.objects.filter(
+                    bovid_id=OuterRef('pk'),
+                    tag_id__in=any_ids
+                )
+            )).filter(has_any_tag=True)
+
+        if all_ids is not None:
+            queryset = queryset.filter(pk__in=BovidTag.objects.filter(
+                tag_id__in=all_ids
+            ).values('bovid_id').annotate(
+                matched=Count('tag_id')
+            ).filter(matched=len(all_ids)).values('bovid_id'))
+
+        if none_ids is not None:
+            queryset = queryset.annotate(has_excluded_tag=Exists(
+                BovidTag.objects.filter(
+                    bovid_id=OuterRef('pk'),
+                    tag_id__in=none_ids
+                )
+            )).filter(has_excluded_tag=False)
+
+        return queryset
+
+
+class BovidFilter(BaseFilterBackend):
+    """Filter bovids by date of birth and price range"""
+
+    def filter_queryset(self, request, queryset, view):
+        """Apply the filters present in the query string"""
+        params = request.query_params
+
+        born_after = param_to_date(params, 'date_of_birth_after')
+        if born_after is not None:
+            queryset = queryset.filter(date_of_birth__gte=born_after)
+
+        born_before = param_to_date(params, 'date_of_birth_before')
+        if born_before is not None:
+            queryset = queryset.filter(date_of_birth__lte=born_before)
+
+        price_min = param_to_decimal(params, 'price_min')
+        if price_min is not None:
+            queryset = queryset.filter(price__gte=price_min)
+
+        price_max = param_to_decimal(params, 'price_max')
+        if price_max is not None:
+            queryset = queryset.filter(price__lte=price_max)
+
+        return queryset
+
+
+class BovidFacetFilter(BaseFilterBackend):
+    """Filter bovids by type, breed and status, each of which may be given
+    several times to keep bovids with any of the values, and count the
+    bovids per value for a filter sidebar
+    """
+    facets = ('type_of_bovid', 'breed', 'status')
+
+    def selected(self, params):
+        """Return {facet: set of values} for the facets filtered on"""
+        selected = {}
+        for facet in self.facets:
+            values = {value for value in params.getlist(facet) if value}
+            if values:
+                selected[facet] = values
+        if not selected.get('status', set()) <= set(BOVID_STATUSES):
+            raise ValidationError({'status': _(
+                'Choose from %(statuses)s.'
+            ) % {'statuses': ', '.join(BOVID_STATUSES)}})
+
+        return selected
+
+    def filter_queryset(self, request, queryset, view):
+        """Apply the facet filters present in the query string"""
+        selected = self.selected(request.query_params)
+
+        if 'type_of_bovid' in selected:
+            queryset = queryset.filter(
+                type_of_bovid__in=selected['type_of_bovid']
+            )
+        if 'breed' in selected:
+            queryset = queryset.filter(breed__in=selected['breed'])
+        if 'status' in selected:
+            queryset = queryset.with_status(*selected['status'])
+
+        return queryset
+
+    def counts(self, request, queryset):
+        """Return the facet counts, total count and last update of bovids
+        not filtered by facet yet, from one grouped query.
+
+        Each facet is counted over the bovids matching the values chosen
+        for the other facets, so the sidebar still shows how many bovids
+        choosing another value of the same facet would add.
+        """
+        selected = self.selected(request.query_params)
+        groups = queryset.prefetch_related(None).annotate_status().values(
+            *self.facets
+        ).annotate(
+            count=Count('id'),
+            last_updated=Max('updated')
+        ).order_by()
+
+        counts = {facet: {} for facet in self.facets}
+        total, last_updated = 0, None
+        for group in groups:
+            total += group['count']
+            if last_updated is None or group['last_updated'] > last_updated:
+                last_updated = group['last_updated']
+            for facet in self.facets:
+                if all(group[other] in values
+                       for other, values in selected.items()
+                       if other != facet):
+                    value = group[facet]
+                    counts[facet][value] = \
+                        counts[facet].get(value, 0) + group['count']
+
+        facets = {
+            facet: [
+                {'value': value, 'count': count}
+                for value, count in sorted(
+                    values.items(),
+                    key=lambda item: (-item[1], item[0])
+                )
+            ]
+            for facet, values in counts.items()
+        }
+
+        return facets, total, last_updated
@@ -0,0 +1,218 @@
+import json
+from base64 import b64decode, b64encode
+from functools import reduce
+from operator import or_
+from urllib import parse
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """Opt-in keyset pagination over a stable, indexed ordering.
+
+    Pagination only kicks in when the client sends a `cursor` or
+    `page_size` query parameter, so existing clients keep receiving the
+    full list. The cursor holds every ordering value of the row it
+    points at and pages are filtered on the whole tuple, so rows tied on
+    the first fields are neither skipped nor repeated. No COUNT(*) and
+    no OFFSET are issued, so every page costs the same.
+    """
+    page_size = getattr(settings, 'CATTLE_PAGE_SIZE', 100)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'CATTLE_MAX_PAGE_SIZE', 1000)
+    ordering = ('-created', '-id')
+
+    def is_requested(self, request):
+        """Return True if the client asked for a paginated response"""
+        params = request.query_params
+        return (self.cursor_query_param in params or
+                self.page_size_query_param in params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return the page after or, for a previous link, before the
+        cursor's row, or None unless the client opted in
+        """
+        if not self.is_requested(request):
+            return None
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        reverse, position = self.decode_cursor(request, queryset)
+        ordering = self.ordering
+        if reverse:
+            ordering = [flip(field) for field in ordering]
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(after(ordering, position))
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = len(results) > len(self.page)
+        if reverse:
+            self.page.reverse()
+        self.has_next = position is not None if reverse else following
+        self.has_previous = following if reverse else position is not None
+
+        return self.page
+
+    def decode_cursor(self, request, queryset):
+        """Return (reverse, position) of the request's cursor, position
+        None on the first page. The values are converted by the fields
+        of the ordering, so a tampered cursor is a 404.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return False, None
+
+        try:
+            tokens = parse.parse_qs(
+                b64decode(encoded.encode('ascii')).decode('ascii'),
+                keep_blank_values=True
+            )
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+            position = json.loads(tokens['p'][0])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or \
+                len(position) != len(self.ordering) or None in position:
+            raise NotFound(self.invalid_cursor_message)
+
+        try:
+            position = [
+                ordering_field(queryset, field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (DjangoValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return reverse, position
+
+    def encode_cursor(self, reverse, instance):
+        """Return the URL of the page after, or before when reverse, an
+        instance or values() row
+        """
+        position = [
+            str(instance[field] if isinstance(instance, dict)
+                else getattr(instance, field))
+            for field in (field.lstrip('-') for field in self.ordering)
+        ]
+        tokens = {'p': json.dumps(position)}
+        if reverse:
+            tokens['r'] = '1'
+        encoded = b64encode(
+            parse.urlencode(tokens, doseq=True).encode('ascii')
+        ).decode('ascii')
+
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+
+        return self.encode_cursor(False, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+
+        return self.encode_cursor(True, self.page[0])
+
+
+def ordering_field(queryset, name):
+    """Return the model field or annotation output field of a name"""
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+
+    return queryset.model._meta.get_field(name)
+
+
+def flip(field):
+    """Return an ordering field in the opposite direction"""
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def after(ordering, position):
+    """Return a filter for the rows after a position in an ordering:
+    greater on the first field, or equal on it and after on the rest
+    """
+    conditions = []
+    for index, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        equal = {
+            other.lstrip('-'): value
+            for other, value in zip(ordering[:index], position)
+        }
+        conditions.append(
+            Q(**equal, **{f'{name}__{lookup}': position[index]})
+        )
+
+    return reduce(or_, conditions)
+
+
+class BovidKeysetPagination(KeysetPagination):
+    """Keyset pagination for bovids in the ?ordering= order, best match
+    first when searching
+    """
+    search_ordering = ('-search_rank', '-id')
+    # Unknown dates of birth sort as the oldest, see BovidViewSet
+    orderings = {
+        'age': ('-birth_order', '-id'),
+        '-age': ('birth_order', 'id'),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+        'name': ('name', 'id'),
+        '-name': ('-name', '-id'),
+    }
+
+    def requested_ordering(self, request):
+        """Return the ordering fields the client asked for"""
+        params = request.query_params
+        ordering = params.get('ordering')
+        if ordering:
+            if ordering not in self.orderings:
+                raise ValidationError({'ordering': _(
+                    'Choose from %(orderings)s.'
+                ) % {'orderings': ', '.join(self.orderings)}})
+            return self.orderings[ordering]
+        if params.get('search', '').strip():
+            return self.search_ordering
+
+        return self.ordering
+
+    def get_ordering(self, request, queryset, view):
+        return self.requested_ordering(request)
+
+
+class TagKeysetPagination(KeysetPagination):
+    """Keyset pagination for tags, which are listed by name"""
+    ordering = ('-name', '-id')
+
+
+class TimelinePagination(KeysetPagination):
+    """Keyset pagination for a bovid's events, most recent first.
+
+    The timeline is a new endpoint, so it is always paginated.
+    """
+    ordering = ('-event_date', '-id')
+
+    def is_requested(self, request):
+        return True
@@ -1,6 +1,27 @@
-from rest_framework import serializers
+import decimal
+from datetime import timedelta
 
-from core.models import Tag, LifeEvent, Bovid
+from django.conf import settings
+from django.core.files import File
+from django.core.validators import validate_image_file_extension
+from django.db import connection
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from core import images, pedigree, statistics
+from core.cache import herd_cache
+from core.models import Tag, LifeEvent, Bovid, BovidPhoto, UploadSession
+
+
+def image_too_large_message():
+    """Return the error for images over BOVID_IMAGE_MAX_SIZE"""
+    return _('Images may be at most {size} MB.').format(
+        size=settings.BOVID_IMAGE_MAX_SIZE // (1024 * 1024)
+    )
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -17,23 +38,301 @@ class LifeEventSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = LifeEvent
-        fields = ('id', 'user', 'event_type', 'notes', 'event_date')
-        read_only_fields = ('id', )
+        fields = ('id', 'user', 'bovid', 'event_type', 'notes', 'event_date')
+        read_only_fields = ('id', 'user')
+
+    def validate_bovid(self, bovid):
+        """Check the bovid belongs to the user"""
+        if bovid.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError(_('Bovid not found.'))
+
+        return bovid
+
+
+class HerdEventSerializer(serializers.Serializer):
+    """Serializer for recording one life event for a group of bovids.
+
+    Exactly one selector is required: explicit `bovids` ids, `tags` ids
+    (bovids with any of the tags) or `living` for the whole living herd.
+    """
+    event_type = serializers.CharField(max_length=100)
+    notes = serializers.CharField(required=False, allow_blank=True)
+    event_date = serializers.DateField()
+    bovids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        allow_empty=False
+    )
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        allow_empty=False
+    )
+    living = serializers.BooleanField(required=False)
+
+    def validate(self, attrs):
+        """Check exactly one selector is given and it is the user's"""
+        selectors = [
+            name for name in ('bovids', 'tags', 'living') if attrs.get(name)
+        ]
+        if len(selectors) != 1:
+            raise serializers.ValidationError(
+                _('Select the bovids with exactly one of bovids, tags '
+                  'or living.')
+            )
+
+        user = self.context['request'].user
+        for name, model in (('bovids', Bovid), ('tags', Tag)):
+            requested = set(attrs.get(name, []))
+            known = set(model.objects.filter(
+                user=user,
+                id__in=requested
+            ).values_list('id', flat=True))
+            if requested - known:
+                raise serializers.ValidationError({name: [
+                    _('Invalid pk "{pk_value}" - object does not exist.')
+                    .format(pk_value=pk) for pk in sorted(requested - known)
+                ]})
+
+        return attrs
+
+    def get_bovids(self, user, validated_data):
+        """Return a queryset of the selected bovid ids"""
+        queryset = Bovid.objects.filter(user=user)
+        if validated_data.get('bovids'):
+            queryset = queryset.filter(id__in=validated_data['bovids'])
+        elif validated_data.get('tags'):
+            queryset = queryset.filter(tags__id__in=validated_data['tags'])
+        else:
+            queryset = queryset.living()
+
+        return queryset.values_list('id', flat=True).distinct()
+
+    def create(self, validated_data):
+        """Insert one event per selected bovid with INSERT ... SELECT and
+        return the number of events created
+        """
+        user = self.context['request'].user
+        select_sql, select_params = self.get_bovids(
+            user,
+            validated_data
+        ).query.sql_with_params()
+
+        meta = LifeEvent._meta
+        qn = connection.ops.quote_name
+        values = (
+            ('event_type', validated_data['event_type']),
+            ('notes', validated_data.get('notes', '')),
+            ('event_date', validated_data['event_date']),
+            ('created', timezone.now()),
+            ('user', user.id),
+        )
+        columns = [meta.get_field(name).column for name, value in values]
+        params = [
+            meta.get_field(name).get_db_prep_save(value, connection)
+            for name, value in values
+        ]
+        sql = (
+            f'INSERT INTO {qn(meta.db_table)} '
+            f'({", ".join(qn(column) for column in columns)}, '
+            f'{qn(meta.get_field("bovid").column)}) '
+            f'SELECT {", ".join(["%s"] * len(params))}, herd.{qn("id")} '
+            f'FROM ({select_sql}) herd'
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + list(select_params))
+            created = cursor.rowcount
+        # The raw insert sends no post_save signals
+        herd_cache.bump(user.id)
+
+        return created
 
 
 class BovidSerializer(serializers.ModelSerializer):
     """Serializer for bovid object"""
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Bovid
         fields = (
-                'id', 'mothers_name', 'fathers_name',
+                'id', 'mothers_name', 'fathers_name', 'dam', 'sire',
                 'type_of_bovid', 'breed', 'name', 'breeder',
                 'price', 'date_of_birth', 'date_of_death',
                 'date_of_purchase', 'date_sold', 'created',
-                'updated', 'tags', 'user')
+                'updated', 'tags', 'user', 'image_variants')
         read_only_fields = ('id', 'created')
 
+    def get_image_variants(self, bovid):
+        """Return the thumb, card and full image URLs once generated"""
+        return images.variant_urls(bovid)
+
+    def validate_parent(self, parent):
+        """Check a parent is one of the user's bovids"""
+        if parent is not None and \
+                parent.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError(_('Bovid not found.'))
+
+        return parent
+
+    validate_dam = validate_parent
+    validate_sire = validate_parent
+
+    def validate(self, attrs):
+        """Check a bovid does not descend from itself, and name parents
+        from the herd unless names are given
+        """
+        parents = {
+            field: attrs[field] for field in ('dam', 'sire')
+            if attrs.get(field)
+        }
+        if parents and self.instance is not None:
+            own = pedigree.descendant_ids(
+                self.instance.user_id,
+                self.instance.id,
+                settings.PEDIGREE_MAX_GENERATIONS
+            )
+            errors = {
+                field: _('A bovid cannot descend from itself.')
+                for field, parent in parents.items() if parent.id in own
+            }
+            if errors:
+                raise serializers.ValidationError(errors)
+
+        for field, name_field in (('dam', 'mothers_name'),
+                                  ('sire', 'fathers_name')):
+            if field in parents and name_field not in attrs:
+                attrs[name_field] = parents[field].name
+
+        return attrs
+
+
+def is_iso_8601(output_format):
+    """Return True if a date or time field format is ISO 8601"""
+    return output_format is not None and output_format.lower() == ISO_8601
+
+
+class BovidValuesSerializer:
+    """Read-only BovidSerializer for lists, serializing values() rows.
+
+    Model instances and the per-field machinery of ModelSerializer cost
+    most of the time of a long list. This reads the serialized columns
+    with values(), the tag ids of all rows with one more query, and
+    converts each value with a converter compiled once from the fields
+    of BovidSerializer, so the rendered output is the same.
+    """
+    serializer_class = BovidSerializer
+
+    @cached_property
+    def fields(self):
+        """Return (name, column, converter) of each serialized field, no
+        converter where values are output as read
+        """
+        return [
+            (name, field.source, self.converter(field))
+            if name not in ('tags', 'image_variants') else (name, 'id', None)
+            for name, field in self.serializer_class().fields.items()
+        ]
+
+    @cached_property
+    def columns(self):
+        """Return the columns to read"""
+        return list(dict.fromkeys(
+            [column for _, column, _ in self.fields] +
+            ['image', 'image_variants_ready']
+        ))
+
+    def converter(self, field):
+        """Return a function giving the representation of a non-null
+        value of a field, or None where the value itself is output
+        """
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and \
+                field.pk_field is None:
+            return None
+        if type(field) in (serializers.CharField, serializers.IntegerField,
+                           serializers.BooleanField):
+            return None
+
+        if isinstance(field, serializers.DateTimeField) and is_iso_8601(
+            getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        ):
+            def convert(value):
+                value = field.enforce_timezone(value).isoformat()
+                if value.endswith('+00:00'):
+                    value = value[:-6] + 'Z'
+                return value
+            return convert
+        if isinstance(field, serializers.DateField) and is_iso_8601(
+            getattr(field, 'format', api_settings.DATE_FORMAT)
+        ):
+            return str
+        if isinstance(field, serializers.DecimalField) and \
+                field.decimal_places is not None and \
+                not field.localize and getattr(
+                    field, 'coerce_to_string',
+                    api_settings.COERCE_DECIMAL_TO_STRING
+                ):
+            context = decimal.getcontext().copy()
+            if field.max_digits is not None:
+                context.prec = field.max_digits
+            exponent = decimal.Decimal('.1') ** field.decimal_places
+            return lambda value: '{:f}'.format(value.quantize(
+                exponent, rounding=field.rounding, context=context
+            ))
+
+        return field.to_representation
+
+    def rows(self, queryset, *fields):
+        """Return the values() of a bovid queryset, with more fields
+        such as those a paginator orders by
+        """
+        return queryset.prefetch_related(None).values(
+            *dict.fromkeys(self.columns + list(fields))
+        )
+
+    def to_representation(self, rows):
+        """Return the serialized list of values() rows"""
+        rows = list(rows)
+        tags = {}
+        links = Bovid.tags.through.objects.filter(
+            bovid_id__in=[row['id'] for row in rows]
+        ).order_by('bovid_id', 'tag_id').values_list('bovid_id', 'tag_id')
+        for bovid_id, tag_id in links:
+            tags.setdefault(bovid_id, []).append(tag_id)
+
+        fields = self.fields
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert in fields:
+                value = row[column]
+                if convert is not None and value is not None:
+                    value = convert(value)
+                item[name] = value
+            item['tags'] = tags.get(row['id'], [])
+            item['image_variants'] = images.image_variant_urls(
+                row['image'], row['image_variants_ready']
+            )
+            data.append(item)
+
+        return data
+
+
+bovid_values_serializer = BovidValuesSerializer()
+
+
+class PedigreeSerializer(serializers.ModelSerializer):
+    """Serializer for the relatives of a bovid with their generation"""
+    generation = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Bovid
+        fields = (
+            'id', 'name', 'type_of_bovid', 'breed', 'date_of_birth',
+            'dam', 'sire', 'mothers_name', 'fathers_name', 'generation'
+        )
+        read_only_fields = fields
+
 
 class BovidDetailSerializer(BovidSerializer):
     """Serializer for bovid object"""
@@ -41,6 +340,134 @@ class BovidDetailSerializer(BovidSerializer):
     tags = TagSerializer(many=True, read_only=True)
 
 
+class BovidBulkListSerializer(serializers.ListSerializer):
+    """Validate and create many bovids with a constant number of queries"""
+    batch_size = 500
+
+    def to_internal_value(self, data):
+        """Validate every row, then check all their tags and all their
+        parents in one query each
+        """
+        if not isinstance(data, list):
+            raise serializers.ValidationError({
+                'non_field_errors': [_('Expected a list of items.')]
+            })
+        limit = getattr(settings, 'CATTLE_BULK_CREATE_LIMIT', 5000)
+        if not data or len(data) > limit:
+            raise serializers.ValidationError({
+                'non_field_errors': [
+                    _('Send between 1 and {limit} items.').format(limit=limit)
+                ]
+            })
+
+        rows, errors = [], []
+        for item in data:
+            try:
+                rows.append(self.child.run_validation(item))
+                errors.append({})
+            except serializers.ValidationError as exc:
+                rows.append(None)
+                errors.append(exc.detail)
+
+        requested = {
+            tag_id for row in rows if row for tag_id in row.get('tags', [])
+        }
+        known = set(Tag.objects.filter(
+            user=self.context['request'].user,
+            id__in=requested
+        ).values_list('id', flat=True))
+        for row, row_errors in zip(rows, errors):
+            unknown = [
+                tag_id for tag_id in (row or {}).get('tags', [])
+                if tag_id not in known
+            ]
+            if unknown:
+                row_errors['tags'] = [
+                    _('Invalid pk "{pk_value}" - object does not exist.')
+                    .format(pk_value=tag_id) for tag_id in unknown
+                ]
+
+        parent_fields = (('dam_id', 'dam', 'mothers_name'),
+                         ('sire_id', 'sire', 'fathers_name'))
+        requested = {
+            row[key] for row in rows if row
+            for key, _field, _name in parent_fields if row.get(key)
+        }
+        names = dict(Bovid.objects.filter(
+            user=self.context['request'].user,
+            id__in=requested
+        ).values_list('id', 'name')) if requested else {}
+        for row, row_errors in zip(rows, errors):
+            for key, field, name_field in parent_fields:
+                parent_id = (row or {}).get(key)
+                if parent_id is None:
+                    continue
+                if parent_id not in names:
+                    row_errors[field] = [_('Bovid not found.')]
+                elif name_field not in row:
+                    row[name_field] = names[parent_id]
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        return rows
+
+    def create(self, validated_data):
+        """Insert the bovids and their tag links in batches"""
+        user = self.context['request'].user
+        tag_ids = [set(row.pop('tags', [])) for row in validated_data]
+        bovids = Bovid.objects.bulk_create(
+            [Bovid(user=user, **row) for row in validated_data],
+            batch_size=self.batch_size
+        )
+
+        BovidTag = Bovid.tags.through
+        BovidTag.objects.bulk_create(
+            [
+                BovidTag(bovid_id=bovid.id, tag_id=tag_id)
+                for bovid, ids in zip(bovids, tag_ids)
+                for tag_id in ids
+            ],
+            batch_size=self.batch_size
+        )
+        # bulk_create sends no post_save signals
+        statistics.record_created(bovids)
+        herd_cache.bump(user.id)
+
+        return bovids
+
+
+class BovidBulkSerializer(BovidSerializer):
+    """Serializer for one row of a bulk bovid create. Tags and parents
+    are plain ids, checked for all rows at once by BovidBulkListSerializer
+    """
+
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False
+    )
+    dam = serializers.IntegerField(
+        source='dam_id',
+        required=False,
+        allow_null=True
+    )
+    sire = serializers.IntegerField(
+        source='sire_id',
+        required=False,
+        allow_null=True
+    )
+
+    class Meta(BovidSerializer.Meta):
+        read_only_fields = ('id', 'created', 'user')
+        list_serializer_class = BovidBulkListSerializer
+
+    def validate_parent(self, parent_id):
+        return parent_id
+
+    validate_dam = validate_parent
+    validate_sire = validate_parent
+
+
 class BovidImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to bovine"""
 
@@ -48,3 +475,89 @@ class BovidImageSerializer(serializers.ModelSerializer):
         model = Bovid
         fields = ('id', 'image')
         read_only_fields = ('id',)
+
+    def validate_image(self, image):
+        """Check the image is within BOVID_IMAGE_MAX_SIZE"""
+        if image.size > settings.BOVID_IMAGE_MAX_SIZE:
+            raise serializers.ValidationError(image_too_large_message())
+
+        return image
+
+    def update(self, instance, validated_data):
+        """Replace the image and generate its variants in the background"""
+        instance.image_variants_ready = False
+        bovid = super().update(instance, validated_data)
+        images.schedule_variants(bovid)
+
+        return bovid
+
+
+class BovidPhotoSerializer(serializers.ModelSerializer):
+    """Serializer for gallery photos"""
+    image_variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BovidPhoto
+        fields = (
+            'id', 'bovid', 'caption', 'image', 'image_variants', 'created'
+        )
+        read_only_fields = ('id', 'bovid', 'image', 'created')
+
+    def get_image_variants(self, photo):
+        """Return the thumb, card and full image URLs once generated"""
+        return images.variant_urls(photo)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer for resumable photo upload sessions"""
+    chunk_count = serializers.IntegerField(read_only=True)
+    missing_chunks = serializers.SerializerMethodField()
+    sha256 = serializers.RegexField(
+        r'^[0-9a-f]{64}$',
+        required=False,
+        allow_blank=True
+    )
+
+    class Meta:
+        model = UploadSession
+        fields = (
+            'id', 'bovid', 'filename', 'caption', 'size', 'sha256',
+            'chunk_size', 'chunk_count', 'missing_chunks', 'expires'
+        )
+        read_only_fields = ('id', 'chunk_size', 'expires')
+
+    def get_missing_chunks(self, session):
+        """Return the indexes of the chunks still to be sent"""
+        return session.missing_chunks()
+
+    def validate_bovid(self, bovid):
+        """Check the bovid belongs to the user"""
+        if bovid.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError(_('Bovid not found.'))
+
+        return bovid
+
+    def validate_filename(self, filename):
+        """Check the name has the extension of an image format"""
+        validate_image_file_extension(File(None, filename))
+
+        return filename
+
+    def validate_size(self, size):
+        """Check the photo is not empty or over BOVID_IMAGE_MAX_SIZE"""
+        if size <= 0:
+            raise serializers.ValidationError(_('Size must be positive.'))
+        if size > settings.BOVID_IMAGE_MAX_SIZE:
+            raise serializers.ValidationError(image_too_large_message())
+
+        return size
+
+    def create(self, validated_data):
+        """Start a session that expires after UPLOAD_SESSION_TTL"""
+        return super().create(dict(
+            validated_data,
+            chunk_size=settings.UPLOAD_CHUNK_SIZE,
+            expires=timezone.now() + timedelta(
+                seconds=settings.UPLOAD_SESSION_TTL
+            )
+        ))
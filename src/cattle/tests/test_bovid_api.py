@@ -1,11 +1,15 @@
 import tempfile
 import os
+from base64 import b64encode
+from urllib.parse import urlencode
+from unittest.mock import patch
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings, skipUnlessDBFeature
 from django.urls import reverse
+from django.utils import timezone
 
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -15,6 +19,7 @@ from core.models import Bovid, Tag, LifeEvent
 from cattle.serializers import BovidSerializer, BovidDetailSerializer
 
 CATTLE_URL = reverse('cattle:bovid-list')
+BULK_URL = reverse('cattle:bovid-bulk')
 
 
 # Helper functions to setup data
@@ -33,6 +38,11 @@ def detail_url(bovid_id):
     return reverse('cattle:bovid-detail', args=[bovid_id])
 
 
+def events_url(bovid_id):
+    """Return bovid life event timeline URL"""
+    return reverse('cattle:bovid-events', args=[bovid_id])
+
+
 def sample_bovine(user, **params):
     """Create and return a sample animal"""
     defaults = {
@@ -187,6 +197,326 @@ class PrivateBovidApiTests(TestCase):
         self.assertIn(serializer2.data, res.data)
         self.assertNotIn(serializer3.data, res.data)
 
+    def test_filter_bovids_by_tags_no_duplicates(self):
+        """Test a bovid with several matching tags is listed once"""
+        bovid = sample_bovine(user=self.user)
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Vegetarian')
+        bovid.tags.add(tag1, tag2)
+
+        for param in ('tags', 'tags_any'):
+            res = self.client.get(
+                CATTLE_URL,
+                {param: f'{tag1.id},{tag2.id}'}
+            )
+            self.assertEqual([cow['id'] for cow in res.data], [bovid.id])
+
+    def test_filter_bovids_by_all_and_no_tags(self):
+        """Test tags_all keeps bovids with every tag, tags_none those with
+        none of them
+        """
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Vegetarian')
+        both = sample_bovine(user=self.user, name='both')
+        both.tags.add(tag1, tag2)
+        one = sample_bovine(user=self.user, name='one')
+        one.tags.add(tag1)
+        untagged = sample_bovine(user=self.user, name='none')
+
+        res = self.client.get(CATTLE_URL, {'tags_all': f'{tag1.id},{tag2.id}'})
+        self.assertEqual([cow['id'] for cow in res.data], [both.id])
+
+        res = self.client.get(CATTLE_URL, {'tags_none': tag2.id})
+        self.assertEqual(
+            sorted(cow['id'] for cow in res.data),
+            sorted([one.id, untagged.id])
+        )
+
+        res = self.client.get(
+            CATTLE_URL,
+            {'tags_any': tag1.id, 'tags_none': tag2.id}
+        )
+        self.assertEqual([cow['id'] for cow in res.data], [one.id])
+
+    def test_filter_bovids_by_invalid_tags(self):
+        """Test malformed or too many tag ids are a bad request"""
+        sample_bovine(user=self.user)
+
+        with self.settings(CATTLE_MAX_FILTER_IDS=2):
+            for params in ({'tags': '1,x'}, {'tags_all': '1,,2'},
+                           {'tags_none': '1,2,3'}):
+                res = self.client.get(CATTLE_URL, params)
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn(list(params)[0], res.data)
+
+    def test_list_unpaginated_by_default(self):
+        """Test the bovid list is a plain list unless paging is requested"""
+        sample_bovine(user=self.user)
+
+        res = self.client.get(CATTLE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(res.data, list)
+
+    def test_list_paginated_with_cursor(self):
+        """Test walking the bovid list a page at a time"""
+        for i in range(5):
+            sample_bovine(user=self.user, name=f'kalf {i}')
+
+        res = self.client.get(CATTLE_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertEqual(len(res.data['results']), 2)
+        seen = [cow['id'] for cow in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            seen += [cow['id'] for cow in res.data['results']]
+
+        expected = Bovid.objects.filter(user=self.user) \
+            .order_by('-created', '-id').values_list('id', flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_list_paginated_through_tied_keys(self):
+        """Test paging past more than 1000 bovids created at once"""
+        Bovid.objects.bulk_create(
+            Bovid(user=self.user, type_of_bovid='koei', name=f'kalf {i}')
+            for i in range(1300)
+        )
+        Bovid.objects.filter(user=self.user).update(
+            created=timezone.now()
+        )
+
+        res = self.client.get(CATTLE_URL, {'page_size': 100})
+        pages = [res.data]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            pages.append(res.data)
+        seen = [cow['id'] for page in pages for cow in page['results']]
+
+        expected = Bovid.objects.filter(user=self.user) \
+            .order_by('-created', '-id').values_list('id', flat=True)
+        self.assertEqual(len(pages), 13)
+        self.assertEqual(seen, list(expected))
+        res = self.client.get(pages[-1]['previous'])
+        self.assertEqual(res.data['results'], pages[-2]['results'])
+
+    def test_list_invalid_cursor(self):
+        """Test cursors holding values of the wrong type are not found"""
+        sample_bovine(user=self.user)
+
+        for params, position in (({}, '["x", "y"]'),
+                                 ({'ordering': 'price'}, '["abc", "1"]'),
+                                 ({'ordering': 'age'}, '[null, 1]'),
+                                 ({}, '[]')):
+            cursor = b64encode(
+                urlencode({'p': position}).encode('ascii')
+            ).decode('ascii')
+            res = self.client.get(CATTLE_URL, dict(params, cursor=cursor))
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_page_size_capped(self):
+        """Test the requested page size is capped"""
+        sample_bovine(user=self.user)
+        sample_bovine(user=self.user)
+
+        with patch('cattle.pagination.KeysetPagination.max_page_size', 1):
+            res = self.client.get(CATTLE_URL, {'page_size': 50})
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_bovid_event_timeline(self):
+        """Test listing a bovid's events most recent first, a page at a time"""
+        cow = sample_bovine(user=self.user)
+        other = sample_bovine(user=self.user)
+        for day in (3, 1, 2):
+            LifeEvent.objects.create(
+                user=self.user,
+                bovid=cow,
+                event_type='weighed',
+                event_date=f'2019-12-0{day}'
+            )
+        LifeEvent.objects.create(
+            user=self.user,
+            bovid=other,
+            event_type='weighed',
+            event_date='2019-12-04'
+        )
+
+        res = self.client.get(events_url(cow.id), {'page_size': 2})
+        dates = [event['event_date'] for event in res.data['results']]
+        res = self.client.get(res.data['next'])
+        dates += [event['event_date'] for event in res.data['results']]
+
+        self.assertEqual(dates, ['2019-12-03', '2019-12-02', '2019-12-01'])
+        self.assertIsNone(res.data['next'])
+
+    def test_bovid_event_timeline_limited_to_user(self):
+        """Test the timeline of another user's bovid is not found"""
+        user2 = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'pass'
+        )
+        cow = sample_bovine(user=user2)
+
+        res = self.client.get(events_url(cow.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @skipUnlessDBFeature('can_return_ids_from_bulk_insert')
+    def test_bulk_create_bovids(self):
+        """Test creating many tagged bovids in one request"""
+        tag1 = sample_tag(user=self.user, name='Tag 1')
+        tag2 = sample_tag(user=self.user, name='Tag 2')
+        payload = [
+            {'type_of_bovid': 'koei', 'name': f'koei {i}', 'price': '5.00',
+             'tags': [tag1.id, tag2.id] if i % 2 else [tag1.id]}
+            for i in range(20)
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 20)
+        cows = Bovid.objects.filter(user=self.user)
+        self.assertEqual(cows.count(), 20)
+        self.assertEqual(tag1.bovid_set.count(), 20)
+        self.assertEqual(tag2.bovid_set.count(), 10)
+        self.assertEqual(res.data[1]['tags'], [tag1.id, tag2.id])
+
+    def test_bulk_create_reports_row_errors(self):
+        """Test invalid rows are reported by position and nothing is saved"""
+        user2 = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'pass'
+        )
+        other_tag = sample_tag(user=user2)
+        payload = [
+            {'type_of_bovid': 'koei', 'name': 'goed'},
+            {'type_of_bovid': 'koei'},
+            {'type_of_bovid': 'koei', 'name': 'vreemd',
+             'tags': [other_tag.id]},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('name', res.data[1])
+        self.assertIn('tags', res.data[2])
+        self.assertFalse(Bovid.objects.exists())
+
+    def test_bulk_create_with_parents(self):
+        """Test bulk created bovids are linked to the user's parents"""
+        dam = sample_bovine(user=self.user, name='ma')
+        other = sample_bovine(
+            user=get_user_model().objects.create_user(
+                'other@holmegrownsoftware.com',
+                'pass'
+            ),
+            name='vreemd'
+        )
+        payload = [
+            {'type_of_bovid': 'kalf', 'name': 'een', 'dam': dam.id},
+            {'type_of_bovid': 'kalf', 'name': 'twee', 'dam': dam.id,
+             'mothers_name': 'Mammie'},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        calves = Bovid.objects.filter(dam=dam).order_by('name')
+        self.assertEqual(
+            list(calves.values_list('name', 'mothers_name')),
+            [('een', 'ma'), ('twee', 'Mammie')]
+        )
+        res = self.client.post(BULK_URL, [
+            {'type_of_bovid': 'kalf', 'name': 'drie', 'sire': other.id},
+            {'type_of_bovid': 'kalf', 'name': 'vier', 'dam': 0},
+        ], format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('sire', res.data[0])
+        self.assertIn('dam', res.data[1])
+
+    def test_bulk_create_requires_list(self):
+        """Test the bulk endpoint rejects a single object or empty list"""
+        res = self.client.post(
+            BULK_URL,
+            {'type_of_bovid': 'koei', 'name': 'kleintjie'},
+            format='json'
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(BULK_URL, [], format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_not_modified(self):
+        """Test an unchanged bovid list is answered with a 304"""
+        sample_bovine(user=self.user)
+
+        res = self.client.get(CATTLE_URL)
+        etag = res['ETag']
+        with self.assertNumQueries(1):
+            res = self.client.get(CATTLE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_list_etag_changes(self):
+        """Test the list ETag changes on edits, tagging and deletes"""
+        bovid = sample_bovine(user=self.user)
+        sample_bovine(user=self.user, name='tweede')
+        etags = [self.client.get(CATTLE_URL)['ETag']]
+
+        self.client.patch(detail_url(bovid.id), {'name': 'nuwe naam'})
+        etags.append(self.client.get(CATTLE_URL)['ETag'])
+        bovid.tags.add(sample_tag(user=self.user))
+        etags.append(self.client.get(CATTLE_URL)['ETag'])
+        bovid.delete()
+        etags.append(self.client.get(CATTLE_URL)['ETag'])
+
+        self.assertEqual(len(set(etags)), 4)
+        res = self.client.get(CATTLE_URL, HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_detail_not_modified(self):
+        """Test an unchanged bovid is answered with a 304"""
+        bovid = sample_bovine(user=self.user)
+        tag = sample_tag(user=self.user)
+
+        res = self.client.get(detail_url(bovid.id))
+        self.assertIn('Last-Modified', res)
+        res = self.client.get(
+            detail_url(bovid.id),
+            HTTP_IF_NONE_MATCH=res['ETag']
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        etag = res['ETag']
+        tag.name = 'hernoem'
+        bovid.tags.add(tag)
+        tag.save()
+        res = self.client.get(detail_url(bovid.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['name'], 'hernoem')
+
+    def test_detail_modified_by_parent_delete(self):
+        """Test a bovid whose dam is deleted is no longer a 304"""
+        dam = sample_bovine(user=self.user, name='ma')
+        sire = sample_bovine(user=self.user, name='pa')
+        calf = sample_bovine(user=self.user, dam=dam, sire=sire)
+
+        res = self.client.get(detail_url(calf.id))
+        self.assertEqual(res.data['dam'], dam.id)
+        etag = res['ETag']
+        dam.delete()
+
+        res = self.client.get(detail_url(calf.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data['dam'])
+        self.assertEqual(res.data['sire'], sire.id)
+
     # def test_filter_bovids_by_ingredients(self):
     #     """Test returning bovids with specific events"""
     #     recipe1 = sample_recipe(user=self.user, title='Posh beans on toast')
@@ -235,6 +565,61 @@ class BovidImageUploadTests(TestCase):
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.bovid.image.path))
 
+    @patch('core.images.schedule_variants')
+    def test_upload_image_schedules_variants(self, schedule_variants):
+        """Test the image variants are generated after the upload"""
+        self.bovid.image_variants_ready = True
+        self.bovid.save()
+        url = image_upload_url(self.bovid.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.bovid.refresh_from_db()
+        self.assertFalse(self.bovid.image_variants_ready)
+        schedule_variants.assert_called_once_with(self.bovid)
+        res = self.client.get(detail_url(self.bovid.id))
+        self.assertIsNone(res.data['image_variants'])
+
+    def test_upload_identical_images_shared(self):
+        """Test uploading the same photo twice stores it once"""
+        other = sample_bovine(user=self.user, name='tweede')
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            for bovid in (self.bovid, other):
+                ntf.seek(0)
+                self.client.post(
+                    image_upload_url(bovid.id),
+                    {'image': ntf},
+                    format='multipart'
+                )
+
+        self.bovid.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.bovid.image.name, other.image.name)
+        self.assertTrue(os.path.exists(self.bovid.image.path))
+
+    @override_settings(BOVID_IMAGE_MAX_SIZE=1024)
+    def test_upload_image_too_large(self):
+        """Test uploads over the size limit are refused"""
+        with tempfile.NamedTemporaryFile(suffix='.bmp') as ntf:
+            Image.new('RGB', (100, 100)).save(ntf, format='BMP')
+            ntf.seek(0)
+            res = self.client.post(
+                image_upload_url(self.bovid.id),
+                {'image': ntf},
+                format='multipart'
+            )
+
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+        self.assertIn('image', res.data)
+        self.bovid.refresh_from_db()
+        self.assertFalse(self.bovid.image)
+
     def test_upload_image_bad_request(self):
         """Test uploading an invalid image"""
         url = image_upload_url(self.bovid.id)
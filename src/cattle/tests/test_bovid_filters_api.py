@@ -0,0 +1,209 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Bovid
+
+
+CATTLE_URL = reverse('cattle:bovid-list')
+
+
+def sample_bovine(user, name, **params):
+    """Create and return a sample animal"""
+    defaults = {'type_of_bovid': 'koei', 'breed': 'Nguni', 'price': 5.00}
+    defaults.update(params)
+
+    return Bovid.objects.create(user=user, name=name, **defaults)
+
+
+class BovidFilterApiTests(TestCase):
+    """Test the bovid list filters, orderings and facet counts"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def list_ids(self, params):
+        """Return the ids listed for the given query parameters"""
+        res = self.client.get(CATTLE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        return [bovid['id'] for bovid in res.data]
+
+    def test_filter_by_facets(self):
+        """Test filtering by type, breed and status, any of several"""
+        nguni = sample_bovine(self.user, 'Nguni')
+        brahman = sample_bovine(self.user, 'Brahman', breed='Brahman')
+        bull = sample_bovine(self.user, 'Bul', type_of_bovid='bul')
+        sold = sample_bovine(self.user, 'Sold', date_sold=date(2020, 1, 1))
+        dead = sample_bovine(self.user, 'Dead', date_of_death=date(2020, 1, 1),
+                             date_sold=date(2019, 1, 1))
+
+        self.assertEqual(
+            sorted(self.list_ids({'breed': ['Nguni', 'Brahman'],
+                                  'type_of_bovid': 'koei',
+                                  'status': 'alive'})),
+            sorted([nguni.id, brahman.id])
+        )
+        self.assertEqual(self.list_ids({'type_of_bovid': 'bul'}), [bull.id])
+        self.assertEqual(self.list_ids({'status': 'sold'}), [sold.id])
+        self.assertEqual(self.list_ids({'status': 'dead'}), [dead.id])
+
+    def test_filter_by_ranges(self):
+        """Test filtering by date of birth and price ranges"""
+        old = sample_bovine(self.user, 'Old', date_of_birth=date(2010, 5, 1),
+                            price=100)
+        young = sample_bovine(self.user, 'Young',
+                              date_of_birth=date(2019, 5, 1), price=900)
+        sample_bovine(self.user, 'Unknown')
+
+        self.assertEqual(
+            self.list_ids({'date_of_birth_after': '2015-01-01'}),
+            [young.id]
+        )
+        self.assertEqual(
+            self.list_ids({'date_of_birth_before': '2015-01-01',
+                           'price_min': '50', 'price_max': '100'}),
+            [old.id]
+        )
+
+    def test_invalid_filters(self):
+        """Test malformed filters and orderings are a bad request"""
+        for params in ({'status': 'lost'}, {'price_min': 'cheap'},
+                       {'price_max': 'NaN'}, {'ordering': 'weight'},
+                       {'date_of_birth_after': '2020-13-01'}):
+            res = self.client.get(CATTLE_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(list(params)[0], res.data)
+
+    def test_orderings(self):
+        """Test ordering by age, price and name"""
+        calf = sample_bovine(self.user, 'Calf', price=300,
+                             date_of_birth=date(2020, 1, 1))
+        cow = sample_bovine(self.user, 'Abby', price=900,
+                            date_of_birth=date(2015, 1, 1))
+        unknown = sample_bovine(self.user, 'Zulu', price=10)
+
+        self.assertEqual(self.list_ids({'ordering': 'age'}),
+                         [calf.id, cow.id, unknown.id])
+        self.assertEqual(self.list_ids({'ordering': '-age'}),
+                         [unknown.id, cow.id, calf.id])
+        self.assertEqual(self.list_ids({'ordering': '-price'}),
+                         [cow.id, calf.id, unknown.id])
+        self.assertEqual(self.list_ids({'ordering': 'name'}),
+                         [cow.id, calf.id, unknown.id])
+
+    def test_ordering_pages(self):
+        """Test paging through an ordering, past unknown dates of birth"""
+        bovids = [
+            sample_bovine(self.user, f'Koei {i}', date_of_birth=(
+                date(2010 + i, 1, 1) if i % 2 else None
+            ))
+            for i in range(7)
+        ]
+
+        ids = []
+        res = self.client.get(CATTLE_URL, {'ordering': 'age', 'page_size': 2})
+        while True:
+            ids += [bovid['id'] for bovid in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(
+            ids,
+            [bovids[5].id, bovids[3].id, bovids[1].id, bovids[6].id,
+             bovids[4].id, bovids[2].id, bovids[0].id]
+        )
+
+    def test_ordering_pages_past_ties(self):
+        """Test paging through more than 1000 bovids of equal price"""
+        Bovid.objects.bulk_create(
+            Bovid(user=self.user, type_of_bovid='koei', name=f'Koei {i}')
+            for i in range(1100)
+        )
+        sample_bovine(self.user, 'Duur', price=9000)
+
+        for ordering in ('price', '-price'):
+            ids = []
+            res = self.client.get(
+                CATTLE_URL, {'ordering': ordering, 'page_size': 100}
+            )
+            while True:
+                ids += [bovid['id'] for bovid in res.data['results']]
+                if not res.data['next']:
+                    break
+                res = self.client.get(res.data['next'])
+
+            self.assertEqual(ids, list(
+                Bovid.objects.filter(user=self.user)
+                .order_by(ordering, ordering.replace('price', 'id'))
+                .values_list('id', flat=True)
+            ))
+
+    def test_facet_counts(self):
+        """Test facets count each value over the other facets' choices"""
+        sample_bovine(self.user, 'Een')
+        sample_bovine(self.user, 'Twee')
+        sample_bovine(self.user, 'Drie', breed='Brahman')
+        sample_bovine(self.user, 'Bul', type_of_bovid='bul')
+        sample_bovine(self.user, 'Sold', date_sold=date(2020, 1, 1))
+
+        res = self.client.get(
+            CATTLE_URL,
+            {'facets': 1, 'breed': 'Nguni', 'status': 'alive'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 3)
+        self.assertEqual(res.data['facets'], {
+            'type_of_bovid': [
+                {'value': 'koei', 'count': 2},
+                {'value': 'bul', 'count': 1},
+            ],
+            'breed': [
+                {'value': 'Nguni', 'count': 3},
+                {'value': 'Brahman', 'count': 1},
+            ],
+            'status': [
+                {'value': 'alive', 'count': 3},
+                {'value': 'sold', 'count': 1},
+            ],
+        })
+
+    def test_facet_counts_with_pages(self):
+        """Test facets are added to a page of results"""
+        for i in range(3):
+            sample_bovine(self.user, f'Koei {i}')
+
+        res = self.client.get(CATTLE_URL, {'facets': 1, 'page_size': 2})
+
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNotNone(res.data['next'])
+        self.assertEqual(
+            res.data['facets']['breed'],
+            [{'value': 'Nguni', 'count': 3}]
+        )
+
+    def test_facet_etag_covers_other_values(self):
+        """Test the ETag changes when a bovid outside the chosen facet
+        values is added, as its count is in the response
+        """
+        sample_bovine(self.user, 'Een')
+        params = {'facets': 1, 'breed': 'Nguni'}
+        etag = self.client.get(CATTLE_URL, params)['ETag']
+
+        sample_bovine(self.user, 'Twee', breed='Brahman')
+        res = self.client.get(CATTLE_URL, params, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['facets']['breed']), 2)
@@ -0,0 +1,121 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from cattle.serializers import BovidSerializer, bovid_values_serializer
+from core.models import Bovid, Tag
+
+
+BOVIDS_URL = reverse('cattle:bovid-list')
+
+
+class BovidValuesSerializerTests(TestCase):
+    """Test the values() list serializer renders like BovidSerializer"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+        dip = Tag.objects.create(user=self.user, name='Dip')
+        brand = Tag.objects.create(user=self.user, name='Brand')
+        cow = Bovid.objects.create(
+            user=self.user,
+            type_of_bovid='koei',
+            name='Bessie',
+            breed='Nguni',
+            price=Decimal('1234.5'),
+            date_of_birth=date(2015, 1, 1),
+            date_sold=date(2019, 12, 31)
+        )
+        cow.tags.add(brand, dip)
+        bull = Bovid.objects.create(
+            user=self.user,
+            type_of_bovid='bul',
+            name='Bul',
+            price=0
+        )
+        calf = Bovid.objects.create(
+            user=self.user,
+            type_of_bovid='kalf',
+            name='Kalfie "Klein"',
+            mothers_name='Bessie',
+            dam=cow,
+            sire=bull,
+            date_of_birth=date(2019, 6, 1)
+        )
+        calf.tags.add(dip)
+        Bovid.objects.filter(pk=calf.pk).update(
+            image='uploads/bovid/ab/abcdef.jpg',
+            image_variants_ready=True
+        )
+        Bovid.objects.create(
+            user=self.user,
+            type_of_bovid='koei',
+            name='Unready',
+            image='uploads/bovid/cd/cdef.png'
+        )
+
+    def assertRendersAlike(self, queryset):
+        """Assert both serializers render a queryset to the same bytes"""
+        models = queryset.prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('id'))
+        )
+        expected = JSONRenderer().render(
+            BovidSerializer(models, many=True).data
+        )
+        rows = bovid_values_serializer.rows(queryset)
+
+        self.assertEqual(
+            JSONRenderer().render(
+                bovid_values_serializer.to_representation(rows)
+            ),
+            expected
+        )
+
+    def test_renders_alike(self):
+        """Test every field renders the same, including nulls"""
+        self.assertRendersAlike(Bovid.objects.order_by('id'))
+
+    def test_renders_alike_in_utc(self):
+        """Test times render the same in the UTC time zone"""
+        with timezone.override('UTC'):
+            self.assertRendersAlike(Bovid.objects.order_by('-id'))
+
+    def test_empty(self):
+        """Test no rows render as an empty list"""
+        self.assertRendersAlike(Bovid.objects.none())
+
+    def test_list_endpoint(self):
+        """Test the bovid list renders like BovidSerializer, paged or not"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        queryset = Bovid.objects.order_by('-created', '-id')
+
+        res = client.get(BOVIDS_URL)
+        self.assertEqual(
+            res.content,
+            JSONRenderer().render(BovidSerializer(
+                queryset.prefetch_related(
+                    Prefetch('tags', queryset=Tag.objects.order_by('id'))
+                ),
+                many=True
+            ).data)
+        )
+
+        res = client.get(BOVIDS_URL, {'page_size': 2, 'ordering': 'age'})
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertEqual(
+            [bovid['name'] for bovid in res.data['results']],
+            ['Kalfie "Klein"', 'Bessie']
+        )
+        res = client.get(res.data['next'])
+        self.assertEqual(len(res.data['results']), 2)
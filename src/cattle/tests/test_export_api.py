@@ -0,0 +1,139 @@
+import csv
+import gzip
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Bovid, Tag, LifeEvent
+
+from cattle import export
+
+
+def bovid_export_url(export_format):
+    """Return the bovid export URL for a format"""
+    return reverse('cattle:bovid-export', args=[export_format])
+
+
+def event_export_url(export_format):
+    """Return the life event export URL for a format"""
+    return reverse('cattle:lifeevent-export', args=[export_format])
+
+
+def content(res):
+    """Return the decoded body of a streaming response"""
+    return b''.join(res.streaming_content).decode('utf-8')
+
+
+class PublicExportApiTests(TestCase):
+    """Test unauthenticated export API access"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_required_auth(self):
+        """Test the authentication is required"""
+        res = self.client.get(bovid_export_url('csv'))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateExportApiTests(TestCase):
+    """Test exporting a user's herd and events"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.cow = Bovid.objects.create(
+            user=self.user,
+            type_of_bovid='koei',
+            name='Bessie',
+            price='12.50',
+            date_of_birth='2018-03-01'
+        )
+        self.cow.tags.add(
+            Tag.objects.create(user=self.user, name='Dip'),
+            Tag.objects.create(user=self.user, name='Brand')
+        )
+        LifeEvent.objects.create(
+            user=self.user,
+            bovid=self.cow,
+            event_type='birth',
+            event_date='2018-03-01',
+            notes='twin, "small"'
+        )
+        other = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'testpass'
+        )
+        Bovid.objects.create(user=other, type_of_bovid='koei', name='Nee')
+
+    def test_export_bovids_csv(self):
+        """Test streaming the herd as CSV with tag names"""
+        res = self.client.get(bovid_export_url('csv'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(content(res))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['name'], 'Bessie')
+        self.assertEqual(rows[0]['price'], '12.50')
+        self.assertEqual(rows[0]['date_of_birth'], '2018-03-01')
+        self.assertEqual(rows[0]['date_of_death'], '')
+        self.assertEqual(rows[0]['tags'], 'Brand|Dip')
+
+    def test_export_bovids_ndjson_gzip(self):
+        """Test streaming the herd as gzipped NDJSON"""
+        res = self.client.get(bovid_export_url('ndjson'), {'gzip': 1})
+
+        self.assertEqual(res['Content-Type'], 'application/gzip')
+        self.assertIn('bovids.ndjson.gz', res['Content-Disposition'])
+        body = gzip.decompress(b''.join(res.streaming_content))
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['id'], self.cow.id)
+        self.assertEqual(rows[0]['tags'], ['Brand', 'Dip'])
+
+    def test_export_events_csv(self):
+        """Test streaming life events as CSV, honouring the filters"""
+        res = self.client.get(event_export_url('csv'))
+
+        rows = list(csv.DictReader(io.StringIO(content(res))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['notes'], 'twin, "small"')
+        self.assertEqual(rows[0]['bovid'], str(self.cow.id))
+
+        res = self.client.get(event_export_url('csv'), {'event_type': 'vet'})
+        self.assertEqual(content(res).splitlines()[1:], [])
+
+    def test_export_unknown_format(self):
+        """Test only the supported formats are routed"""
+        res = self.client.get('/api/v1/cattle/bovids/export/xml/')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bovid_rows_chunked(self):
+        """Test tag names are attached across chunk boundaries"""
+        for i in range(4):
+            Bovid.objects.create(
+                user=self.user,
+                type_of_bovid='koei',
+                name=f'koei {i}'
+            ).tags.add(Tag.objects.create(user=self.user, name=f'tag {i}'))
+        queryset = Bovid.objects.filter(user=self.user).order_by('id')
+
+        with self.assertNumQueries(4):
+            rows = list(export.bovid_rows(queryset, chunk_size=2))
+
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[-1]['tags'], ['tag 3'])
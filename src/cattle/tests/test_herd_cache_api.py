@@ -0,0 +1,112 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.cache import herd_cache
+from core.models import Bovid, Tag
+
+
+TAGS_URL = reverse('cattle:tag-list')
+CACHE_URL = reverse('cattle:cache')
+
+
+def detail_url(bovid_id):
+    """Return bovid detail URL"""
+    return reverse('cattle:bovid-detail', args=[bovid_id])
+
+
+class HerdCacheApiTests(TestCase):
+    """Test the cached bovid detail and tag list endpoints"""
+
+    def setUp(self):
+        herd_cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.bovid = Bovid.objects.create(
+            user=self.user,
+            type_of_bovid='koei',
+            name='Bessie'
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Dip')
+
+    def tearDown(self):
+        herd_cache.clear()
+
+    def test_detail_cached(self):
+        """Test a repeated detail request is served without queries"""
+        self.client.get(detail_url(self.bovid.id))
+
+        with self.assertNumQueries(0):
+            res = self.client.get(detail_url(self.bovid.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['name'], 'Bessie')
+        self.assertEqual(herd_cache.stats()['hits'], 1)
+
+        res = self.client.get(
+            detail_url(self.bovid.id),
+            HTTP_IF_NONE_MATCH=res['ETag']
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_sees_changes(self):
+        """Test edits and tagging are visible straight away"""
+        self.client.get(detail_url(self.bovid.id))
+
+        self.client.patch(detail_url(self.bovid.id), {'name': 'Daisy'})
+        self.bovid.tags.add(self.tag)
+        res = self.client.get(detail_url(self.bovid.id))
+
+        self.assertEqual(res.data['name'], 'Daisy')
+        self.assertEqual(
+            res.data['tags'],
+            [{'id': self.tag.id, 'name': 'Dip'}]
+        )
+
+        self.bovid.delete()
+        res = self.client.get(detail_url(self.bovid.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_detail_not_shared_between_users(self):
+        """Test a cached bovid is not served to another user"""
+        self.client.get(detail_url(self.bovid.id))
+        other = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'testpass'
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(detail_url(self.bovid.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tag_list_cached(self):
+        """Test the tag list is cached until a tag changes"""
+        self.client.get(TAGS_URL)
+        with self.assertNumQueries(0):
+            self.client.get(TAGS_URL)
+
+        self.client.post(TAGS_URL, {'name': 'Brand'})
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual([tag['name'] for tag in res.data], ['Dip', 'Brand'])
+
+    def test_statistics_staff_only(self):
+        """Test only staff can read the cache counters"""
+        res = self.client.get(CACHE_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.client.get(TAGS_URL)
+        res = self.client.get(CACHE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['misses'], 1)
+        self.assertEqual(res.data['size'], herd_cache.size)
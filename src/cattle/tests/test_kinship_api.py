@@ -0,0 +1,141 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import kinship
+from core.models import Bovid
+
+
+def kinship_url(bovid_id):
+    """Return the kinship URL of a bovid"""
+    return reverse('cattle:bovid-kinship', args=[bovid_id])
+
+
+def sires_url(bovid_id):
+    """Return the sire suggestions URL of a bovid"""
+    return reverse('cattle:bovid-sires', args=[bovid_id])
+
+
+class KinshipApiTests(TestCase):
+    """Test the inbreeding and sire suggestion endpoints"""
+
+    def setUp(self):
+        kinship.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        kinship.clear()
+
+    def sample_bovid(self, name, **params):
+        """Create a bovid of the test user"""
+        defaults = {'type_of_bovid': 'koei'}
+        defaults.update(params)
+        return Bovid.objects.create(user=self.user, name=name, **defaults)
+
+    def sample_herd(self):
+        """Create a cow with a half brother, her sire and an outside bull"""
+        granny = self.sample_bovid('Ouma')
+        bull = self.sample_bovid('Bul', type_of_bovid='bul')
+        cow = self.sample_bovid('Koei', dam=granny, sire=bull)
+        brother = self.sample_bovid('Os', sire=bull)
+        outsider = self.sample_bovid('Vreemde Bul', type_of_bovid='Bul')
+
+        return granny, bull, cow, brother, outsider
+
+    def test_pair_coefficient(self):
+        """Test the inbreeding of a proposed pairing"""
+        granny, bull, cow, brother, outsider = self.sample_herd()
+
+        res = self.client.get(kinship_url(cow.id), {'mate': bull.id})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {
+            'id': cow.id,
+            'mate': bull.id,
+            'relationship': 0.5,
+            'inbreeding': 0,
+            'mate_inbreeding': 0,
+            'offspring_inbreeding': 0.25,
+        })
+
+    def test_pair_requires_mate(self):
+        """Test a missing or unknown mate is a bad request"""
+        cow = self.sample_bovid('Koei')
+        other = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'testpass'
+        )
+        theirs = Bovid.objects.create(
+            user=other,
+            type_of_bovid='bul',
+            name='Ander'
+        )
+
+        for params in ({}, {'mate': 'x'}, {'mate': theirs.id}):
+            res = self.client.get(kinship_url(cow.id), params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('mate', res.data)
+
+    def test_other_users_bovid_not_found(self):
+        """Test the endpoints only serve the user's own bovids"""
+        other = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'testpass'
+        )
+        theirs = Bovid.objects.create(
+            user=other,
+            type_of_bovid='koei',
+            name='Ander'
+        )
+
+        res = self.client.get(sires_url(theirs.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_best_sires(self):
+        """Test sires come least inbred calves first"""
+        granny, bull, cow, brother, outsider = self.sample_herd()
+        self.sample_bovid('Kalf', sire=brother)
+        self.sample_bovid('Dood', type_of_bovid='bul',
+                          date_of_death=date(2019, 1, 1))
+
+        res = self.client.get(sires_url(cow.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(sire['id'], sire['offspring_inbreeding']) for sire in res.data],
+            [(outsider.id, 0), (brother.id, 0.125), (bull.id, 0.25)]
+        )
+        self.assertEqual(res.data[0]['name'], 'Vreemde Bul')
+
+    def test_best_sires_limit(self):
+        """Test ?limit= caps the number of suggestions"""
+        granny, bull, cow, brother, outsider = self.sample_herd()
+
+        res = self.client.get(sires_url(cow.id), {'limit': 1})
+
+        self.assertEqual([sire['id'] for sire in res.data], [outsider.id])
+
+    def test_herd_change_seen(self):
+        """Test a new parent link changes the coefficients straight away"""
+        cow = self.sample_bovid('Koei')
+        bull = self.sample_bovid('Bul', type_of_bovid='bul')
+        self.client.get(kinship_url(cow.id), {'mate': bull.id})
+
+        self.client.patch(
+            reverse('cattle:bovid-detail', args=[cow.id]),
+            {'sire': bull.id}
+        )
+        res = self.client.get(kinship_url(cow.id), {'mate': bull.id})
+
+        self.assertEqual(res.data['offspring_inbreeding'], 0.25)
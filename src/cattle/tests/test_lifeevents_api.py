@@ -5,12 +5,13 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Bovid, LifeEvent
+from core.models import Bovid, LifeEvent, Tag
 
 from cattle.serializers import LifeEventSerializer
 
 
 LIFEEVENT_URL = reverse('cattle:lifeevent-list')
+HERD_EVENT_URL = reverse('cattle:lifeevent-herd')
 
 
 class PublicEventsApiTests(TestCase):
@@ -66,25 +67,272 @@ class PrivateEventsAPITests(TestCase):
         self.assertEqual(res.data[0], serializer.data[0])
         self.assertEqual(res.data[1], serializer.data[1])
 
+    def test_life_events_limited_to_user(self):
+        """Test only the authenticated user's life events are returned"""
+        user2 = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'testpass'
+        )
+        other_cow = Bovid.objects.create(
+            type_of_bovid='Brahman',
+            user=user2,
+            name='Bokkie'
+        )
+        LifeEvent.objects.create(
+            event_type='birth',
+            event_date='2019-12-01',
+            user=user2,
+            bovid=other_cow
+        )
+        cow = Bovid.objects.create(
+            type_of_bovid='Brahman',
+            user=self.user,
+            name='Bessie'
+        )
+        event = LifeEvent.objects.create(
+            event_type='suckled',
+            event_date='2019-12-01',
+            user=self.user,
+            bovid=cow
+        )
+
+        res = self.client.get(LIFEEVENT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['id'], event.id)
 
-def test_create_life_event_successful(self):
-    """Test creating a new life event"""
-    payload = {
-        'event_type': 'suckled',
-        'event_date': '2019-12-01'
+    def test_filter_life_events(self):
+        """Test filtering life events by bovid, type and date range"""
+        cow1 = Bovid.objects.create(
+            type_of_bovid='Brahman',
+            user=self.user,
+            name='Bessie'
+        )
+        cow2 = Bovid.objects.create(
+            type_of_bovid='Brahman',
+            user=self.user,
+            name='Bokkie'
+        )
+        match = LifeEvent.objects.create(
+            event_type='vet',
+            event_date='2019-12-05',
+            user=self.user,
+            bovid=cow1
+        )
+        LifeEvent.objects.create(
+            event_type='vet',
+            event_date='2019-12-05',
+            user=self.user,
+            bovid=cow2
+        )
+        LifeEvent.objects.create(
+            event_type='birth',
+            event_date='2019-12-05',
+            user=self.user,
+            bovid=cow1
+        )
+        LifeEvent.objects.create(
+            event_type='vet',
+            event_date='2019-11-01',
+            user=self.user,
+            bovid=cow1
+        )
+
+        res = self.client.get(LIFEEVENT_URL, {
+            'bovid': cow1.id,
+            'event_type': 'vet',
+            'event_date_after': '2019-12-01',
+            'event_date_before': '2019-12-31',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([event['id'] for event in res.data], [match.id])
+
+    def test_filter_life_events_invalid(self):
+        """Test malformed filters are rejected"""
+        res = self.client.get(LIFEEVENT_URL, {'event_date_after': 'gister'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(LIFEEVENT_URL, {'bovid': 'bessie'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def create_herd(self):
+        """Create two tagged bovids, an untagged one and a dead one"""
+        tag = Tag.objects.create(user=self.user, name='Dip')
+        cows = [
+            Bovid.objects.create(
+                type_of_bovid='Brahman',
+                user=self.user,
+                name=f'koei {i}'
+            )
+            for i in range(3)
+        ]
+        cows[0].tags.add(tag)
+        cows[1].tags.add(tag)
+        dead = Bovid.objects.create(
+            type_of_bovid='Brahman',
+            user=self.user,
+            name='oud',
+            date_of_death='2019-01-01'
+        )
+
+        return tag, cows, dead
+
+    def test_record_herd_event_by_tags(self):
+        """Test recording an event for every bovid with a tag"""
+        tag, cows, dead = self.create_herd()
+        payload = {
+            'event_type': 'vaccinated',
+            'notes': 'Lumpy skin',
+            'event_date': '2019-12-10',
+            'tags': [tag.id],
+        }
+
+        with self.assertNumQueries(2):
+            res = self.client.post(HERD_EVENT_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data, {'created': 2})
+        events = LifeEvent.objects.filter(user=self.user)
+        self.assertEqual(
+            sorted(events.values_list('bovid_id', flat=True)),
+            [cows[0].id, cows[1].id]
+        )
+        self.assertEqual(events[0].notes, 'Lumpy skin')
+
+    def test_record_herd_event_for_living(self):
+        """Test recording an event for every living bovid"""
+        tag, cows, dead = self.create_herd()
+        payload = {
+            'event_type': 'counted',
+            'event_date': '2019-12-10',
+            'living': True,
+        }
+
+        res = self.client.post(HERD_EVENT_URL, payload, format='json')
+
+        self.assertEqual(res.data, {'created': 3})
+        self.assertFalse(LifeEvent.objects.filter(bovid=dead).exists())
+
+    def test_record_herd_event_by_bovids(self):
+        """Test recording an event for explicit bovids"""
+        tag, cows, dead = self.create_herd()
+        payload = {
+            'event_type': 'moved',
+            'event_date': '2019-12-10',
+            'bovids': [cows[2].id, dead.id],
+        }
+
+        res = self.client.post(HERD_EVENT_URL, payload, format='json')
+
+        self.assertEqual(res.data, {'created': 2})
+
+    def test_list_large_herd_event(self):
+        """Test paging through more than 1000 events recorded at once"""
+        Bovid.objects.bulk_create(
+            Bovid(type_of_bovid='Brahman', user=self.user, name=f'koei {i}')
+            for i in range(1300)
+        )
+        payload = {
+            'event_type': 'counted',
+            'event_date': '2019-12-10',
+            'living': True,
+        }
+        self.client.post(HERD_EVENT_URL, payload, format='json')
+
+        ids = []
+        res = self.client.get(LIFEEVENT_URL, {'page_size': 100})
+        while True:
+            ids += [event['id'] for event in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        events = LifeEvent.objects.filter(user=self.user)
+        self.assertEqual(events.values('created').distinct().count(), 1)
+        self.assertEqual(
+            ids,
+            list(events.order_by('-id').values_list('id', flat=True))
+        )
+
+    def test_record_herd_event_invalid(self):
+        """Test the selector must be given once and belong to the user"""
+        tag, cows, dead = self.create_herd()
+        user2 = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'testpass'
+        )
+        other_cow = Bovid.objects.create(
+            type_of_bovid='Brahman',
+            user=user2,
+            name='Bokkie'
+        )
+        payload = {'event_type': 'moved', 'event_date': '2019-12-10'}
+
+        for selector in ({}, {'living': True, 'tags': [tag.id]},
+                         {'bovids': [other_cow.id]}):
+            res = self.client.post(
+                HERD_EVENT_URL,
+                dict(payload, **selector),
+                format='json'
+            )
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertFalse(LifeEvent.objects.exists())
+
+    def test_create_life_event_successful(self):
+        """Test creating a new life event for one of the user's bovids"""
+        cow = Bovid.objects.create(
+            type_of_bovid='Brahman',
+            user=self.user,
+            name='Bessie'
+        )
+        payload = {
+            'event_type': 'suckled',
+            'event_date': '2019-12-01',
+            'bovid': cow.id,
         }
-    self.client.post(LIFEEVENT_URL, payload)
 
-    exists = LifeEvent.objects.filter(
-        user=self.user,
-        name=payload['event_type']
-    ).exists()
-    self.assertTrue(exists)
+        res = self.client.post(LIFEEVENT_URL, payload)
 
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        event = LifeEvent.objects.get(id=res.data['id'])
+        self.assertEqual(event.user, self.user)
+        self.assertEqual(event.bovid, cow)
+        self.assertEqual(event.event_type, payload['event_type'])
 
-def test_create_life_event_invalid(self):
-    """Test creating invalid life event fails"""
-    payload = {'event_type': ''}
-    res = self.client.post(LIFEEVENT_URL, payload)
+    def test_create_life_event_invalid(self):
+        """Test creating an event without a type or for a bovid or user
+        that is not the user's fails
+        """
+        user2 = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'testpass'
+        )
+        cow = Bovid.objects.create(
+            type_of_bovid='Brahman',
+            user=self.user,
+            name='Bessie'
+        )
+        other_cow = Bovid.objects.create(
+            type_of_bovid='Brahman',
+            user=user2,
+            name='Bokkie'
+        )
+        payload = {'event_type': 'moved', 'event_date': '2019-12-10'}
 
-    self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        for invalid in ({'event_type': '', 'bovid': cow.id},
+                        {'bovid': other_cow.id}, {}):
+            res = self.client.post(LIFEEVENT_URL, dict(payload, **invalid))
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.post(
+            LIFEEVENT_URL,
+            dict(payload, bovid=cow.id, user=user2.id)
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            list(LifeEvent.objects.values_list('user', flat=True)),
+            [self.user.id]
+        )
@@ -0,0 +1,131 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Bovid
+
+
+def ancestors_url(bovid_id):
+    """Return the ancestors URL of a bovid"""
+    return reverse('cattle:bovid-ancestors', args=[bovid_id])
+
+
+def descendants_url(bovid_id):
+    """Return the descendants URL of a bovid"""
+    return reverse('cattle:bovid-descendants', args=[bovid_id])
+
+
+def detail_url(bovid_id):
+    """Return bovid detail URL"""
+    return reverse('cattle:bovid-detail', args=[bovid_id])
+
+
+class PedigreeApiTests(TestCase):
+    """Test the parent links and pedigree endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def sample_bovid(self, name, **params):
+        """Create a bovid of the test user"""
+        return Bovid.objects.create(
+            user=self.user,
+            type_of_bovid='koei',
+            name=name,
+            **params
+        )
+
+    def sample_family(self):
+        """Create four generations, with the bull sire of two of them"""
+        bull = self.sample_bovid('Bul')
+        granny = self.sample_bovid('Ouma')
+        mother = self.sample_bovid('Ma', dam=granny, sire=bull)
+        calf = self.sample_bovid('Kalf', dam=mother, sire=bull)
+        grandcalf = self.sample_bovid('Kleinkalf', dam=calf)
+
+        return bull, granny, mother, calf, grandcalf
+
+    def test_ancestors(self):
+        """Test ancestors come nearest first in a single query"""
+        bull, granny, mother, calf, grandcalf = self.sample_family()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(ancestors_url(grandcalf.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row['name'], row['generation']) for row in res.data],
+            [('Kalf', 1), ('Bul', 2), ('Ma', 2), ('Ouma', 3)]
+        )
+        self.assertEqual(res.data[0]['dam'], mother.id)
+
+        res = self.client.get(ancestors_url(grandcalf.id), {'generations': 1})
+        self.assertEqual([row['name'] for row in res.data], ['Kalf'])
+
+    def test_descendants(self):
+        """Test descendants through dams and sires are listed"""
+        bull, granny, mother, calf, grandcalf = self.sample_family()
+
+        res = self.client.get(descendants_url(bull.id))
+
+        self.assertEqual(
+            [(row['name'], row['generation']) for row in res.data],
+            [('Ma', 1), ('Kalf', 1), ('Kleinkalf', 2)]
+        )
+
+    def test_pedigree_of_other_users_bovid(self):
+        """Test the pedigree of another user's bovid is not found"""
+        other = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'testpass'
+        )
+        bovid = Bovid.objects.create(user=other, type_of_bovid='koei',
+                                     name='Nee')
+
+        res = self.client.get(ancestors_url(bovid.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self.client.get(ancestors_url(bovid.id), {'generations': 'x'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_set_parents(self):
+        """Test setting parents names them unless names are given"""
+        mother = self.sample_bovid('Ma')
+        calf = self.sample_bovid('Kalf')
+
+        res = self.client.patch(detail_url(calf.id), {'dam': mother.id})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        calf.refresh_from_db()
+        self.assertEqual(calf.dam, mother)
+        self.assertEqual(calf.mothers_name, 'Ma')
+
+        mother.delete()
+        calf.refresh_from_db()
+        self.assertIsNone(calf.dam)
+        self.assertEqual(calf.mothers_name, 'Ma')
+
+    def test_invalid_parents_rejected(self):
+        """Test parents must be the user's and not descendants"""
+        bull, granny, mother, calf, grandcalf = self.sample_family()
+        other = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'testpass'
+        )
+        stranger = Bovid.objects.create(user=other, type_of_bovid='koei',
+                                        name='Nee')
+
+        res = self.client.patch(detail_url(calf.id), {'sire': stranger.id})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.patch(detail_url(mother.id), {'dam': grandcalf.id})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('dam', res.data)
+        res = self.client.patch(detail_url(calf.id), {'sire': calf.id})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
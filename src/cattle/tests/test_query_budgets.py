@@ -0,0 +1,215 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, skipUnlessDBFeature
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Bovid, Tag, LifeEvent
+from core.tests.utils import QueryBudgetMixin
+
+
+TAGS_URL = reverse('cattle:tag-list')
+LIFEEVENT_URL = reverse('cattle:lifeevent-list')
+CATTLE_URL = reverse('cattle:bovid-list')
+
+
+def detail_url(bovid_id):
+    """Return bovid detail URL"""
+    return reverse('cattle:bovid-detail', args=[bovid_id])
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Test the cattle endpoints issue a bounded number of queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.tags = [
+            Tag.objects.create(user=self.user, name=f'tag {i}')
+            for i in range(3)
+        ]
+        self.grow_herd(2)
+
+    def grow_herd(self, size=10):
+        """Add tagged bovids with events to the user's herd"""
+        for i in range(size):
+            cow = Bovid.objects.create(
+                user=self.user,
+                type_of_bovid='koei',
+                name=f'koei {i}'
+            )
+            cow.tags.set(self.tags)
+            LifeEvent.objects.create(
+                user=self.user,
+                bovid=cow,
+                event_type='weighed',
+                event_date='2019-12-01'
+            )
+
+    def get_ok(self, url, params=None):
+        """Return a function that GETs url and checks the response"""
+        def func():
+            res = self.client.get(url, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            return res
+
+        return func
+
+    def test_tag_list_budget(self):
+        """Test listing tags issues a constant number of queries"""
+        self.assertQueryBudget(1, self.get_ok(TAGS_URL), self.grow_herd)
+        self.assertQueryBudget(
+            1,
+            self.get_ok(TAGS_URL, {'assigned_only': 1}),
+            self.grow_herd
+        )
+
+    def test_life_event_list_budget(self):
+        """Test listing life events issues a constant number of queries"""
+        self.assertQueryBudget(1, self.get_ok(LIFEEVENT_URL), self.grow_herd)
+
+    def test_bovid_list_budget(self):
+        """Test listing bovids issues a constant number of queries"""
+        # One aggregate for the ETag, then the page and its tags
+        self.assertQueryBudget(3, self.get_ok(CATTLE_URL), self.grow_herd)
+
+    def test_bovid_list_filtered_budget(self):
+        """Test filtering bovids by tags issues a constant number of queries"""
+        params = {'tags': ','.join(str(tag.id) for tag in self.tags)}
+        self.assertQueryBudget(
+            3,
+            self.get_ok(CATTLE_URL, params),
+            self.grow_herd
+        )
+
+    def test_bovid_list_tag_filters_budget(self):
+        """Test the tag filters issue a constant number of queries"""
+        tag_ids = ','.join(str(tag.id) for tag in self.tags)
+        for param in ('tags_any', 'tags_all', 'tags_none'):
+            self.assertQueryBudget(
+                3,
+                self.get_ok(CATTLE_URL, {param: tag_ids}),
+                self.grow_herd
+            )
+
+    def test_bovid_list_many_tags_budget(self):
+        """Test filtering by many tags stays within the same budget"""
+        tag_ids = ','.join(str(tag.id) for tag in self.tags + [
+            Tag.objects.create(user=self.user, name=f'many {i}')
+            for i in range(97)
+        ])
+        for param in ('tags_any', 'tags_all', 'tags_none'):
+            self.assertQueryBudget(
+                3,
+                self.get_ok(CATTLE_URL, {param: tag_ids})
+            )
+
+    def test_bovid_list_facets_budget(self):
+        """Test facet counts replace the ETag aggregate, so a faceted list
+        issues the same constant number of queries
+        """
+        self.assertQueryBudget(
+            3,
+            self.get_ok(CATTLE_URL, {'facets': 1, 'status': 'alive'}),
+            self.grow_herd
+        )
+
+    def test_bovid_list_paginated_budget(self):
+        """Test a page of bovids issues a constant number of queries"""
+        self.assertQueryBudget(
+            3,
+            self.get_ok(CATTLE_URL, {'page_size': 5}),
+            self.grow_herd
+        )
+
+    def test_bovid_detail_budget(self):
+        """Test viewing a bovid issues a constant number of queries"""
+        cow = Bovid.objects.filter(user=self.user).first()
+
+        def grow_tags():
+            cow.tags.add(*[
+                Tag.objects.create(user=self.user, name=f'extra {i}')
+                for i in range(10)
+            ])
+
+        self.assertQueryBudget(2, self.get_ok(detail_url(cow.id)), grow_tags)
+
+    def test_bovid_events_budget(self):
+        """Test a bovid's timeline issues a constant number of queries"""
+        cow = Bovid.objects.filter(user=self.user).first()
+
+        def grow_events():
+            for day in range(1, 11):
+                LifeEvent.objects.create(
+                    user=self.user,
+                    bovid=cow,
+                    event_type='weighed',
+                    event_date=f'2019-11-{day:02}'
+                )
+
+        self.assertQueryBudget(
+            2,
+            self.get_ok(reverse('cattle:bovid-events', args=[cow.id])),
+            grow_events
+        )
+
+    def test_bovid_create_budget(self):
+        """Test creating a tagged bovid issues a bounded number of queries"""
+        payload = {
+            'tags': [tag.id for tag in self.tags],
+            'type_of_bovid': 'koei',
+            'name': 'kleintjie',
+            'user': self.user.id
+        }
+
+        # Includes keeping the herd statistics up to date, which is a
+        # single upsert on PostgreSQL and a query per statistic elsewhere,
+        # and touching the bovid once its tags are added
+        res = self.assertQueryBudget(
+            13,
+            lambda: self.client.post(CATTLE_URL, payload)
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    @skipUnlessDBFeature('can_return_ids_from_bulk_insert')
+    def test_bovid_bulk_create_budget(self):
+        """Test a bulk create issues the same queries for any number of rows"""
+        url = reverse('cattle:bovid-bulk')
+
+        def bulk_create(size):
+            payload = [
+                {'type_of_bovid': 'koei', 'name': f'koei {i}',
+                 'tags': [tag.id for tag in self.tags]}
+                for i in range(size)
+            ]
+            res = self.client.post(url, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return res
+
+        self.assertQueryBudget(9, lambda: bulk_create(10))
+        self.assertQueryBudget(9, lambda: bulk_create(200))
+
+    @skipUnlessDBFeature('can_return_ids_from_bulk_insert')
+    def test_bovid_bulk_create_with_parents_budget(self):
+        """Test parents of bulk created rows are checked in one query"""
+        url = reverse('cattle:bovid-bulk')
+        dam, sire = Bovid.objects.filter(user=self.user)[:2]
+
+        def bulk_create(size):
+            payload = [
+                {'type_of_bovid': 'kalf', 'name': f'kalf {i}',
+                 'dam': dam.id, 'sire': sire.id}
+                for i in range(size)
+            ]
+            res = self.client.post(url, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return res
+
+        self.assertQueryBudget(10, lambda: bulk_create(10))
+        self.assertQueryBudget(10, lambda: bulk_create(200))
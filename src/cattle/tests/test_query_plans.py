@@ -0,0 +1,205 @@
+import datetime
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.models import Bovid, Tag, LifeEvent
+
+from cattle import views
+from cattle.filters import BovidFacetFilter, BovidTagFilter, \
+                           LifeEventFilter
+from cattle.pagination import BovidKeysetPagination, TagKeysetPagination, \
+                              TimelinePagination
+
+
+def seed_herd(user, size=50):
+    """Create a small herd with tags and events for the given user"""
+    tags = [Tag.objects.create(user=user, name=f'tag {i}') for i in range(5)]
+    for i in range(size):
+        cow = Bovid.objects.create(
+            user=user,
+            type_of_bovid='koei',
+            name=f'koei {i}'
+        )
+        cow.tags.add(tags[i % len(tags)])
+        LifeEvent.objects.create(
+            user=user,
+            bovid=cow,
+            event_type='weighed',
+            event_date=datetime.date(2019, 1, 1) + datetime.timedelta(i)
+        )
+
+    return tags
+
+
+def view_queryset(viewset, user, params=None, **kwargs):
+    """Return the queryset a viewset would use for a list request"""
+    request = Request(APIRequestFactory().get('/', params or {}))
+    request.user = user
+    view = viewset(request=request, action='list', kwargs=kwargs)
+
+    return view.get_queryset()
+
+
+def first_page(queryset, pagination_class):
+    """Return the query of the first keyset page of a queryset"""
+    return queryset.order_by(*pagination_class.ordering)[
+        :settings.CATTLE_PAGE_SIZE + 1
+    ]
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans need PostgreSQL')
+class QueryPlanTests(TestCase):
+    """Test the main query of each endpoint is served by an index"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+        other = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'testpass'
+        )
+        self.tags = seed_herd(self.user)
+        seed_herd(other)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            # Only fall back to a sequential scan when no index applies
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertNoSeqScan(self, queryset):
+        """Assert the plan for a queryset does not scan a whole table"""
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, msg=f'\n{plan}')
+
+    def assertUsesIndex(self, queryset, index):
+        """Assert the plan for a queryset reads the named index"""
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, msg=f'\n{plan}')
+        self.assertIn(index, plan, msg=f'\n{plan}')
+
+    def test_tag_list_plan(self):
+        """Test listing tags uses the (user, name, id) index"""
+        queryset = view_queryset(views.TagViewSet, self.user)
+        self.assertUsesIndex(queryset, 'tag_user_name_idx')
+        self.assertUsesIndex(
+            first_page(queryset, TagKeysetPagination),
+            'tag_user_name_idx'
+        )
+
+    def test_tag_assigned_only_plan(self):
+        """Test listing assigned tags avoids sequential scans"""
+        queryset = view_queryset(
+            views.TagViewSet,
+            self.user,
+            {'assigned_only': 1}
+        )
+        self.assertNoSeqScan(queryset)
+
+    def test_bovid_list_plan(self):
+        """Test a page of bovids uses the (user, created, id) index"""
+        self.assertUsesIndex(
+            first_page(
+                view_queryset(views.BovidViewSet, self.user),
+                BovidKeysetPagination
+            ),
+            'bovid_user_created_idx'
+        )
+
+    def test_bovid_tag_filter_plan(self):
+        """Test filtering bovids by tag avoids sequential scans"""
+        tag_ids = ','.join(str(tag.id) for tag in self.tags[:2])
+        request = Request(APIRequestFactory().get('/', {'tags': tag_ids}))
+        queryset = BovidTagFilter().filter_queryset(
+            request,
+            view_queryset(views.BovidViewSet, self.user),
+            None
+        )
+        self.assertNoSeqScan(queryset)
+
+    def test_bovid_tag_set_filters_plan(self):
+        """Test the all and none tag filters avoid sequential scans"""
+        tag_ids = ','.join(str(tag.id) for tag in self.tags[:2])
+        for param in ('tags_all', 'tags_none'):
+            request = Request(APIRequestFactory().get('/', {param: tag_ids}))
+            queryset = BovidTagFilter().filter_queryset(
+                request,
+                view_queryset(views.BovidViewSet, self.user),
+                None
+            )
+            self.assertNoSeqScan(queryset)
+
+    def test_bovid_living_facets_plan(self):
+        """Test counting the facets of living bovids avoids sequential
+        scans
+        """
+        request = Request(APIRequestFactory().get('/', {'status': 'alive'}))
+        queryset = BovidFacetFilter().filter_queryset(
+            request,
+            view_queryset(views.BovidViewSet, self.user),
+            None
+        )
+        self.assertNoSeqScan(queryset.values('type_of_bovid', 'breed')
+                             .annotate(count=Count('id')).order_by())
+
+    def test_bovid_living_ordering_plans(self):
+        """Test ordering living bovids by name or price uses an index"""
+        for ordering in ('name', '-price'):
+            queryset = view_queryset(
+                views.BovidViewSet,
+                self.user,
+                {'ordering': ordering, 'status': 'alive'}
+            )
+            queryset = BovidFacetFilter().filter_queryset(
+                Request(APIRequestFactory().get('/', {'status': 'alive'})),
+                queryset,
+                None
+            )
+            self.assertNoSeqScan(queryset)
+
+    def test_bovid_search_plan(self):
+        """Test searching bovids uses the trigram and notes indexes"""
+        queryset = view_queryset(
+            views.BovidViewSet,
+            self.user,
+            {'search': 'koei 7'}
+        )
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, msg=f'\n{plan}')
+        self.assertIn('lifeevent_notes_search_idx', plan, msg=f'\n{plan}')
+
+    def test_life_event_list_plan(self):
+        """Test listing life events avoids sequential scans"""
+        self.assertNoSeqScan(view_queryset(views.LifeEventViewSet, self.user))
+
+    def test_life_event_filter_plan(self):
+        """Test filtering life events by type and date uses an index"""
+        request = Request(APIRequestFactory().get('/', {
+            'event_type': 'weighed',
+            'event_date_after': '2019-01-10',
+        }))
+        queryset = LifeEventFilter().filter_queryset(
+            request,
+            view_queryset(views.LifeEventViewSet, self.user),
+            None
+        )
+        self.assertNoSeqScan(queryset)
+
+    def test_bovid_events_plan(self):
+        """Test a page of one bovid's events uses the (bovid, event_date,
+        id) index
+        """
+        cow = Bovid.objects.filter(user=self.user).first()
+        self.assertUsesIndex(
+            first_page(cow.lifeevent_set.all(), TimelinePagination),
+            'lifeevent_bovid_date_idx'
+        )
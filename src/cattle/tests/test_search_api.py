@@ -0,0 +1,158 @@
+import datetime
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Bovid, LifeEvent
+
+
+BOVIDS_URL = reverse('cattle:bovid-list')
+
+
+def sample_bovid(user, name, **params):
+    """Create and return a sample bovid"""
+    return Bovid.objects.create(
+        user=user,
+        type_of_bovid='koei',
+        name=name,
+        **params
+    )
+
+
+class BovidSearchApiTests(TestCase):
+    """Test searching bovids with ?search="""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def search(self, term, **params):
+        """Return the ids found searching for a term"""
+        res = self.client.get(BOVIDS_URL, {'search': term, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.data['results'] if 'results' in res.data else res.data
+
+        return [bovid['id'] for bovid in results]
+
+    def test_search_fields(self):
+        """Test names, breed and breeder are searched"""
+        daisy = sample_bovid(self.user, 'Daisy')
+        sample_bovid(self.user, 'Bella', breed='Nguni')
+        calf = sample_bovid(self.user, 'Kalf', mothers_name='Daisy')
+        bought = sample_bovid(self.user, 'Ou Koei', breeder='Daisyvale')
+
+        self.assertEqual(
+            sorted(self.search('daisy')),
+            sorted([daisy.id, calf.id, bought.id])
+        )
+
+    def test_search_event_notes(self):
+        """Test bovids are found by the notes of their events"""
+        lame = sample_bovid(self.user, 'Bella')
+        sample_bovid(self.user, 'Daisy')
+        LifeEvent.objects.create(
+            user=self.user,
+            bovid=lame,
+            event_type='vet',
+            notes='Limping on the left hind leg',
+            event_date=datetime.date(2020, 3, 1)
+        )
+
+        self.assertEqual(self.search('limping'), [lame.id])
+
+    def test_search_etag_follows_event_notes(self):
+        """Test a search is not a 304 once edited notes match other bovids"""
+        bella = sample_bovid(self.user, 'Bella')
+        daisy = sample_bovid(self.user, 'Daisy')
+        Bovid.objects.update(updated=bella.updated)
+        events = [
+            LifeEvent.objects.create(
+                user=self.user,
+                bovid=bovid,
+                event_type='vet',
+                notes=notes,
+                event_date=datetime.date(2020, 3, 1)
+            )
+            for bovid, notes in ((bella, 'Limping'), (daisy, 'Healthy'))
+        ]
+        res = self.client.get(BOVIDS_URL, {'search': 'limping'})
+
+        events[0].notes, events[1].notes = 'Healthy', 'Limping'
+        for event in events:
+            event.save()
+        res = self.client.get(BOVIDS_URL, {'search': 'limping'},
+                              HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([bovid['id'] for bovid in res.data], [daisy.id])
+
+    def test_search_own_herd_only(self):
+        """Test other users' bovids and events are not searched"""
+        other = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'testpass'
+        )
+        theirs = sample_bovid(other, 'Daisy')
+        LifeEvent.objects.create(
+            user=other,
+            bovid=theirs,
+            event_type='vet',
+            notes='Daisy',
+            event_date=datetime.date(2020, 3, 1)
+        )
+
+        self.assertEqual(self.search('Daisy'), [])
+
+    def test_own_fields_rank_first(self):
+        """Test a bovid named like the term ranks above one whose event
+        notes mention it
+        """
+        mentioned = sample_bovid(self.user, 'Bella')
+        LifeEvent.objects.create(
+            user=self.user,
+            bovid=mentioned,
+            event_type='grazing',
+            notes='Grazed with Daisy',
+            event_date=datetime.date(2020, 3, 1)
+        )
+        daisy = sample_bovid(self.user, 'Daisy')
+
+        self.assertEqual(self.search('Daisy'), [daisy.id, mentioned.id])
+
+    def test_search_pages(self):
+        """Test search results can be paged through with a cursor"""
+        bovids = [sample_bovid(self.user, f'Daisy {i}') for i in range(5)]
+
+        res = self.client.get(BOVIDS_URL, {'search': 'daisy', 'page_size': 3})
+        ids = [bovid['id'] for bovid in res.data['results']]
+        res = self.client.get(res.data['next'])
+        ids += [bovid['id'] for bovid in res.data['results']]
+
+        self.assertEqual(sorted(ids), sorted(bovid.id for bovid in bovids))
+
+    def test_blank_search_lists_all(self):
+        """Test a blank search term does not filter"""
+        sample_bovid(self.user, 'Daisy')
+        sample_bovid(self.user, 'Bella')
+
+        self.assertEqual(len(self.search('  ')), 2)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Trigrams need PostgreSQL')
+    def test_search_tolerates_typos(self):
+        """Test a misspelt name still finds the bovid, best match first"""
+        sample_bovid(self.user, 'Bella')
+        blommetjie = sample_bovid(self.user, 'Blommetjie')
+        blom = sample_bovid(self.user, 'Blom')
+
+        self.assertEqual(self.search('blommetjei')[:1], [blommetjie.id])
+        self.assertEqual(self.search('blom')[:1], [blom.id])
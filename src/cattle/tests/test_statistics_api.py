@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Bovid
+
+
+STATISTICS_URL = reverse('cattle:statistics')
+
+
+class PublicStatisticsApiTests(TestCase):
+    """Test unauthenticated statistics API access"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_login_required(self):
+        """Test that login is required to access this endpoint"""
+        res = self.client.get(STATISTICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateStatisticsApiTests(TestCase):
+    """Test the herd statistics of the authenticated user"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_retrieve_statistics(self):
+        """Test the statistics only count the user's own herd"""
+        other = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'testpass'
+        )
+        Bovid.objects.create(user=other, type_of_bovid='koei', name='Nee')
+        Bovid.objects.create(
+            user=self.user,
+            type_of_bovid='koei',
+            breed='Nguni',
+            name='Bessie',
+            price='10.00'
+        )
+
+        res = self.client.get(STATISTICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['total'], 1)
+        self.assertEqual(res.data['by_breed'], {'Nguni': 1})
+        self.assertEqual(res.data['price_total'], '10.00')
@@ -0,0 +1,223 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Bovid, BovidPhoto, UploadSession
+
+
+UPLOADS_URL = reverse('cattle:uploadsession-list')
+PHOTOS_URL = reverse('cattle:bovidphoto-list')
+TEMP_ROOT = tempfile.mkdtemp()
+
+
+def session_url(session_id):
+    """Return the upload session detail URL"""
+    return reverse('cattle:uploadsession-detail', args=[session_id])
+
+
+def chunk_url(session_id, index):
+    """Return the URL a chunk of an upload session is PUT to"""
+    return reverse('cattle:uploadsession-chunk', args=[session_id, index])
+
+
+def finalize_url(session_id):
+    """Return the URL finishing an upload session"""
+    return reverse('cattle:uploadsession-finalize', args=[session_id])
+
+
+def sample_photo():
+    """Return the bytes of a noisy JPEG a few chunks long"""
+    buffer = io.BytesIO()
+    Image.effect_noise((64, 64), 50).convert('RGB').save(buffer, 'JPEG')
+
+    return buffer.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=os.path.join(TEMP_ROOT, 'media'),
+    CHUNKED_UPLOAD_DIR=os.path.join(TEMP_ROOT, 'uploads'),
+    UPLOAD_CHUNK_SIZE=1024
+)
+class UploadSessionApiTests(TestCase):
+    """Test resumable photo uploads"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.bovid = Bovid.objects.create(
+            user=self.user,
+            type_of_bovid='koei',
+            name='Bessie'
+        )
+        self.photo = sample_photo()
+
+    def start(self, **params):
+        """Create an upload session for the sample photo"""
+        payload = {
+            'bovid': self.bovid.id,
+            'filename': 'bessie.jpg',
+            'size': len(self.photo),
+        }
+        payload.update(params)
+
+        return self.client.post(UPLOADS_URL, payload)
+
+    def put_chunk(self, session_id, index, content=None):
+        """PUT one chunk of the sample photo"""
+        if content is None:
+            content = self.photo[index * 1024:(index + 1) * 1024]
+
+        return self.client.put(
+            chunk_url(session_id, index),
+            content,
+            content_type='application/octet-stream'
+        )
+
+    def test_upload_in_chunks(self):
+        """Test a photo sent out of order with a retry is assembled"""
+        res = self.start(caption='In die kraal')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        session_id = res.data['id']
+        count = res.data['chunk_count']
+        self.assertGreater(count, 2)
+        self.assertEqual(res.data['missing_chunks'], list(range(count)))
+
+        for index in reversed(range(1, count)):
+            self.put_chunk(session_id, index)
+        res = self.client.post(finalize_url(session_id))
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['missing_chunks'], [0])
+
+        self.put_chunk(session_id, 0)
+        res = self.put_chunk(session_id, 0)
+        self.assertEqual(res.data['missing_chunks'], [])
+        res = self.client.post(finalize_url(session_id))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        photo = BovidPhoto.objects.get(id=res.data['id'])
+        self.assertEqual(photo.bovid, self.bovid)
+        self.assertEqual(photo.caption, 'In die kraal')
+        with photo.image.open('rb') as stored:
+            self.assertEqual(stored.read(), self.photo)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(
+            os.path.join(TEMP_ROOT, 'uploads', f'{session_id}.part')
+        ))
+
+    def test_wrong_chunk_length_rejected(self):
+        """Test a truncated or overlong chunk is not counted"""
+        session_id = self.start().data['id']
+
+        res = self.put_chunk(session_id, 0, self.photo[:1000])
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.put_chunk(session_id, 0, self.photo[:1025])
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.put_chunk(session_id, 99)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(session_url(session_id))
+        self.assertIn(0, res.data['missing_chunks'])
+
+    def test_checksum_mismatch(self):
+        """Test a corrupted photo has to be sent again"""
+        session_id = self.start(
+            sha256=hashlib.sha256(b'ander').hexdigest()
+        ).data['id']
+        count = UploadSession.objects.get(id=session_id).chunk_count
+        for index in range(count):
+            self.put_chunk(session_id, index)
+
+        res = self.client.post(finalize_url(session_id))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.get(session_url(session_id))
+        self.assertEqual(len(res.data['missing_chunks']), count)
+        self.assertFalse(BovidPhoto.objects.exists())
+
+    def test_invalid_sessions_rejected(self):
+        """Test sessions for other users' bovids, huge files or names
+        that are not images are refused
+        """
+        other = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'testpass'
+        )
+        other_bovid = Bovid.objects.create(
+            user=other,
+            type_of_bovid='koei',
+            name='Nee'
+        )
+
+        res = self.start(bovid=other_bovid.id)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.settings(BOVID_IMAGE_MAX_SIZE=100):
+            res = self.start()
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        for filename in ('bessie.html', 'bessie.svg', 'bessie', '.x/y'):
+            res = self.start(filename=filename)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('filename', res.data)
+
+    def test_extension_from_content(self):
+        """Test the stored photo is named after its detected format"""
+        session_id = self.start(filename='bessie.png').data['id']
+        count = UploadSession.objects.get(id=session_id).chunk_count
+        for index in range(count):
+            self.put_chunk(session_id, index)
+
+        photo_id = self.client.post(finalize_url(session_id)).data['id']
+
+        photo = BovidPhoto.objects.get(id=photo_id)
+        self.assertTrue(photo.image.name.endswith('.jpeg'))
+
+    def test_sessions_private(self):
+        """Test other users cannot write to a session"""
+        session_id = self.start().data['id']
+        other = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'testpass'
+        )
+        self.client.force_authenticate(other)
+
+        res = self.put_chunk(session_id, 0)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_gallery(self):
+        """Test listing a bovid's photos and removing one"""
+        session_id = self.start().data['id']
+        count = UploadSession.objects.get(id=session_id).chunk_count
+        for index in range(count):
+            self.put_chunk(session_id, index)
+        photo_id = self.client.post(finalize_url(session_id)).data['id']
+
+        res = self.client.get(PHOTOS_URL, {'bovid': self.bovid.id})
+        self.assertEqual([photo['id'] for photo in res.data], [photo_id])
+        res = self.client.get(PHOTOS_URL, {'bovid': self.bovid.id + 1})
+        self.assertEqual(res.data, [])
+
+        res = self.client.delete(
+            reverse('cattle:bovidphoto-detail', args=[photo_id])
+        )
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(BovidPhoto.objects.exists())
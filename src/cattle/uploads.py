@@ -0,0 +1,111 @@
+import hashlib
+import os
+
+from PIL import Image
+
+from django.core.files import File
+from django.core.files.uploadhandler import StopUpload, \
+                                           TemporaryFileUploadHandler
+
+
+# Bytes copied at a time between request streams and part files
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """Stream uploaded files to temporary files, hashing them on the way
+    and stopping the upload as soon as a file passes max_size.
+
+    The digest is kept on the uploaded file as `sha256`, so the
+    content-addressed image path is known without reading it again.
+    """
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size
+        self.too_large = False
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.max_size is not None and self.size > self.max_size:
+            self.too_large = True
+            raise StopUpload(connection_reset=True)
+        self.sha256.update(raw_data)
+
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.sha256.hexdigest()
+
+        return uploaded
+
+
+class AssembledUpload(File):
+    """Part file of a finished upload session, moved rather than copied
+    into storage. `format` is Pillow's format of the image, which names
+    its extension.
+    """
+
+    def __init__(self, path, name, sha256, format):
+        super().__init__(open(path, 'rb'), name)
+        self.path = path
+        self.sha256 = sha256
+        self.format = format
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def create_part_file(session):
+    """Create the part file of a new session at its full size"""
+    os.makedirs(os.path.dirname(session.part_path), exist_ok=True)
+    with open(session.part_path, 'wb') as part:
+        part.truncate(session.size)
+
+
+def write_chunk(session, index, stream):
+    """Copy one chunk from a request stream into the session's part file
+    and return whether it had the expected length
+    """
+    expected = session.chunk_length(index)
+    written = 0
+    with open(session.part_path, 'r+b') as part:
+        part.seek(index * session.chunk_size)
+        while written <= expected:
+            piece = stream.read(min(COPY_BUFFER_SIZE, expected + 1 - written))
+            if not piece:
+                break
+            if written + len(piece) > expected:
+                return False
+            part.write(piece)
+            written += len(piece)
+
+    return written == expected
+
+
+def part_sha256(session):
+    """Return the SHA-256 hex digest of a session's part file"""
+    sha256 = hashlib.sha256()
+    with open(session.part_path, 'rb') as part:
+        for piece in iter(lambda: part.read(COPY_BUFFER_SIZE), b''):
+            sha256.update(piece)
+
+    return sha256.hexdigest()
+
+
+def image_format(path):
+    """Return Pillow's format of an image file, or None if it does not
+    recognise the file as an image
+    """
+    try:
+        with Image.open(path) as image:
+            image.verify()
+            return image.format
+    except Exception:
+        return None
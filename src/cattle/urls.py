@@ -10,9 +10,21 @@ router = DefaultRouter()
 router.register('tags', views.TagViewSet)
 router.register('events', views.LifeEventViewSet)
 router.register('bovids', views.BovidViewSet)
+router.register('photos', views.BovidPhotoViewSet)
+router.register('uploads', views.UploadSessionViewSet)
 
 app_name = 'cattle'
 
 urlpatterns = [
+    path(
+        'statistics/',
+        views.HerdStatisticsView.as_view(),
+        name='statistics'
+    ),
+    path(
+        'cache/',
+        views.HerdCacheStatisticsView.as_view(),
+        name='cache'
+    ),
     path('', include(router.urls))
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,33 +1,65 @@
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from django.db.models import Count, Max, Value, prefetch_related_objects
+from django.db.models.functions import Coalesce
+
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 
-from core.models import Tag, LifeEvent, Bovid
+from core import images, kinship, pedigree, search, statistics
+from core.cache import herd_cache
+from core.models import Tag, LifeEvent, Bovid, BovidPhoto, UploadSession, \
+                        UploadChunk
+from user.authentication import CachedTokenAuthentication
 
-from cattle import serializers
+from cattle import conditional, serializers, uploads
+from cattle.export import streaming_export, bovid_rows, lifeevent_rows, \
+                          BOVID_EXPORT_FIELDS, LIFEEVENT_EXPORT_FIELDS
+from cattle.filters import BovidFacetFilter, BovidFilter, BovidTagFilter, \
+                           LifeEventFilter, param_to_int
+from cattle.pagination import BovidKeysetPagination, KeysetPagination, \
+                              TagKeysetPagination, TimelinePagination
 
 
 class TagViewSet(viewsets.GenericViewSet,
                  mixins.ListModelMixin,
                  mixins.CreateModelMixin):
     """Manage tags in the database"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    pagination_class = TagKeysetPagination
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
         assigned_only = bool(self.request.query_params.get('assigned_only'))
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(bovid__isnull=False)
+            # A tag joins once per bovid, hence distinct
+            queryset = queryset.filter(bovid__isnull=False).distinct()
 
-        return queryset.filter(
-            user=self.request.user
-        ).order_by('-name').distinct()
+        return queryset.filter(user=self.request.user).order_by('-name')
+
+    def list(self, request, *args, **kwargs):
+        """List tags, from the herd cache when the user's data is unchanged"""
+        key = herd_cache.key(request.user.pk, 'tags',
+                             request.build_absolute_uri())
+        data = herd_cache.get(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            herd_cache.set(key, data)
+
+        return Response(data)
 
     def perform_create(self, serializer):
         """Create a new ingredient"""
@@ -38,31 +70,106 @@ class LifeEventViewSet(viewsets.GenericViewSet,
                        mixins.ListModelMixin,
                        mixins.CreateModelMixin):
     """Manage the life events in the database"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     queryset = LifeEvent.objects.all()
     serializer_class = serializers.LifeEventSerializer
+    pagination_class = KeysetPagination
+    filter_backends = (LifeEventFilter,)
+
+    def get_queryset(self):
+        """Return life events for the current authenticated user only"""
+        return self.queryset.filter(user=self.request.user)
+
+    def get_serializer_class(self):
+        """Return appropriate serializer class"""
+        if self.action == 'herd':
+            return serializers.HerdEventSerializer
+
+        return self.serializer_class
+
+    def perform_create(self, serializer):
+        """Create a new life event"""
+        serializer.save(user=self.request.user)
+
+    @action(methods=['POST'], detail=False)
+    def herd(self, request):
+        """Record the same life event for a group of bovines"""
+        serializer = self.get_serializer(data=request.data)
+
+        if serializer.is_valid():
+            created = serializer.save()
+            return Response(
+                {'created': created},
+                status=status.HTTP_201_CREATED
+            )
+
+        return Response(
+            serializer.errors,
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(methods=['GET'], detail=False,
+            url_path=r'export/(?P<export_format>csv|ndjson)')
+    def export(self, request, export_format):
+        """Stream the user's life events as CSV or NDJSON"""
+        queryset = self.filter_queryset(self.get_queryset()).order_by('id')
+
+        return streaming_export(
+            lifeevent_rows(queryset),
+            LIFEEVENT_EXPORT_FIELDS,
+            export_format,
+            'events',
+            compress=bool(request.query_params.get('gzip'))
+        )
 
 
 class BovidViewSet(viewsets.ModelViewSet):
     """Manage bovines in the database"""
     serializer_class = serializers.BovidSerializer
     queryset = Bovid.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
-
-    def _params_to_ints(self, qs):
-        """Convert a list of string IDs to a list of integers"""
-        return [int(str_id) for str_id in qs.split(',')]
+    pagination_class = BovidKeysetPagination
+    filter_backends = (BovidTagFilter, BovidFilter, BovidFacetFilter)
 
     def get_queryset(self):
         """Retrieve the bovids for the authenticated user"""
-        tags = self.request.query_params.get('tags')
         queryset = self.queryset
-        if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
-        return queryset.filter(user=self.request.user)
+        if self.action == 'list':
+            queryset = queryset.prefetch_related('tags')
+        ordering = self.pagination_class.ordering
+        if self.action in ('list', 'export'):
+            term = self.request.query_params.get('search', '').strip()
+            if term:
+                queryset = search.search_bovids(
+                    queryset,
+                    self.request.user.pk,
+                    term
+                )
+            ordering = self.paginator.requested_ordering(self.request)
+            if 'birth_order' in (field.lstrip('-') for field in ordering):
+                queryset = queryset.annotate(birth_order=Coalesce(
+                    'date_of_birth',
+                    Value(date.min)
+                ))
+        return queryset.filter(
+            user=self.request.user
+        ).order_by(*ordering)
+
+    def filter_queryset(self, queryset, facets=True):
+        """Apply the filter backends, without the facet filters when
+        facets is False
+        """
+        for backend in self.filter_backends:
+            if facets or backend is not BovidFacetFilter:
+                queryset = backend().filter_queryset(
+                    self.request,
+                    queryset,
+                    self
+                )
+
+        return queryset
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
@@ -70,9 +177,104 @@ class BovidViewSet(viewsets.ModelViewSet):
             return serializers.BovidDetailSerializer
         elif self.action == 'upload_image':
             return serializers.BovidImageSerializer
+        elif self.action == 'events':
+            return serializers.LifeEventSerializer
+        elif self.action == 'bulk':
+            return serializers.BovidBulkSerializer
+        elif self.action in ('ancestors', 'descendants'):
+            return serializers.PedigreeSerializer
 
         return self.serializer_class
 
+    def list(self, request, *args, **kwargs):
+        """List bovines, or answer 304 if the client's list is current.
+
+        With ?facets=1 the response also counts the bovids per type,
+        breed and status, from the same grouped query the ETag is
+        derived from.
+        """
+        facets = None
+        if request.query_params.get('facets'):
+            facets, count, last_updated = BovidFacetFilter().counts(
+                request,
+                self.filter_queryset(self.get_queryset(), facets=False)
+            )
+        else:
+            state = self.filter_queryset(self.get_queryset()).aggregate(
+                count=Count('id'),
+                last_updated=Max('updated')
+            )
+            count, last_updated = state['count'], state['last_updated']
+        # Search matches life event notes too, which change no bovid
+        version = (herd_cache.version(request.user.pk)
+                   if request.query_params.get('search', '').strip() else '')
+        etag = conditional.make_etag(
+            request.user.pk,
+            request.get_full_path(),
+            count,
+            last_updated,
+            version
+        )
+        response = conditional.not_modified(request, etag)
+        if response is not None:
+            return response
+
+        response = self.list_values(request)
+        if facets is not None:
+            if not isinstance(response.data, dict):
+                response.data = {'results': response.data}
+            response.data['facets'] = facets
+
+        return conditional.add_validators(response, etag)
+
+    def list_values(self, request):
+        """List bovines like ListModelMixin.list, serialized from values()
+        rows by BovidValuesSerializer
+        """
+        ordering = self.paginator.requested_ordering(request)
+        rows = serializers.bovid_values_serializer.rows(
+            self.filter_queryset(self.get_queryset()),
+            *(field.lstrip('-') for field in ordering)
+        )
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(
+                serializers.bovid_values_serializer.to_representation(page)
+            )
+
+        return Response(
+            serializers.bovid_values_serializer.to_representation(rows)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Show a bovine, or answer 304 if the client's copy is current.
+
+        The serialized bovine and its validators come from the herd cache
+        when the user's data is unchanged.
+        """
+        key = herd_cache.key(request.user.pk, 'bovid', kwargs['pk'])
+        entry = herd_cache.get(key)
+        if entry is None:
+            bovid = self.get_object()
+            prefetch_related_objects([bovid], 'tags')
+            entry = (
+                conditional.make_etag(
+                    request.user.pk,
+                    bovid.pk,
+                    bovid.updated
+                ),
+                bovid.updated,
+                self.get_serializer(bovid).data
+            )
+            herd_cache.set(key, entry)
+
+        etag, updated, data = entry
+        response = conditional.not_modified(request, etag, updated)
+        if response is not None:
+            return response
+
+        return conditional.add_validators(Response(data), etag, updated)
+
     def perform_create(self, serializer):
         """Create a new bovine"""
         serializer.save(user=self.request.user)
@@ -81,10 +283,20 @@ class BovidViewSet(viewsets.ModelViewSet):
     def upload_image(self, request, pk=None):
         """Upload an image to a bovine"""
         bovid = self.get_object()
+        handler = uploads.HashingFileUploadHandler(
+            request._request,
+            max_size=settings.BOVID_IMAGE_MAX_SIZE
+        )
+        request._request.upload_handlers = [handler]
         serializer = self.get_serializer(
             bovid,
             data=request.data
         )
+        if handler.too_large:
+            return Response(
+                {'image': [serializers.image_too_large_message()]},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
 
         if serializer.is_valid():
             serializer.save()
@@ -97,3 +309,290 @@ class BovidViewSet(viewsets.ModelViewSet):
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    @action(methods=['POST'], detail=False)
+    def bulk(self, request):
+        """Create many bovines from a list in one transaction"""
+        serializer = self.get_serializer(data=request.data, many=True)
+
+        if serializer.is_valid():
+            with transaction.atomic():
+                bovids = serializer.save()
+            queryset = Bovid.objects.filter(
+                id__in=[bovid.id for bovid in bovids]
+            ).prefetch_related('tags').order_by('id')
+            return Response(
+                serializers.BovidSerializer(queryset, many=True).data,
+                status=status.HTTP_201_CREATED
+            )
+
+        return Response(
+            serializer.errors,
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(methods=['GET'], detail=True)
+    def events(self, request, pk=None):
+        """List the life events of a bovine, most recent first"""
+        bovid = self.get_object()
+        queryset = LifeEventFilter().filter_queryset(
+            request,
+            bovid.lifeevent_set.all(),
+            self
+        )
+
+        paginator = TimelinePagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(methods=['GET'], detail=True)
+    def ancestors(self, request, pk=None):
+        """List a bovine's ancestors, nearest generation first"""
+        return self._pedigree(pedigree.ancestors, pk)
+
+    @action(methods=['GET'], detail=True)
+    def descendants(self, request, pk=None):
+        """List a bovine's descendants, nearest generation first"""
+        return self._pedigree(pedigree.descendants, pk)
+
+    def _pedigree(self, query, pk):
+        """Return the relatives found by a pedigree query, up to
+        ?generations= generations away, in one query
+        """
+        generations = param_to_int(self.request.query_params, 'generations')
+        if generations is None:
+            generations = settings.PEDIGREE_GENERATIONS
+        generations = max(
+            0,
+            min(generations, settings.PEDIGREE_MAX_GENERATIONS)
+        )
+        try:
+            bovid_id = int(pk)
+        except ValueError:
+            raise Http404
+        bovids = query(self.request.user.pk, bovid_id, generations)
+        if bovids is None:
+            raise Http404
+
+        return Response(self.get_serializer(bovids[1:], many=True).data)
+
+    @action(methods=['GET'], detail=True)
+    def kinship(self, request, pk=None):
+        """Return a bovine's relationship to the ?mate= bovine and the
+        inbreeding coefficient of their calves
+        """
+        mate = param_to_int(request.query_params, 'mate')
+        if mate is None:
+            raise ValidationError({'mate': _('This field is required.')})
+        bovid_id, herd = self._herd_kinship(pk)
+        if mate not in herd.positions:
+            raise ValidationError({'mate': _('No such bovine in the herd.')})
+
+        return Response({
+            'id': bovid_id,
+            'mate': mate,
+            'relationship': round(herd.relationship(bovid_id, mate), 4),
+            'inbreeding': round(herd.inbreeding(bovid_id), 4),
+            'mate_inbreeding': round(herd.inbreeding(mate), 4),
+            'offspring_inbreeding': round(
+                herd.offspring_inbreeding(bovid_id, mate), 4
+            ),
+        })
+
+    @action(methods=['GET'], detail=True)
+    def sires(self, request, pk=None):
+        """List the ?limit= sires giving a cow the least inbred calves"""
+        limit = param_to_int(request.query_params, 'limit')
+        if limit is None:
+            limit = settings.KINSHIP_SIRES
+        limit = max(1, min(limit, settings.KINSHIP_MAX_SIRES))
+        bovid_id, herd = self._herd_kinship(pk)
+        names = dict(
+            kinship.sire_candidates(request.user.pk).values_list('id', 'name')
+        )
+
+        return Response([
+            {
+                'id': sire_id,
+                'name': names[sire_id],
+                'offspring_inbreeding': round(coefficient, 4),
+            }
+            for sire_id, coefficient in herd.best_sires(
+                bovid_id, names, limit
+            )
+        ])
+
+    def _herd_kinship(self, pk):
+        """Return the id of the requested bovine and the Kinship of the
+        user's herd, computed once per herd version
+        """
+        herd = kinship.herd_kinship(self.request.user.pk)
+        try:
+            bovid_id = int(pk)
+        except ValueError:
+            raise Http404
+        if bovid_id not in herd.positions:
+            raise Http404
+
+        return bovid_id, herd
+
+    @action(methods=['GET'], detail=False,
+            url_path=r'export/(?P<export_format>csv|ndjson)')
+    def export(self, request, export_format):
+        """Stream the user's herd with tag names as CSV or NDJSON"""
+        return streaming_export(
+            bovid_rows(self.filter_queryset(self.get_queryset())),
+            BOVID_EXPORT_FIELDS + ('tags',),
+            export_format,
+            'bovids',
+            compress=bool(request.query_params.get('gzip'))
+        )
+
+
+class BovidPhotoViewSet(viewsets.GenericViewSet,
+                        mixins.ListModelMixin,
+                        mixins.RetrieveModelMixin,
+                        mixins.UpdateModelMixin,
+                        mixins.DestroyModelMixin):
+    """Manage the gallery photos of bovines"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    queryset = BovidPhoto.objects.all()
+    serializer_class = serializers.BovidPhotoSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        """Return the user's photos, optionally of one bovine"""
+        queryset = self.queryset.filter(user=self.request.user)
+        bovid = param_to_int(self.request.query_params, 'bovid')
+        if bovid is not None:
+            queryset = queryset.filter(bovid_id=bovid)
+
+        return queryset.order_by(*self.pagination_class.ordering)
+
+
+class UploadSessionViewSet(viewsets.GenericViewSet,
+                           mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin):
+    """Upload gallery photos in chunks that can be resent individually.
+
+    Create a session with the bovid, filename and size, PUT the raw bytes
+    of each chunk to chunks/<index>/, check missing_chunks after an
+    interruption, then POST finalize/ to turn it into a photo.
+    """
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    queryset = UploadSession.objects.all()
+    serializer_class = serializers.UploadSessionSerializer
+
+    def get_queryset(self):
+        """Return the user's unexpired upload sessions"""
+        return self.queryset.filter(
+            user=self.request.user,
+            expires__gt=timezone.now()
+        )
+
+    def perform_create(self, serializer):
+        """Start a session with an empty part file"""
+        session = serializer.save(user=self.request.user)
+        uploads.create_part_file(session)
+
+    def perform_destroy(self, session):
+        """Abandon a session"""
+        session.discard()
+
+    @action(methods=['PUT'], detail=True, url_path=r'chunks/(?P<index>\d+)')
+    def chunk(self, request, pk=None, index=None):
+        """Write one chunk of the photo, resending a chunk is harmless"""
+        session = self.get_object()
+        index = int(index)
+        if index >= session.chunk_count:
+            return Response(
+                {'index': [_('The session has no such chunk.')]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        stream = request.stream
+        if stream is None or not uploads.write_chunk(session, index, stream):
+            return Response(
+                {'detail': _('Chunk {index} must be {length} bytes.').format(
+                    index=index,
+                    length=session.chunk_length(index)
+                )},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        UploadChunk.objects.get_or_create(session=session, index=index)
+
+        return Response(self.get_serializer(session).data)
+
+    @action(methods=['POST'], detail=True)
+    def finalize(self, request, pk=None):
+        """Turn a completely received session into a gallery photo"""
+        session = self.get_object()
+        missing = session.missing_chunks()
+        if missing:
+            return Response(
+                {'missing_chunks': missing},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        sha256 = uploads.part_sha256(session)
+        if session.sha256 and sha256 != session.sha256:
+            session.chunks.all().delete()
+            return Response(
+                {'sha256': [_('The photo does not match its checksum, '
+                              'send all chunks again.')]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        image_format = uploads.image_format(session.part_path)
+        if image_format is None:
+            session.discard()
+            return Response(
+                {'filename': [_('Upload a valid image.')]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic(), uploads.AssembledUpload(
+                session.part_path,
+                session.filename,
+                sha256,
+                image_format) as assembled:
+            photo = BovidPhoto.objects.create(
+                bovid=session.bovid,
+                user=request.user,
+                caption=session.caption,
+                image=assembled
+            )
+            session.discard()
+        images.schedule_variants(photo)
+
+        return Response(
+            serializers.BovidPhotoSerializer(
+                photo,
+                context=self.get_serializer_context()
+            ).data,
+            status=status.HTTP_201_CREATED
+        )
+
+
+class HerdStatisticsView(APIView):
+    """Return the dashboard statistics of the user's herd"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, format=None):
+        """Return the precomputed statistics"""
+        return Response(statistics.summary(request.user))
+
+
+class HerdCacheStatisticsView(APIView):
+    """Return the herd cache counters of the serving process"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, format=None):
+        """Return the hit and miss counters"""
+        return Response(herd_cache.stats())
@@ -1,8 +1,15 @@
+import os
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
 from django.utils.translation import gettext as _
 
-from core import models
+from core import models, profiling
 
 
 class EventInline(admin.TabularInline):
@@ -11,6 +18,7 @@ class EventInline(admin.TabularInline):
 
 class UserAdmin(BaseUserAdmin):
     ordering = ['id']
+    show_full_result_count = False
     list_display = ['email', 'name']
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
@@ -39,6 +47,7 @@ class BovidAdmin(admin.ModelAdmin):
     inlines = [
         EventInline,
     ]
+    show_full_result_count = False
     list_display = (
             'type_of_bovid',
             'date_of_birth',
@@ -56,9 +65,96 @@ class LifeEventAdmin(admin.ModelAdmin):
             'bovid',
             'user'
     )
+    list_select_related = ('bovid', 'user')
+    # Counting every event again for the filtered total is slow
+    show_full_result_count = False
+
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = (
+            'created',
+            'method',
+            'path',
+            'user',
+            'status',
+            'duration',
+            'queries',
+            'samples'
+    )
+    list_select_related = ('user',)
+    list_filter = ('method', 'status')
+    show_full_result_count = False
+    search_fields = ('path', 'user__email')
+    fields = readonly_fields = (
+            'created',
+            'user',
+            'method',
+            'path',
+            'status',
+            'duration',
+            'queries',
+            'samples',
+            'files',
+            'top_functions'
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/<kind>/',
+                self.admin_site.admin_view(self.download),
+                name='core_requestprofile_download'
+            ),
+        ] + super().get_urls()
+
+    def download(self, request, pk, kind):
+        """Serve the pstats or collapsed stacks file of a profile"""
+        profile = get_object_or_404(models.RequestProfile, pk=pk)
+        if not self.has_view_permission(request, profile):
+            raise PermissionDenied
+        paths = {'stats': profile.stats_path, 'stacks': profile.stacks_path}
+        if kind not in paths or not os.path.exists(paths[kind]):
+            raise Http404
+
+        return FileResponse(
+            open(paths[kind], 'rb'),
+            as_attachment=True,
+            filename=os.path.basename(paths[kind])
+        )
+
+    def files(self, profile):
+        """Links to download the profile files"""
+        return format_html(
+            '<a href="{}">pstats</a> | <a href="{}">collapsed stacks</a>',
+            reverse('admin:core_requestprofile_download',
+                    args=[profile.pk, 'stats']),
+            reverse('admin:core_requestprofile_download',
+                    args=[profile.pk, 'stacks'])
+        )
+
+    def top_functions(self, profile):
+        """The functions taking the most cumulative time"""
+        try:
+            return format_html('<pre>{}</pre>', profiling.summary(profile))
+        except OSError:
+            return _('The profile file is missing')
+
+    def delete_model(self, request, profile):
+        profile.discard()
+
+    def delete_queryset(self, request, queryset):
+        for profile in queryset:
+            profile.discard()
 
 
 admin.site.register(models.User, UserAdmin)
 admin.site.register(models.Tag)
 admin.site.register(models.Bovid, BovidAdmin)
 admin.site.register(models.LifeEvent, LifeEventAdmin)
+admin.site.register(models.RequestProfile, RequestProfileAdmin)
@@ -0,0 +1,135 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+class HerdCache:
+    """Read-through cache of serialized API data, keyed by user and the
+    user's herd data version.
+
+    Any write to a user's bovids, tags or life events bumps the version
+    (see core.signals), so entries of older versions are never read again
+    and simply age out. Versions and entries are kept in one of Django's
+    caches so processes can share them; a bounded LRU in each process
+    saves the round trip and unpickling for the hottest entries.
+    """
+
+    def __init__(self, size, timeout, alias):
+        self.size = size
+        self.timeout = timeout
+        self.alias = alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @property
+    def shared(self):
+        """Return the Django cache backing this cache"""
+        return caches[self.alias]
+
+    def version_key(self, user_id):
+        """Return the Django cache key of a user's data version"""
+        return f'herd-version:{user_id}'
+
+    def version(self, user_id):
+        """Return the current data version of a user"""
+        version = self.shared.get(self.version_key(user_id))
+        if version is None:
+            # A random start, so a lost version never revives old entries
+            self.shared.add(self.version_key(user_id), uuid.uuid4().hex,
+                            None)
+            version = self.shared.get(self.version_key(user_id))
+
+        return version
+
+    def bump(self, user_id):
+        """Start a new data version for a user.
+
+        Bumped again once the transaction commits, so an entry cached by
+        a request that read the old rows meanwhile is not served after.
+        """
+        self._set_version(user_id)
+        transaction.on_commit(lambda: self._set_version(user_id))
+
+    def _set_version(self, user_id):
+        """Store a new random data version for a user"""
+        self.shared.set(self.version_key(user_id), uuid.uuid4().hex, None)
+
+    def key(self, user_id, *parts):
+        """Return the cache key of a user's data at its current version"""
+        return ':'.join(
+            ['herd', str(user_id), self.version(user_id)] +
+            [str(part) for part in parts]
+        )
+
+    def get(self, key):
+        """Return the cached value of a key or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+        value = self.shared.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+        self._store(key, value, now)
+
+        return value
+
+    def set(self, key, value):
+        """Cache a value under a key from key()"""
+        self._store(key, value, time.monotonic())
+        self.shared.set(key, value, self.timeout)
+
+    def _store(self, key, value, now):
+        """Store an entry locally, evicting the least recently used"""
+        with self._lock:
+            self._entries[key] = (now + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Return the hit and miss counters of this process"""
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_ratio': (
+                    round((self.hits + self.shared_hits) / lookups, 4)
+                    if lookups else None
+                ),
+                'entries': len(self._entries),
+                'size': self.size,
+            }
+
+    def clear(self):
+        """Forget the local entries and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.shared_hits = self.misses = 0
+
+
+herd_cache = HerdCache(
+    size=getattr(settings, 'CATTLE_CACHE_SIZE', 1024),
+    timeout=getattr(settings, 'CATTLE_CACHE_TIMEOUT', 300),
+    alias=getattr(settings, 'CATTLE_CACHE_ALIAS', 'default')
+)
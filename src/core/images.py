@@ -0,0 +1,260 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from core.cache import herd_cache
+from core.models import Bovid, BovidPhoto, StoredImage
+
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> longest side in pixels, largest first so each variant
+# can be downscaled from the previous one
+VARIANT_SIZES = (
+    ('full', 1600),
+    ('card', 480),
+    ('thumb', 160),
+)
+
+# File extension -> Pillow format and save options
+VARIANT_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def image_storage():
+    """Return the storage bovid images are kept in"""
+    return Bovid._meta.get_field('image').storage
+
+
+def variant_name(image_name, variant, extension):
+    """Return the storage name of a variant of a bovid image"""
+    stem = os.path.splitext(image_name)[0]
+
+    return f'{stem}/{variant}.{extension}'
+
+
+def variant_names(image_name):
+    """Return {variant: {extension: storage name}} for a bovid image"""
+    return {
+        variant: {
+            extension: variant_name(image_name, variant, extension)
+            for extension, _, _ in VARIANT_FORMATS
+        }
+        for variant, _ in VARIANT_SIZES
+    }
+
+
+def variant_urls(instance):
+    """Return {variant: {extension: URL}} for the image of a bovid or
+    gallery photo, or None while the variants are not generated yet
+    """
+    return image_variant_urls(instance.image.name,
+                              instance.image_variants_ready)
+
+
+def image_variant_urls(image_name, ready):
+    """Return variant_urls() for an image stored under a name, None if
+    there is no image or its variants are not ready
+    """
+    if not image_name or not ready:
+        return None
+
+    storage = image_storage()
+    return {
+        variant: {
+            extension: storage.url(name)
+            for extension, name in names.items()
+        }
+        for variant, names in variant_names(image_name).items()
+    }
+
+
+def render_variants(source):
+    """Return [(variant, extension, bytes)] for an image file.
+
+    JPEGs are decoded at a reduced scale with draft(), larger steps are
+    done by reduce() (thumbnail's reducing_gap) before resampling. EXIF
+    orientation is applied and no metadata is written to the variants.
+    """
+    largest = VARIANT_SIZES[0][1]
+    with Image.open(source) as original:
+        original.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    image.info = {}
+
+    rendered = []
+    for variant, size in VARIANT_SIZES:
+        image.thumbnail((size, size), Image.LANCZOS, reducing_gap=3.0)
+        for extension, image_format, options in VARIANT_FORMATS:
+            buffer = io.BytesIO()
+            image.save(buffer, image_format, **options)
+            rendered.append((variant, extension, buffer.getvalue()))
+
+    return rendered
+
+
+def generate_variants(pk, user_id, image_name, model=Bovid):
+    """Render and store the variants of a bovid image (or of a gallery
+    photo, with model BovidPhoto), then mark them ready unless another
+    image was uploaded meanwhile
+    """
+    storage = image_storage()
+    names = [
+        name for extensions in variant_names(image_name).values()
+        for name in extensions.values()
+    ]
+    # Image names are content addresses, so existing variants are current
+    if not all(storage.exists(name) for name in names):
+        with storage.open(image_name) as source:
+            rendered = render_variants(source)
+        for variant, extension, content in rendered:
+            storage.save(
+                variant_name(image_name, variant, extension),
+                ContentFile(content)
+            )
+
+    changes = {'image_variants_ready': True}
+    if model is Bovid:
+        # A bovid's ETag is derived from `updated`, see cattle.conditional
+        changes['updated'] = timezone.now()
+    if model.objects.filter(pk=pk, image=image_name).update(**changes):
+        herd_cache.bump(user_id)
+
+
+def _generate_in_worker(*args):
+    """Run generate_variants in a pool thread, logging failures"""
+    try:
+        generate_variants(*args)
+    except Exception:
+        logger.exception('Could not generate variants of %s', args[2])
+    finally:
+        connection.close()
+
+
+def executor():
+    """Return the worker pool images are processed in"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'BOVID_IMAGE_WORKERS', 2),
+                thread_name_prefix='bovid-images'
+            )
+
+    return _executor
+
+
+def schedule_variants(instance):
+    """Generate the variants of the image of a bovid or gallery photo in
+    the worker pool once the upload is committed
+    """
+    args = (instance.pk, instance.user_id, instance.image.name,
+            type(instance))
+    transaction.on_commit(
+        lambda: executor().submit(_generate_in_worker, *args)
+    )
+
+
+def add_reference(name):
+    """Count one more bovid using an image file"""
+    rows = StoredImage.objects.filter(name=name)
+    if rows.update(refcount=F('refcount') + 1, updated=timezone.now()):
+        return
+    try:
+        with transaction.atomic():
+            StoredImage.objects.create(name=name, refcount=1)
+    except IntegrityError:
+        # Created concurrently, so count on that row instead
+        rows.update(refcount=F('refcount') + 1, updated=timezone.now())
+
+
+def remove_reference(name):
+    """Count one bovid less using an image file"""
+    StoredImage.objects.filter(name=name).update(
+        refcount=F('refcount') - 1,
+        updated=timezone.now()
+    )
+
+
+def recount_references():
+    """Recompute the reference counts from the bovids' images and
+    return the number of files in use
+    """
+    counts = {}
+    for model in (Bovid, BovidPhoto):
+        rows = model.objects.exclude(image='').exclude(image__isnull=True)
+        for name, refcount in rows.values_list('image').annotate(
+                refcount=Count('id')).order_by():
+            counts[name] = counts.get(name, 0) + refcount
+    with transaction.atomic():
+        StoredImage.objects.exclude(name__in=list(counts)).update(refcount=0)
+        known = set(StoredImage.objects.values_list('name', flat=True))
+        for name, refcount in counts.items():
+            if name in known:
+                StoredImage.objects.filter(name=name).update(
+                    refcount=refcount
+                )
+        StoredImage.objects.bulk_create([
+            StoredImage(name=name, refcount=refcount)
+            for name, refcount in counts.items() if name not in known
+        ])
+
+    return len(counts)
+
+
+def collect_garbage(min_age, dry_run=False):
+    """Delete image files, with their variants, that no bovid has used
+    for at least min_age (a timedelta) and return their names.
+
+    Saving an identical image touches the file, so a file that is being
+    reused by an upload that has not committed yet is kept too.
+    """
+    storage = image_storage()
+    cutoff = timezone.now() - min_age
+    candidates = list(StoredImage.objects.filter(
+        refcount__lte=0,
+        updated__lt=cutoff
+    ))
+    names = [stored.name for stored in candidates]
+    in_use = set(Bovid.objects.filter(
+        image__in=names
+    ).values_list('image', flat=True)) | set(BovidPhoto.objects.filter(
+        image__in=names
+    ).values_list('image', flat=True))
+
+    collected = []
+    for stored in candidates:
+        if stored.name in in_use:
+            continue
+        if storage.exists(stored.name) and \
+                storage.get_modified_time(stored.name) >= cutoff:
+            continue
+        if dry_run:
+            collected.append(stored.name)
+            continue
+        if not StoredImage.objects.filter(
+                pk=stored.pk,
+                refcount__lte=0).delete()[0]:
+            continue
+        for extensions in variant_names(stored.name).values():
+            for name in extensions.values():
+                storage.delete(name)
+        storage.delete(stored.name)
+        collected.append(stored.name)
+
+    return collected
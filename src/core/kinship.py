@@ -0,0 +1,330 @@
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from django.conf import settings
+from django.db.models import Q
+
+from core.cache import herd_cache
+from core.models import Bovid
+from core.pedigree import name_key
+
+
+UNKNOWN = -1
+
+_kinships = OrderedDict()
+_kinships_lock = threading.Lock()
+
+
+class Pedigree:
+    """A herd's pedigree as arrays, with parents ordered before offspring.
+
+    `ids` holds the bovid id of each animal, or 0 for a parent only known
+    by name. `dams` and `sires` hold the positions of the parents, or
+    UNKNOWN. `starts` holds the first position of each generation.
+    """
+
+    def __init__(self, ids, dams, sires):
+        ids = np.asarray(ids, dtype=np.int64)
+        dams = np.asarray(dams, dtype=np.int32)
+        sires = np.asarray(sires, dtype=np.int32)
+        generations = _generations(dams, sires)
+
+        order = np.argsort(generations, kind='stable')
+        positions = np.empty_like(order)
+        positions[order] = np.arange(len(order))
+        self.ids = ids[order]
+        self.dams = _moved(dams[order], positions)
+        self.sires = _moved(sires[order], positions)
+        self.starts = np.searchsorted(
+            generations[order],
+            np.arange(generations.max() + 1 if len(order) else 0)
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def generations(self):
+        """Yield the (start, stop) positions of each generation"""
+        stops = list(self.starts[1:]) + [len(self)]
+        return zip(self.starts, stops)
+
+
+def _moved(parents, positions):
+    """Return parent positions after reordering the animals"""
+    return np.where(parents == UNKNOWN, UNKNOWN,
+                    positions[parents]).astype(np.int32)
+
+
+def _generations(dams, sires):
+    """Return each animal's number of generations of known ancestors.
+
+    Links in a cycle, which only mismatched parent names can make, are
+    dropped (the arrays are changed in place).
+    """
+    count = len(dams)
+    children = [[] for _ in range(count)]
+    pending = np.zeros(count, dtype=np.int32)
+    for child in range(count):
+        for parent in {dams[child], sires[child]} - {UNKNOWN}:
+            children[parent].append(child)
+            pending[child] += 1
+
+    generations = np.zeros(count, dtype=np.int32)
+    ready = deque(np.flatnonzero(pending == 0))
+    while ready:
+        parent = ready.popleft()
+        for child in children[parent]:
+            generations[child] = max(generations[child],
+                                     generations[parent] + 1)
+            pending[child] -= 1
+            if pending[child] == 0:
+                ready.append(child)
+
+    stuck = set(np.flatnonzero(pending))
+    if stuck:
+        # Leave out the offspring of cycles, then unlink what remains
+        leaves = stuck
+        while leaves:
+            leaves = {
+                animal for animal in stuck
+                if stuck.isdisjoint(children[animal])
+            }
+            stuck -= leaves
+        cyclic = np.isin(np.arange(count), list(stuck))
+        for parents in (dams, sires):
+            parents[cyclic & np.isin(parents, list(stuck))] = UNKNOWN
+        return _generations(dams, sires)
+
+    return generations
+
+
+def load_pedigree(user_id):
+    """Return the pedigree of a user's herd, read in one query.
+
+    Parents are taken from the dam and sire links, or else from the
+    parent names: a name matching one bovid born before the child is
+    that bovid, a name matching no bovid is a founder shared by all
+    bovids naming it, and an ambiguous name is an unknown parent.
+    """
+    rows = list(Bovid.objects.filter(user_id=user_id).order_by(
+        'id'
+    ).values_list(
+        'id', 'name', 'dam_id', 'sire_id', 'mothers_name', 'fathers_name',
+        'date_of_birth'
+    ))
+    ids = [row[0] for row in rows]
+    positions = {pk: position for position, pk in enumerate(ids)}
+    named = {}
+    for position, row in enumerate(rows):
+        named.setdefault(name_key(row[1]), []).append(position)
+    founders = {}
+
+    def parent(link, name, child):
+        if link in positions:
+            return positions[link]
+        key = name_key(name)
+        if not key:
+            return UNKNOWN
+        if key not in named:
+            if key not in founders:
+                founders[key] = len(ids)
+                ids.append(0)
+            return founders[key]
+        born = rows[child][6]
+        matches = [
+            position for position in named[key]
+            if position != child and (
+                born is None or rows[position][6] is None or
+                rows[position][6] < born
+            )
+        ]
+        return matches[0] if len(matches) == 1 else UNKNOWN
+
+    dams = [parent(row[2], row[4], child) for child, row in enumerate(rows)]
+    sires = [parent(row[3], row[5], child) for child, row in enumerate(rows)]
+    founder_parents = [UNKNOWN] * len(founders)
+
+    return Pedigree(ids, dams + founder_parents, sires + founder_parents)
+
+
+def relationship_rows(pedigree, variances, positions, generations):
+    """Return the additive relationships of the animals at positions to
+    every animal, one column each, by Colleau's indirect method.
+
+    A = TDT', where T passes genes down from parents to offspring and D
+    holds the Mendelian sampling variances, so a column of A takes a pass
+    up the pedigree, a scaling and a pass down, a generation at a time.
+    Only the generations given, the first ones of the pedigree, are
+    visited, so earlier animals can be related before later variances
+    are known.
+    """
+    count = generations[-1][1] if generations else 0
+    # Unknown parents point at an extra row, which is reset to zeros
+    dams = np.where(pedigree.dams[:count] == UNKNOWN, count,
+                    pedigree.dams[:count])
+    sires = np.where(pedigree.sires[:count] == UNKNOWN, count,
+                     pedigree.sires[:count])
+    rows = np.zeros((count + 1, len(positions)))
+    rows[positions, np.arange(len(positions))] = 1
+
+    for start, stop in reversed(generations):
+        half = 0.5 * rows[start:stop]
+        np.add.at(rows, dams[start:stop], half)
+        np.add.at(rows, sires[start:stop], half)
+    rows[count] = 0
+    rows[:count] *= variances[:count, np.newaxis]
+    for start, stop in generations:
+        rows[start:stop] += 0.5 * (rows[dams[start:stop]] +
+                                   rows[sires[start:stop]])
+
+    return rows[:count]
+
+
+def mendelian_variances(pedigree):
+    """Return each animal's Mendelian sampling variance (the diagonal of
+    D in A = TDT') as float64.
+
+    An animal's inbreeding is half its parents' relationship, found from
+    the relationships of each dam to the earlier generations. Dams are
+    taken KINSHIP_CHUNK_SIZE relationships at a time to bound memory.
+    """
+    count = len(pedigree)
+    generations = list(pedigree.generations())
+    inbreeding = np.zeros(count + 1)
+    variances = np.ones(count)
+    dams = np.where(pedigree.dams == UNKNOWN, count, pedigree.dams)
+    sires = np.where(pedigree.sires == UNKNOWN, count, pedigree.sires)
+
+    for generation, (start, stop) in enumerate(generations):
+        chunk = max(1, getattr(settings, 'KINSHIP_CHUNK_SIZE', 2 ** 19) //
+                    (start + 1))
+        animals = np.arange(start, stop)
+        animals = animals[(dams[animals] != count) &
+                          (sires[animals] != count)]
+        parents, columns = np.unique(dams[animals], return_inverse=True)
+        for first in range(0, len(parents), chunk):
+            rows = relationship_rows(
+                pedigree,
+                variances,
+                parents[first:first + chunk],
+                generations[:generation]
+            )
+            chosen = (columns >= first) & (columns < first + chunk)
+            inbreeding[animals[chosen]] = 0.5 * rows[
+                sires[animals[chosen]], columns[chosen] - first
+            ]
+        variances[start:stop] = 1 - 0.25 * (
+            (dams[start:stop] != count) * (1 + inbreeding[dams[start:stop]]) +
+            (sires[start:stop] != count) * (1 + inbreeding[sires[start:stop]])
+        )
+
+    return variances
+
+
+class Kinship:
+    """Relationships between the bovids of a herd.
+
+    Only the pedigree and one variance per animal are kept, so a herd
+    takes memory in proportion to its size, and a bovid's relationships
+    are computed when asked for rather than kept as a matrix.
+    """
+
+    def __init__(self, pedigree):
+        self.pedigree = pedigree
+        self.variances = mendelian_variances(pedigree)
+        self.positions = {
+            int(pk): position for position, pk in enumerate(pedigree.ids)
+            if pk
+        }
+
+    def relationship(self, first_id, second_id):
+        """Return the additive relationship of two bovids, KeyError if
+        either is not in the herd
+        """
+        return float(
+            self.relationships(first_id)[self.positions[second_id]]
+        )
+
+    def relationships(self, bovid_id):
+        """Return the additive relationships of a bovid to every animal
+        in the pedigree, by position
+        """
+        return relationship_rows(
+            self.pedigree,
+            self.variances,
+            [self.positions[bovid_id]],
+            list(self.pedigree.generations())
+        )[:, 0]
+
+    def inbreeding(self, bovid_id):
+        """Return the inbreeding coefficient of a bovid"""
+        return self.relationship(bovid_id, bovid_id) - 1
+
+    def offspring_inbreeding(self, dam_id, sire_id):
+        """Return the inbreeding coefficient of a calf of two bovids"""
+        return self.relationship(dam_id, sire_id) / 2
+
+    def best_sires(self, dam_id, sire_ids, count):
+        """Return [(sire id, offspring inbreeding)] for the count sires
+        giving a cow the least inbred calves, lowest id first on ties
+        """
+        sire_ids = np.array(
+            [pk for pk in sire_ids if pk in self.positions and pk != dam_id],
+            dtype=np.int64
+        )
+        positions = np.array(
+            [self.positions[pk] for pk in sire_ids],
+            dtype=np.int64
+        )
+        coefficients = self.relationships(dam_id)[positions] / 2
+        best = np.lexsort((sire_ids, coefficients))[:count]
+
+        return [
+            (int(sire_ids[index]), float(coefficients[index]))
+            for index in best
+        ]
+
+
+def herd_kinship(user_id):
+    """Return the Kinship of a user's herd, computed once per herd data
+    version (see core.cache) and kept for the most recent herds
+    """
+    version = herd_cache.version(user_id)
+    with _kinships_lock:
+        cached = _kinships.get(user_id)
+        if cached is not None and cached[0] == version:
+            _kinships.move_to_end(user_id)
+            return cached[1]
+
+    kinship = Kinship(load_pedigree(user_id))
+    with _kinships_lock:
+        _kinships[user_id] = (version, kinship)
+        _kinships.move_to_end(user_id)
+        while len(_kinships) > getattr(settings, 'KINSHIP_CACHE_SIZE', 8):
+            _kinships.popitem(last=False)
+
+    return kinship
+
+
+def clear():
+    """Forget the cached kinships"""
+    with _kinships_lock:
+        _kinships.clear()
+
+
+def sire_candidates(user_id):
+    """Return the user's bovids that can sire calves: those alive and
+    still owned that are of a KINSHIP_SIRE_TYPES type or have sired one
+    """
+    is_sire = Q(sire_offspring__isnull=False)
+    for type_of_bovid in getattr(settings, 'KINSHIP_SIRE_TYPES', ()):
+        is_sire |= Q(type_of_bovid__iexact=type_of_bovid)
+
+    return Bovid.objects.filter(
+        is_sire,
+        user_id=user_id,
+        date_of_death__isnull=True,
+        date_sold__isnull=True
+    ).distinct()
@@ -0,0 +1,294 @@
+import json
+import random
+import subprocess
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Bovid, LifeEvent, Tag
+
+
+# Name -> (url name, takes a bovid id, query parameters). Parameters are
+# formatted with the sample, see Command.samples
+SCENARIOS = (
+    ('bovids', 'cattle:bovid-list', False, {'page_size': '50'}),
+    ('bovids_all', 'cattle:bovid-list', False, {}),
+    ('bovids_tags_all', 'cattle:bovid-list', False,
+     {'page_size': '50', 'tags_all': '{tags}'}),
+    ('bovids_tags_any', 'cattle:bovid-list', False,
+     {'page_size': '50', 'tags_any': '{tags}'}),
+    ('bovids_facets', 'cattle:bovid-list', False,
+     {'page_size': '50', 'facets': '1', 'status': 'alive'}),
+    ('bovids_by_age', 'cattle:bovid-list', False,
+     {'page_size': '50', 'ordering': 'age'}),
+    ('bovids_search', 'cattle:bovid-list', False,
+     {'page_size': '50', 'search': '{word}'}),
+    ('bovid_detail', 'cattle:bovid-detail', True, {}),
+    ('bovid_events', 'cattle:bovid-events', True, {}),
+    ('bovid_ancestors', 'cattle:bovid-ancestors', True, {}),
+    ('bovid_sires', 'cattle:bovid-sires', True, {}),
+    ('tags', 'cattle:tag-list', False, {}),
+    ('events', 'cattle:lifeevent-list', False, {'page_size': '50'}),
+    ('statistics', 'cattle:statistics', False, {}),
+)
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, percent):
+    """Return a percentile of sorted values, interpolating between the
+    two closest ranks
+    """
+    if not values:
+        return None
+    rank = (len(values) - 1) * percent / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def current_commit():
+    """Return the git commit of the source tree, or None outside a
+    checkout
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+            universal_newlines=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the API against a user's herd"""
+    help = (
+        'Request the API endpoints as a user, in process and one at a time, '
+        'and report latency percentiles, throughput and queries per '
+        'request. Results can be written as JSON and compared.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'email',
+            help='User whose herd is requested, see seed_herd'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Timed requests per scenario'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=5,
+            help='Untimed requests per scenario made first'
+        )
+        parser.add_argument(
+            '--scenarios',
+            nargs='+',
+            choices=[name for name, *_ in SCENARIOS],
+            help='Scenarios to run, default all'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed choosing the requested bovids'
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the results as JSON to this file'
+        )
+        parser.add_argument(
+            '--compare',
+            help='JSON results of an earlier run to compare with'
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        if options['requests'] < 1:
+            raise CommandError('--requests must be at least 1')
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'{options["email"]} does not exist')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as source:
+                baseline = json.load(source)
+
+        self.client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        samples = self.samples(user, options['seed'])
+        if not samples:
+            raise CommandError(f'{user.email} has no bovids')
+
+        results = {
+            'commit': current_commit(),
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'dataset': {
+                'bovids': Bovid.objects.filter(user=user).count(),
+                'tags': Tag.objects.filter(user=user).count(),
+                'events': LifeEvent.objects.filter(user=user).count(),
+            },
+            'requests': options['requests'],
+            'warmup': options['warmup'],
+            'scenarios': {},
+        }
+        chosen = options['scenarios']
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        with override_settings(ALLOWED_HOSTS=hosts):
+            for scenario in SCENARIOS:
+                if chosen and scenario[0] not in chosen:
+                    continue
+                results['scenarios'][scenario[0]] = self.run(
+                    scenario, samples, options
+                )
+                self.report(scenario[0], results['scenarios'][scenario[0]])
+
+        if baseline is not None:
+            self.compare(baseline, results)
+        if options['output']:
+            with open(options['output'], 'w') as target:
+                json.dump(results, target, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Results written to {options["output"]}'
+            ))
+
+    def samples(self, user, seed):
+        """Return up to 100 random sets of request parameters, each a
+        bovid id, two of the user's most used tags and a word of a name
+        """
+        rng = random.Random(seed)
+        bovids = list(
+            Bovid.objects.filter(user=user).order_by('id').values_list(
+                'id', 'name'
+            )
+        )
+        tags = list(
+            Tag.objects.filter(user=user).annotate(
+                bovids=Count('bovid')
+            ).order_by('-bovids', 'id').values_list('id', flat=True)[:4]
+        )
+
+        samples = []
+        for pk, name in rng.sample(bovids, min(len(bovids), 100)):
+            words = name.split() or ['']
+            samples.append({
+                'bovid': pk,
+                'tags': ','.join(
+                    str(tag) for tag in rng.sample(tags, min(len(tags), 2))
+                ),
+                'word': rng.choice(words),
+            })
+
+        return samples
+
+    def run(self, scenario, samples, options):
+        """Request a scenario and return its measurements"""
+        name, url_name, detail, params = scenario
+        latencies, queries, statuses = [], [], Counter()
+        counter = QueryCounter()
+
+        with connection.execute_wrapper(counter):
+            total = options['warmup'] + options['requests']
+            began = time.perf_counter()
+            for number in range(total):
+                sample = samples[number % len(samples)]
+                url = reverse(
+                    url_name, args=[sample['bovid']] if detail else []
+                )
+                data = {
+                    key: value.format(**sample)
+                    for key, value in params.items()
+                }
+                if number == options['warmup']:
+                    began = time.perf_counter()
+                counter.count = 0
+                start = time.perf_counter()
+                res = self.client.get(url, data)
+                elapsed = time.perf_counter() - start
+                if number < options['warmup']:
+                    continue
+                latencies.append(elapsed * 1000)
+                queries.append(counter.count)
+                statuses[str(res.status_code)] += 1
+            duration = time.perf_counter() - began
+
+        latencies.sort()
+        measured = {
+            f'p{percent}': round(percentile(latencies, percent), 3)
+            for percent in PERCENTILES
+        }
+        measured['mean'] = round(sum(latencies) / len(latencies), 3)
+        measured['max'] = round(latencies[-1], 3)
+
+        return {
+            'latency_ms': measured,
+            'throughput_rps': round(len(latencies) / duration, 2),
+            'queries_per_request': round(sum(queries) / len(queries), 2),
+            'max_queries': max(queries),
+            'statuses': dict(statuses),
+        }
+
+    def report(self, name, result):
+        """Write one scenario's measurements"""
+        latency = result['latency_ms']
+        self.stdout.write(
+            f'{name:<18} p50 {latency["p50"]:>9.2f}ms '
+            f'p95 {latency["p95"]:>9.2f}ms p99 {latency["p99"]:>9.2f}ms '
+            f'{result["throughput_rps"]:>8.1f} req/s '
+            f'{result["queries_per_request"]:>6.1f} queries '
+            f'{result["statuses"]}'
+        )
+
+    def compare(self, baseline, results):
+        """Write the p95 latency and query changes from a baseline run"""
+        self.stdout.write(
+            f'Compared with {baseline.get("commit") or "baseline"} '
+            f'({baseline.get("created", "")})'
+        )
+        for name, result in results['scenarios'].items():
+            before = baseline.get('scenarios', {}).get(name)
+            if before is None:
+                continue
+            old = before['latency_ms']['p95']
+            new = result['latency_ms']['p95']
+            change = (new - old) / old * 100 if old else 0
+            self.stdout.write(
+                f'{name:<18} p95 {old:>9.2f}ms -> {new:>9.2f}ms '
+                f'{change:>+7.1f}% queries '
+                f'{before["queries_per_request"]} -> '
+                f'{result["queries_per_request"]}'
+            )
+
+
+class QueryCounter:
+    """Database execute wrapper counting the queries run"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
@@ -0,0 +1,111 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from rest_framework.renderers import JSONRenderer
+
+from cattle.serializers import BovidSerializer, bovid_values_serializer
+from core.management.commands.benchmark_api import current_commit
+from core.models import Bovid, Tag
+
+
+def serialize_models(queryset):
+    """Render bovids the ModelSerializer way, as BovidViewSet.list did"""
+    models = queryset.prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.order_by('id'))
+    )
+    return JSONRenderer().render(BovidSerializer(models, many=True).data)
+
+
+def serialize_values(queryset):
+    """Render bovids with BovidValuesSerializer"""
+    return JSONRenderer().render(bovid_values_serializer.to_representation(
+        bovid_values_serializer.rows(queryset)
+    ))
+
+
+class Command(BaseCommand):
+    """Django command to compare the bovid list serializers"""
+    help = (
+        "Time rendering a page of a user's bovids with BovidSerializer and "
+        'with BovidValuesSerializer, queries included, and check both '
+        'render the same bytes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'email',
+            help='User whose bovids are serialized, see seed_herd'
+        )
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=10000,
+            help='Bovids per page'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Timed runs of each serializer, the fastest counts'
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the results as JSON to this file'
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError('--rows and --repeat must be at least 1')
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'{options["email"]} does not exist')
+
+        queryset = Bovid.objects.filter(user=user).order_by(
+            '-created', '-id'
+        )[:options['rows']]
+        rows = queryset.count()
+        if not rows:
+            raise CommandError(f'{user.email} has no bovids')
+
+        results = {
+            'commit': current_commit(),
+            'created': timezone.now().isoformat(),
+            'rows': rows,
+            'serializers': {},
+        }
+        rendered = {}
+        for name, serialize in (('BovidSerializer', serialize_models),
+                                ('BovidValuesSerializer', serialize_values)):
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                rendered[name] = serialize(queryset)
+                timings.append(time.perf_counter() - start)
+            results['serializers'][name] = {
+                'seconds': round(min(timings), 4),
+                'rows_per_second': round(rows / min(timings)),
+            }
+            self.stdout.write(
+                f'{name:<22} {min(timings) * 1000:>9.1f}ms '
+                f'{rows / min(timings):>10.0f} rows/s'
+            )
+
+        speedup = (results['serializers']['BovidSerializer']['seconds'] /
+                   results['serializers']['BovidValuesSerializer']['seconds'])
+        results['speedup'] = round(speedup, 2)
+        results['identical'] = (rendered['BovidSerializer'] ==
+                                rendered['BovidValuesSerializer'])
+        self.stdout.write(f'{speedup:.1f}x faster, output identical: '
+                          f'{results["identical"]}')
+        if options['output']:
+            with open(options['output'], 'w') as target:
+                json.dump(results, target, indent=2)
+        if not results['identical']:
+            raise CommandError('The serializers render different output')
@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import images
+from core.models import UploadSession
+
+
+class Command(BaseCommand):
+    """Django command to delete image files no bovid uses any more"""
+    help = (
+        'Delete bovid image files, and their variants, whose reference '
+        'count has been zero for at least --min-age hours, and discard '
+        'expired upload sessions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=float,
+            default=24,
+            help='Hours a file must have been unused, default 24'
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Recompute the reference counts from the bovids first'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the files that would be deleted'
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        if options['recount']:
+            in_use = images.recount_references()
+            self.stdout.write(f'Recounted references, {in_use} files in use')
+
+        collected = images.collect_garbage(
+            timedelta(hours=options['min_age']),
+            dry_run=options['dry_run']
+        )
+        for name in collected:
+            self.stdout.write(name)
+        expired = UploadSession.objects.filter(expires__lt=timezone.now())
+        sessions = len(expired)
+        if not options['dry_run']:
+            for session in expired:
+                session.discard()
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {len(collected)} unused images and {sessions} '
+            f'expired upload sessions'
+        ))
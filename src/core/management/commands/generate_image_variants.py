@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from core import images
+from core.models import Bovid, BovidPhoto
+
+
+class Command(BaseCommand):
+    """Django command to generate missing bovid image variants"""
+    help = (
+        'Generate the thumb, card and full variants of bovid and gallery '
+        'images that do not have them yet, eg images uploaded before '
+        'variants existed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Regenerate the variants of every image'
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        done = failed = 0
+        for model in (Bovid, BovidPhoto):
+            rows = model.objects.exclude(image='').exclude(image__isnull=True)
+            if not options['all']:
+                rows = rows.filter(image_variants_ready=False)
+
+            for pk, user_id, image_name in rows.values_list(
+                    'id', 'user_id', 'image').iterator():
+                try:
+                    images.generate_variants(pk, user_id, image_name, model)
+                except (OSError, ValueError) as exc:
+                    failed += 1
+                    self.stderr.write(f'{image_name}: {exc}')
+                else:
+                    done += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated variants of {done} images, {failed} failed'
+        ))
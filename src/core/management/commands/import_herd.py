@@ -0,0 +1,378 @@
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction, DatabaseError
+
+from core import statistics
+from core.cache import herd_cache
+
+
+# Staging columns in file order, with their PostgreSQL types. `ref` is the
+# id of the row in the source system and may also be given as `id`, the
+# parents' refs may be given as `dam` and `sire` (as in the API export).
+BOVID_COLUMNS = (
+    ('ref', 'text'),
+    ('mother', 'text'),
+    ('father', 'text'),
+    ('mothers_name', 'text'),
+    ('fathers_name', 'text'),
+    ('type_of_bovid', 'text'),
+    ('breed', 'text'),
+    ('name', 'text'),
+    ('breeder', 'text'),
+    ('price', 'numeric'),
+    ('date_of_birth', 'date'),
+    ('date_of_death', 'date'),
+    ('date_of_purchase', 'date'),
+    ('date_sold', 'date'),
+    ('tags', 'text'),
+)
+
+# Other names a staging column's value may be given under
+STAGE_FALLBACKS = {
+    'ref': 'id',
+    'mother': 'dam',
+    'father': 'sire',
+}
+
+EVENT_COLUMNS = (
+    ('ref', 'text'),
+    ('bovid', 'text'),
+    ('event_type', 'text'),
+    ('notes', 'text'),
+    ('event_date', 'date'),
+    ('created', 'timestamptz'),
+)
+
+BOVID_FIELDS = (
+    'mothers_name', 'fathers_name', 'type_of_bovid', 'breed', 'name',
+    'breeder', 'price', 'date_of_birth', 'date_of_death', 'date_of_purchase',
+    'date_sold',
+)
+
+TAGS_SQL = """
+    INSERT INTO core_tag (name, user_id)
+    SELECT DISTINCT btrim(tag.name), %(user)s
+    FROM import_bovid, unnest(string_to_array(tags, '|')) AS tag(name)
+    WHERE btrim(tag.name) <> ''
+    AND NOT EXISTS (
+        SELECT 1 FROM core_tag
+        WHERE user_id = %(user)s AND name = btrim(tag.name)
+    )
+"""
+
+PARENT_FROM_FILE_SQL = """
+    UPDATE import_bovid AS child SET {name} = parent.name
+    FROM import_bovid AS parent
+    WHERE child.{ref} = parent.ref AND coalesce(child.{name}, '') = ''
+"""
+
+PARENT_FROM_HERD_SQL = """
+    UPDATE import_bovid AS child SET {name} = parent.name
+    FROM core_bovid AS parent
+    WHERE parent.user_id = %(user)s AND parent.import_ref = child.{ref}
+    AND coalesce(child.{name}, '') = ''
+"""
+
+BOVIDS_SQL = """
+    INSERT INTO core_bovid (
+        import_ref, mothers_name, fathers_name, type_of_bovid, breed, name,
+        breeder, price, date_of_birth, date_of_death, date_of_purchase,
+        date_sold, image, image_variants_ready, created, updated, user_id
+    )
+    SELECT DISTINCT ON (ref)
+        ref, coalesce(mothers_name, ''), coalesce(fathers_name, ''),
+        type_of_bovid, coalesce(breed, ''), name, coalesce(breeder, ''),
+        coalesce(price, 0), date_of_birth, date_of_death, date_of_purchase,
+        date_sold, '', false, now(), now(), %(user)s
+    FROM import_bovid
+    ORDER BY ref, line DESC
+    ON CONFLICT (user_id, import_ref) DO UPDATE SET {updates}, updated = now()
+"""
+
+PARENT_LINK_SQL = """
+    UPDATE core_bovid AS child SET {column} = parent.id
+    FROM import_bovid
+    JOIN core_bovid AS parent
+        ON parent.user_id = %(user)s AND parent.import_ref = import_bovid.{ref}
+    WHERE child.user_id = %(user)s AND child.import_ref = import_bovid.ref
+    AND parent.id <> child.id
+"""
+
+BOVID_TAGS_SQL = """
+    INSERT INTO core_bovid_tags (bovid_id, tag_id)
+    SELECT DISTINCT bovid.id, tag_ids.id
+    FROM import_bovid
+    JOIN core_bovid AS bovid
+        ON bovid.user_id = %(user)s AND bovid.import_ref = import_bovid.ref
+    CROSS JOIN unnest(string_to_array(import_bovid.tags, '|')) AS tag(name)
+    JOIN (
+        SELECT name, min(id) AS id FROM core_tag
+        WHERE user_id = %(user)s GROUP BY name
+    ) AS tag_ids ON tag_ids.name = btrim(tag.name)
+    ON CONFLICT DO NOTHING
+"""
+
+# Events without a ref are keyed on a hash of their content, so importing
+# the same file again updates them like any other event instead of copying
+EVENTS_SQL = """
+    INSERT INTO core_lifeevent (
+        import_ref, event_type, notes, event_date, created, bovid_id, user_id
+    )
+    SELECT DISTINCT ON (event.import_ref)
+        event.import_ref, event.event_type, coalesce(event.notes, ''),
+        event.event_date, coalesce(event.created, now()), bovid.id,
+        %(user)s
+    FROM (
+        SELECT staged.*, coalesce(staged.ref, '#' || md5(row(
+            staged.bovid, staged.event_type, staged.event_date,
+            coalesce(staged.notes, '')
+        )::text)) AS import_ref
+        FROM import_event AS staged
+    ) AS event
+    JOIN core_bovid AS bovid
+        ON bovid.user_id = %(user)s AND bovid.import_ref = event.bovid
+    ORDER BY event.import_ref, event.line DESC
+    ON CONFLICT (user_id, import_ref) DO UPDATE SET
+        event_type = EXCLUDED.event_type, notes = EXCLUDED.notes,
+        event_date = EXCLUDED.event_date, bovid_id = EXCLUDED.bovid_id
+"""
+
+
+def read_rows(path):
+    """Yield dicts from a CSV or NDJSON file, optionally gzipped"""
+    name = path[:-3] if path.endswith('.gz') else path
+    opener = gzip.open if path.endswith('.gz') else open
+    extension = os.path.splitext(name)[1].lower()
+    if extension not in ('.csv', '.ndjson', '.jsonl'):
+        raise CommandError(f'Unsupported file type: {path}')
+
+    with opener(path, 'rt', encoding='utf-8', newline='') as source:
+        if extension == '.csv':
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def stage_value(row, column):
+    """Return a row's value for a staging column as COPY CSV text"""
+    value = row.get(column)
+    if value in (None, '') and column in STAGE_FALLBACKS:
+        value = row.get(STAGE_FALLBACKS[column])
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return '|'.join(str(item) for item in value)
+
+    return str(value)
+
+
+class Command(BaseCommand):
+    """Django command to import a herd from CSV or NDJSON files"""
+    help = (
+        'Import bovids, tags and life events for a user from CSV or NDJSON '
+        'files (such as the API exports) using PostgreSQL COPY.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of the owning user')
+        parser.add_argument('--bovids', help='File of bovids to import')
+        parser.add_argument('--events', help='File of life events to import')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50000,
+            help='Rows staged per COPY and transaction'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Stage and check everything, then roll back'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording progress so an import can be resumed'
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        if connection.vendor != 'postgresql':
+            raise CommandError('import_herd needs PostgreSQL (it uses COPY)')
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["email"]}')
+
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        self.checkpoint_path = None if self.dry_run else options['checkpoint']
+        self.progress = self.load_checkpoint(user, options)
+
+        try:
+            if self.dry_run:
+                with transaction.atomic():
+                    self.run_import(user, options)
+                    transaction.set_rollback(True)
+            else:
+                self.run_import(user, options)
+        except DatabaseError as exc:
+            raise CommandError(f'Import failed: {exc}')
+
+        if self.dry_run:
+            self.stdout.write('Dry run, nothing was saved.')
+        self.stdout.write(self.style.SUCCESS('Import complete!'))
+
+    def run_import(self, user, options):
+        """Import the given files, skipping work a checkpoint says is done"""
+        if options['bovids'] and not self.progress['bovids']:
+            self.import_bovids(user, options['bovids'])
+        if options['events']:
+            self.import_events(user, options['events'])
+
+    def load_checkpoint(self, user, options):
+        """Return the progress saved by an earlier run of this import"""
+        progress = {
+            'user': user.email,
+            'bovids_file': options['bovids'],
+            'events_file': options['events'],
+            'bovids': False,
+            'events': 0,
+        }
+        if not self.checkpoint_path or \
+                not os.path.exists(self.checkpoint_path):
+            return progress
+
+        with open(self.checkpoint_path) as checkpoint:
+            saved = json.load(checkpoint)
+        for key in ('user', 'bovids_file', 'events_file'):
+            if saved.get(key) != progress[key]:
+                raise CommandError(
+                    f'Checkpoint {self.checkpoint_path} belongs to another '
+                    f'import ({key} differs)'
+                )
+        self.stdout.write(
+            f'Resuming: bovids done: {saved["bovids"]}, '
+            f'events done: {saved["events"]}'
+        )
+
+        return saved
+
+    def save_checkpoint(self):
+        """Record progress after a stage's transaction has finished"""
+        if self.checkpoint_path:
+            with open(self.checkpoint_path, 'w') as checkpoint:
+                json.dump(self.progress, checkpoint)
+
+    def create_staging_table(self, cursor, table, columns):
+        """Create an empty temporary table to COPY rows into"""
+        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {table} (line bigserial, %s)' %
+            ', '.join(f'{name} {kind}' for name, kind in columns)
+        )
+
+    def copy_rows(self, cursor, table, columns, rows):
+        """COPY a batch of rows into a staging table"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([stage_value(row, name) for name, _ in columns])
+        buffer.seek(0)
+        cursor.copy_expert(
+            f'COPY {table} (%s) FROM STDIN WITH (FORMAT csv)' %
+            ', '.join(name for name, _ in columns),
+            buffer
+        )
+
+    def batches(self, rows):
+        """Yield lists of at most batch_size rows"""
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def import_bovids(self, user, path):
+        """Stage all bovids, then create their tags, parents and links"""
+        params = {'user': user.id}
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.create_staging_table(cursor, 'import_bovid', BOVID_COLUMNS)
+            count = 0
+            for batch in self.batches(read_rows(path)):
+                self.copy_rows(cursor, 'import_bovid', BOVID_COLUMNS, batch)
+                count += len(batch)
+                self.stdout.write(f'bovids: {count} rows staged')
+
+            cursor.execute(
+                'SELECT count(*) FROM import_bovid WHERE ref IS NULL'
+            )
+            missing = cursor.fetchone()[0]
+            if missing:
+                raise CommandError(
+                    f'{missing} bovids have no id or ref column value'
+                )
+
+            cursor.execute(TAGS_SQL, params)
+            self.stdout.write(f'tags: {cursor.rowcount} created')
+
+            for ref, name in (('mother', 'mothers_name'),
+                              ('father', 'fathers_name')):
+                cursor.execute(PARENT_FROM_FILE_SQL.format(ref=ref, name=name))
+                cursor.execute(
+                    PARENT_FROM_HERD_SQL.format(ref=ref, name=name),
+                    params
+                )
+
+            cursor.execute(BOVIDS_SQL.format(updates=', '.join(
+                f'{field} = EXCLUDED.{field}' for field in BOVID_FIELDS
+            )), params)
+            self.stdout.write(f'bovids: {cursor.rowcount} created or updated')
+
+            for ref, column in (('mother', 'dam_id'), ('father', 'sire_id')):
+                cursor.execute(
+                    PARENT_LINK_SQL.format(ref=ref, column=column),
+                    params
+                )
+
+            cursor.execute(BOVID_TAGS_SQL, params)
+            self.stdout.write(f'bovid tags: {cursor.rowcount} linked')
+            cursor.execute('DROP TABLE import_bovid')
+            statistics.rebuild([user.id])
+            herd_cache.bump(user.id)
+
+        self.progress['bovids'] = True
+        self.save_checkpoint()
+
+    def import_events(self, user, path):
+        """Import life events in batches, one transaction per batch"""
+        params = {'user': user.id}
+        rows = itertools.islice(read_rows(path), self.progress['events'], None)
+        for batch in self.batches(rows):
+            with transaction.atomic(), connection.cursor() as cursor:
+                self.create_staging_table(
+                    cursor,
+                    'import_event',
+                    EVENT_COLUMNS
+                )
+                self.copy_rows(cursor, 'import_event', EVENT_COLUMNS, batch)
+                cursor.execute(EVENTS_SQL, params)
+                imported = cursor.rowcount
+                cursor.execute('DROP TABLE import_event')
+                herd_cache.bump(user.id)
+
+            self.progress['events'] += len(batch)
+            self.save_checkpoint()
+            self.stdout.write(
+                f'events: {self.progress["events"]} rows done, '
+                f'{imported} imported from this batch, '
+                f'{len(batch) - imported} skipped (unknown bovid or duplicate)'
+            )
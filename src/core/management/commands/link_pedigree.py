@@ -0,0 +1,119 @@
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.cache import herd_cache
+from core.models import Bovid
+from core.pedigree import name_key
+
+
+PARENT_FIELDS = (
+    ('dam_id', 'mothers_name'),
+    ('sire_id', 'fathers_name'),
+)
+
+
+def is_ancestor(parents, bovid_id, ancestor_id):
+    """Return whether ancestor_id is bovid_id or one of its ancestors,
+    following {id: (dam_id, sire_id)}
+    """
+    stack = [bovid_id]
+    seen = set()
+    while stack:
+        current = stack.pop()
+        if current == ancestor_id:
+            return True
+        if current in seen:
+            continue
+        seen.add(current)
+        stack.extend(parent for parent in parents[current] if parent)
+
+    return False
+
+
+class Command(BaseCommand):
+    """Django command to link bovids to their parents by name"""
+    help = (
+        'Set the dam and sire of bovids whose mothers_name or fathers_name '
+        'matches exactly one other bovid of the same user.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'emails',
+            nargs='*',
+            help='Emails of the users to link, default everyone'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be linked without saving'
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        users = get_user_model().objects.all()
+        if options['emails']:
+            users = users.filter(email__in=options['emails'])
+            if users.count() != len(set(options['emails'])):
+                raise CommandError('Some of the users do not exist')
+
+        totals = defaultdict(int)
+        for user_id in users.values_list('id', flat=True):
+            changed = self.link_herd(user_id, totals)
+            if changed and not options['dry_run']:
+                now = timezone.now()
+                for bovid in changed:
+                    bovid.updated = now
+                with transaction.atomic():
+                    Bovid.objects.bulk_update(
+                        changed,
+                        ['dam', 'sire', 'updated'],
+                        batch_size=500
+                    )
+                herd_cache.bump(user_id)
+
+        verb = 'Would link' if options['dry_run'] else 'Linked'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {totals["linked"]} parents, {totals["ambiguous"]} '
+            f'names match several bovids, {totals["unknown"]} match none'
+        ))
+
+    def link_herd(self, user_id, totals):
+        """Resolve the parent names of a user's bovids and return the
+        bovids that got a parent
+        """
+        bovids = list(Bovid.objects.filter(user_id=user_id).only(
+            'id', 'name', 'mothers_name', 'fathers_name', 'dam', 'sire',
+            'date_of_birth'
+        ))
+        by_name = defaultdict(list)
+        for bovid in bovids:
+            by_name[name_key(bovid.name)].append(bovid)
+        parents = {bovid.id: (bovid.dam_id, bovid.sire_id) for bovid in bovids}
+
+        changed = {}
+        for bovid in bovids:
+            for field, name_field in PARENT_FIELDS:
+                name = getattr(bovid, name_field)
+                if getattr(bovid, field) or not name.strip():
+                    continue
+                candidates = [
+                    candidate for candidate in by_name[name_key(name)]
+                    if not is_ancestor(parents, candidate.id, bovid.id) and
+                    not (candidate.date_of_birth and bovid.date_of_birth and
+                         candidate.date_of_birth >= bovid.date_of_birth)
+                ]
+                if len(candidates) != 1:
+                    totals['ambiguous' if candidates else 'unknown'] += 1
+                    continue
+
+                setattr(bovid, field, candidates[0].id)
+                parents[bovid.id] = (bovid.dam_id, bovid.sire_id)
+                changed[bovid.id] = bovid
+                totals['linked'] += 1
+
+        return list(changed.values())
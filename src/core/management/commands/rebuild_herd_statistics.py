@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import statistics
+
+
+class Command(BaseCommand):
+    """Django command to recompute the herd statistics from the bovids"""
+    help = 'Recompute the herd statistics of some or all users.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'emails',
+            nargs='*',
+            help='Emails of the users to rebuild, default everyone'
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        user_ids = None
+        if options['emails']:
+            users = get_user_model().objects.filter(
+                email__in=options['emails']
+            )
+            user_ids = list(users.values_list('id', flat=True))
+            if len(user_ids) != len(set(options['emails'])):
+                raise CommandError('Some of the users do not exist')
+
+        rows = statistics.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt herd statistics ({rows} rows)'
+        ))
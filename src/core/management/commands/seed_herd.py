@@ -0,0 +1,375 @@
+import bisect
+import itertools
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+
+from core import statistics
+from core.cache import herd_cache
+from core.models import Bovid, LifeEvent, Tag
+
+
+BREEDS = (
+    ('Nguni', 30), ('Bonsmara', 25), ('Brahman', 15), ('Afrikaner', 10),
+    ('Drakensberger', 8), ('Simmentaler', 7), ('Angus', 5),
+)
+
+NAME_PARTS = (
+    'Bles', 'Bont', 'Blom', 'Dapper', 'Koffie', 'Maan', 'Rooi', 'Skaduwee',
+    'Sterre', 'Swart', 'Wit', 'Vlek', 'Son', 'Reen', 'Klein', 'Groot',
+)
+
+TAG_NAMES = (
+    'vaccinated', 'dipped', 'pregnant', 'for sale', 'show', 'weaned',
+    'camp north', 'camp south', 'camp river', 'treated', 'breeding',
+    'culled', 'heifer', 'replacement', 'feedlot', 'bottle fed',
+)
+
+# Event type -> words its notes are made of
+EVENTS = (
+    ('weighed', ('weight', 'gain', 'condition', 'good', 'poor', 'kg')),
+    ('vaccinated', ('anthrax', 'botulism', 'lumpy', 'skin', 'booster')),
+    ('dipped', ('ticks', 'dip', 'pour', 'on', 'heavy', 'light')),
+    ('vet', ('limping', 'eye', 'infection', 'treated', 'antibiotic',
+             'follow', 'up', 'hoof', 'trimmed')),
+    ('moved', ('camp', 'north', 'south', 'river', 'grazing', 'veld')),
+)
+
+# Share of animals that are bulls, sold and dead
+BULL_SHARE = 0.06
+SOLD_SHARE = 0.2
+DEAD_SHARE = 0.1
+
+# Days between a parent's birth and its first calf
+BREEDING_AGE = 2 * 365
+
+
+class Command(BaseCommand):
+    """Django command to generate synthetic herds for benchmarks"""
+    help = (
+        'Create users with synthetic herds: bovids with multi-generation '
+        'pedigrees, tags and years of life events, inserted in batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1,
+            help='Number of users to create'
+        )
+        parser.add_argument(
+            '--bovids',
+            type=int,
+            default=1000,
+            help='Bovids per user'
+        )
+        parser.add_argument(
+            '--events',
+            type=int,
+            default=10,
+            help='Average life events per bovid'
+        )
+        parser.add_argument(
+            '--tags',
+            type=int,
+            default=20,
+            help='Tags per user'
+        )
+        parser.add_argument(
+            '--years',
+            type=int,
+            default=10,
+            help='Years of history the herds span'
+        )
+        parser.add_argument(
+            '--prefix',
+            default='seed',
+            help='Users are named <prefix><n>@threecows.test'
+        )
+        parser.add_argument(
+            '--password',
+            default='seedpass',
+            help='Password of the created users'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed, the same seed gives the same herds'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows inserted per query'
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        if options['bovids'] < 1 or options['users'] < 1:
+            raise CommandError('--users and --bovids must be at least 1')
+        emails = [
+            f'{options["prefix"]}{n}@threecows.test'
+            for n in range(options['users'])
+        ]
+        existing = get_user_model().objects.filter(email__in=emails)
+        if existing.exists():
+            raise CommandError(
+                f'{existing.first().email} already exists, use another '
+                f'--prefix'
+            )
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.today = timezone.now().date()
+        self.start = self.today - timedelta(days=365 * options['years'])
+        self.totals = {'bovids': 0, 'tags': 0, 'events': 0}
+        began = time.monotonic()
+
+        password = make_password(options['password'])
+        with transaction.atomic():
+            get_user_model().objects.bulk_create([
+                get_user_model()(email=email, name=email.split('@')[0],
+                                 password=password)
+                for email in emails
+            ])
+            users = list(
+                get_user_model().objects.filter(email__in=emails).order_by(
+                    'id'
+                )
+            )
+            for user in users:
+                Token.objects.create(user=user)
+
+        for user in users:
+            before = dict(self.totals)
+            with transaction.atomic():
+                self.seed_user(user, options)
+            self.stdout.write(f'{user.email}: ' + ', '.join(
+                f'{self.totals[kind] - before[kind]} {kind}'
+                for kind in self.totals
+            ))
+
+        statistics.rebuild([user.id for user in users])
+        for user in users:
+            herd_cache.bump(user.id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(users)} users, {self.totals["bovids"]} bovids, '
+            f'{self.totals["tags"]} tags and {self.totals["events"]} events '
+            f'in {time.monotonic() - began:.1f}s'
+        ))
+
+    def seed_user(self, user, options):
+        """Create the tags, bovids and events of one user"""
+        tags = Tag.objects.bulk_create([
+            Tag(user=user, name=self.tag_name(n))
+            for n in range(options['tags'])
+        ])
+        if tags and tags[0].pk is None:
+            tags = list(Tag.objects.filter(user=user).order_by('id'))
+        self.totals['tags'] += len(tags)
+
+        bovids = self.create_bovids(user, options['bovids'])
+        self.tag_bovids(bovids, tags)
+        self.create_events(user, bovids, options['events'])
+
+    def tag_name(self, n):
+        """Return the name of a user's nth tag"""
+        name = TAG_NAMES[n % len(TAG_NAMES)]
+        if n >= len(TAG_NAMES):
+            name = f'{name} {n // len(TAG_NAMES) + 1}'
+
+        return name
+
+    def birth_dates(self, count):
+        """Return sorted dates of birth, the first tenth founders born in
+        the first years of the history
+        """
+        days = (self.today - self.start).days
+        founders = max(2, count // 10)
+        dates = [
+            self.start + timedelta(days=self.rng.randrange(
+                min(days, BREEDING_AGE) or 1
+            ))
+            for _ in range(min(founders, count))
+        ] + [
+            self.start + timedelta(days=self.rng.randrange(days or 1))
+            for _ in range(count - founders)
+        ]
+
+        return sorted(dates)
+
+    def new_bovid(self, user, number, born, dam, sire):
+        """Return an unsaved bovid born on a date to the given parents"""
+        rng = self.rng
+        if dam is not None and rng.random() < 0.8:
+            breed = dam.breed
+        else:
+            breed = rng.choices(
+                [name for name, _ in BREEDS],
+                [weight for _, weight in BREEDS]
+            )[0]
+        bovid = Bovid(
+            user=user,
+            import_ref=f'seed-{number}',
+            name=f'{rng.choice(NAME_PARTS)} {rng.choice(NAME_PARTS)} '
+                 f'{number}',
+            type_of_bovid='bul' if rng.random() < BULL_SHARE else 'koei',
+            breed=breed,
+            breeder=rng.choice(('', '', 'Holme Grown', 'Vaalrivier Stoet')),
+            mothers_name=dam.name if dam else '',
+            fathers_name=sire.name if sire else '',
+            price=Decimal(rng.randrange(50000, 999999)) / 100,
+            date_of_birth=born,
+        )
+        end = rng.random()
+        if end < DEAD_SHARE:
+            bovid.date_of_death = self.some_day_after(born)
+        elif end < DEAD_SHARE + SOLD_SHARE:
+            bovid.date_sold = self.some_day_after(born)
+
+        return bovid
+
+    def some_day_after(self, day):
+        """Return a random date between a day and today"""
+        return day + timedelta(
+            days=self.rng.randrange((self.today - day).days + 1)
+        )
+
+    def pick_parent(self, animals, births, born):
+        """Return a random animal of breeding age when a calf is born,
+        or None if there is none
+        """
+        last = bisect.bisect_right(births, born - timedelta(days=BREEDING_AGE))
+        first = bisect.bisect_left(
+            births,
+            born - timedelta(days=5 * BREEDING_AGE)
+        )
+        if last == 0:
+            return None
+
+        return animals[self.rng.randrange(min(first, last - 1), last)]
+
+    def create_bovids(self, user, count):
+        """Create bovids in order of birth, each with a dam and sire picked
+        from the animals old enough when it was born, and return them
+        """
+        parents = {}
+        cows, cow_births, bulls, bull_births = [], [], [], []
+        bovids = []
+        births = self.birth_dates(count)
+        for first in range(0, count, self.batch_size):
+            batch = []
+            for number in range(first, min(count, first + self.batch_size)):
+                born = births[number]
+                dam = self.pick_parent(cows, cow_births, born)
+                sire = self.pick_parent(bulls, bull_births, born)
+                bovid = self.new_bovid(user, number, born, dam, sire)
+                parents[number] = (dam, sire)
+                if bovid.type_of_bovid == 'bul':
+                    bulls.append(bovid)
+                    bull_births.append(born)
+                else:
+                    cows.append(bovid)
+                    cow_births.append(born)
+                batch.append(bovid)
+            self.insert_bovids(user, batch)
+            bovids.extend(batch)
+
+        # Link the parents once all ids are known, in batches
+        for number, bovid in enumerate(bovids):
+            dam, sire = parents[number]
+            bovid.dam_id = dam.pk if dam else None
+            bovid.sire_id = sire.pk if sire else None
+        Bovid.objects.bulk_update(
+            [bovid for bovid in bovids if bovid.dam_id or bovid.sire_id],
+            ['dam', 'sire'],
+            batch_size=self.batch_size
+        )
+        self.totals['bovids'] += len(bovids)
+
+        return bovids
+
+    def insert_bovids(self, user, batch):
+        """Insert a batch of bovids, setting their ids where the database
+        does not return them
+        """
+        Bovid.objects.bulk_create(batch)
+        if batch[0].pk is not None:
+            return
+
+        # The user's newest rows, as the herd is seeded in one transaction
+        ids = dict(Bovid.objects.filter(user=user).order_by(
+            '-id'
+        ).values_list('import_ref', 'id')[:len(batch)])
+        for bovid in batch:
+            bovid.pk = ids[bovid.import_ref]
+
+    def tag_bovids(self, bovids, tags):
+        """Give each bovid up to three tags, some tags much more common"""
+        if not tags:
+            return
+        weights = [1 / (rank + 1) for rank in range(len(tags))]
+        BovidTag = Bovid.tags.through
+        links = (
+            BovidTag(bovid_id=bovid.pk, tag_id=tag.pk)
+            for bovid in bovids
+            for tag in set(self.rng.choices(
+                tags,
+                weights,
+                k=self.rng.choice((0, 1, 1, 2, 2, 3))
+            ))
+        )
+        for batch in self.batches(links):
+            BovidTag.objects.bulk_create(batch)
+
+    def create_events(self, user, bovids, average):
+        """Create about average events per bovid, spread over its life"""
+        created = timezone.now()
+        events = (
+            LifeEvent(
+                user=user,
+                bovid_id=bovid.pk,
+                event_type=event_type,
+                notes=' '.join(self.rng.choices(words, k=4)),
+                event_date=self.some_day_between(
+                    bovid.date_of_birth,
+                    bovid.date_of_death or bovid.date_sold or self.today
+                ),
+                created=created,
+            )
+            for bovid in bovids
+            for event_type, words in self.rng.choices(
+                EVENTS,
+                k=self.rng.randint(0, 2 * average)
+            )
+        )
+        for batch in self.batches(events):
+            LifeEvent.objects.bulk_create(batch)
+            self.totals['events'] += len(batch)
+
+    def some_day_between(self, first, last):
+        """Return a random date from first to last"""
+        return first + timedelta(
+            days=self.rng.randrange((last - first).days + 1)
+        )
+
+    def batches(self, rows):
+        """Yield lists of at most batch_size rows"""
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                return
+            yield batch
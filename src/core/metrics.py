@@ -0,0 +1,325 @@
+import bisect
+import fcntl
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, in seconds and in queries
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+# Name -> (help text, bucket bounds) of the histograms, all prefixed
+# with PREFIX in the exposition
+HISTOGRAMS = {
+    'request_duration_seconds': (
+        'Time spent handling requests', TIME_BUCKETS
+    ),
+    'db_duration_seconds': (
+        'Time spent in database queries per request', TIME_BUCKETS
+    ),
+    'db_queries': (
+        'Database queries per request', QUERY_BUCKETS
+    ),
+    'render_duration_seconds': (
+        'Time spent rendering responses', TIME_BUCKETS
+    ),
+}
+
+PREFIX = 'threecows_'
+
+# File in METRICS_DIR holding the counts of stopped processes
+RETIRED = 'retired.json'
+
+
+class RequestTimer:
+    """Database execute wrapper timing and counting the queries of one
+    request, and the time spent rendering its response
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.queries = 0
+        self.render_started = None
+        self.render_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+    def start_render(self):
+        """Mark the response as about to be rendered"""
+        self.render_started = time.perf_counter()
+
+    def rendered(self, response):
+        """Post render callback of the response"""
+        if self.render_started is not None:
+            self.render_time = time.perf_counter() - self.render_started
+
+    def server_timing(self, total):
+        """Return a Server-Timing header value, durations in ms"""
+        return (
+            f'total;dur={total * 1000:.1f}, '
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", '
+            f'render;dur={self.render_time * 1000:.1f}'
+        )
+
+
+class MetricsRegistry:
+    """Per-route request histograms shared by all worker processes.
+
+    Each process aggregates its own requests in memory and writes them to
+    a file of its own in `directory`, at most every `flush_interval`
+    seconds, replacing the file atomically. Collecting merges the files
+    of all processes, so any worker can serve the exposition.
+
+    Files are named by PID and start time, so a process reusing a PID
+    never overwrites the counts of a stopped one. Collecting folds the
+    files of stopped processes into one RETIRED file, which keeps their
+    counts in the totals. The directory must only be shared by processes
+    that see each other's PIDs. Without a directory only the serving
+    process is counted.
+    """
+
+    def __init__(self, directory, flush_interval):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """Start empty, as a new process"""
+        self.pid = os.getpid()
+        self.started = time.time_ns()
+        self._series = {}
+        self._flushed = time.monotonic()
+
+    @property
+    def path(self):
+        """Return the file of this process"""
+        return os.path.join(self.directory,
+                            f'{self.pid}-{self.started}.json')
+
+    def observe(self, name, labels, value):
+        """Add a value to the histogram of a name and labels dict"""
+        bounds = HISTOGRAMS[name][1]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if os.getpid() != self.pid:
+                # Forked: the counts belong to the parent process
+                self._reset()
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    'buckets': [0] * len(bounds), 'sum': 0.0, 'count': 0
+                }
+            index = bisect.bisect_left(bounds, value)
+            if index < len(bounds):
+                series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def record(self, route, method, status, timer, total):
+        """Add the measurements of one request"""
+        labels = {'route': route, 'method': method}
+        self.observe('request_duration_seconds',
+                     dict(labels, status=f'{status // 100}xx'), total)
+        self.observe('db_duration_seconds', labels, timer.db_time)
+        self.observe('db_queries', labels, timer.queries)
+        self.observe('render_duration_seconds', labels, timer.render_time)
+        if (self.directory and
+                time.monotonic() - self._flushed >= self.flush_interval):
+            self.flush()
+
+    def snapshot(self):
+        """Return this process's series as JSON compatible rows"""
+        with self._lock:
+            return [
+                [name, labels, series['buckets'], series['sum'],
+                 series['count']]
+                for (name, labels), series in self._series.items()
+            ]
+
+    def flush(self):
+        """Write this process's series to its file"""
+        rows = self.snapshot()
+        self._flushed = time.monotonic()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._write(self.path, rows)
+        except OSError:
+            logger.exception('Could not write metrics to %s', self.directory)
+
+    def _write(self, path, rows):
+        """Replace a file in the directory with rows atomically"""
+        descriptor, temporary = tempfile.mkstemp(
+            dir=self.directory, suffix='.tmp'
+        )
+        with os.fdopen(descriptor, 'w') as target:
+            json.dump(rows, target)
+        os.replace(temporary, path)
+
+    def retire(self):
+        """Fold the files of stopped processes into the RETIRED file.
+
+        Collectors take turns under a lock, so no file is counted twice.
+        """
+        retired = os.path.join(self.directory, RETIRED)
+        try:
+            with open(os.path.join(self.directory, 'retire.lock'), 'a') \
+                    as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                stopped = [
+                    path for path in glob.glob(
+                        os.path.join(self.directory, '*.json')
+                    )
+                    if not running(process_id(path))
+                ]
+                if not stopped:
+                    return
+                merged = merge(read_rows([retired] + stopped))
+                self._write(retired, [
+                    [name, [list(label) for label in labels],
+                     series['buckets'], series['sum'], series['count']]
+                    for (name, labels), series in merged.items()
+                ])
+                for path in stopped:
+                    os.remove(path)
+        except OSError:
+            logger.exception('Could not retire metrics in %s',
+                             self.directory)
+
+    def collect(self):
+        """Return the series of all processes merged, as a dict of
+        (name, labels) to buckets, sum and count
+        """
+        if not self.directory:
+            return merge([self.snapshot()])
+
+        self.flush()
+        self.retire()
+
+        return merge(read_rows(
+            glob.glob(os.path.join(self.directory, '*.json'))
+        ))
+
+    def clear(self):
+        """Forget all counts, including the files of other processes"""
+        with self._lock:
+            self._reset()
+        if self.directory:
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                os.remove(path)
+
+
+def process_id(path):
+    """Return the PID a metrics file belongs to, or None for the RETIRED
+    file
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    try:
+        return int(name.split('-')[0])
+    except ValueError:
+        return None
+
+
+def running(pid):
+    """Return whether a PID is running, True for None"""
+    if pid is None:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running as another user
+        return True
+
+    return True
+
+
+def read_rows(paths):
+    """Return the rows of the metrics files that can be read"""
+    files = []
+    for path in paths:
+        try:
+            with open(path) as source:
+                files.append(json.load(source))
+        except (OSError, ValueError):
+            # Removed meanwhile, or not a metrics file
+            continue
+
+    return files
+
+
+def merge(files):
+    """Sum the rows of several snapshots by name and labels"""
+    merged = {}
+    for rows in files:
+        for name, labels, buckets, total, count in rows:
+            if len(buckets) != len(HISTOGRAMS.get(name, ((), ()))[1]):
+                # Written with other buckets, by an older release
+                continue
+            key = (name, tuple(tuple(label) for label in labels))
+            series = merged.setdefault(key, {
+                'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0
+            })
+            series['buckets'] = [
+                mine + theirs
+                for mine, theirs in zip(series['buckets'], buckets)
+            ]
+            series['sum'] += total
+            series['count'] += count
+
+    return merged
+
+
+def label_value(value):
+    """Escape a label value for the text exposition format"""
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n'
+    )
+
+
+def exposition(merged):
+    """Return merged series in the Prometheus text exposition format"""
+    lines = []
+    for name, (help_text, bounds) in HISTOGRAMS.items():
+        metric = PREFIX + name
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} histogram')
+        for (series_name, labels), series in sorted(merged.items()):
+            if series_name != name:
+                continue
+            pairs = [f'{key}="{label_value(value)}"' for key, value in labels]
+            cumulative = 0
+            for bound, count in zip(bounds, series['buckets']):
+                cumulative += count
+                le = ','.join(pairs + [f'le="{bound}"'])
+                lines.append(f'{metric}_bucket{{{le}}} {cumulative}')
+            le = ','.join(pairs + ['le="+Inf"'])
+            lines.append(f'{metric}_bucket{{{le}}} {series["count"]}')
+            joined = ','.join(pairs)
+            lines.append(f'{metric}_sum{{{joined}}} {series["sum"]!r}')
+            lines.append(f'{metric}_count{{{joined}}} {series["count"]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry(
+    directory=getattr(settings, 'METRICS_DIR', None),
+    flush_interval=getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0)
+)
@@ -0,0 +1,89 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from core import profiling, queries
+from core.metrics import RequestTimer, metrics
+
+
+class RequestMetricsMiddleware:
+    """Time each request, its database queries and response rendering.
+
+    The timings are added as a Server-Timing header and to the per-route
+    histograms served at /metrics/. Must come first in MIDDLEWARE so the
+    total includes the other middleware and rendering starts right after
+    its process_template_response.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = request.metrics_timer = RequestTimer()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        total = time.perf_counter() - timer.started
+
+        if getattr(settings, 'SERVER_TIMING', True):
+            response['Server-Timing'] = timer.server_timing(total)
+        match = getattr(request, 'resolver_match', None)
+        metrics.record(
+            match.view_name if match else 'unmatched',
+            request.method,
+            response.status_code,
+            timer,
+            total
+        )
+
+        return response
+
+    def process_template_response(self, request, response):
+        """Time the rendering of template and REST framework responses"""
+        request.metrics_timer.start_render()
+        response.add_post_render_callback(request.metrics_timer.rendered)
+
+        return response
+
+
+class RequestProfilerMiddleware:
+    """Profile requests of staff users who ask for it with an X-Profile
+    header or ?profile= parameter, see core/profiling.py. Must come after
+    AuthenticationMiddleware to recognise session users.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if profiling.requested(request):
+            user = profiling.staff_user(request)
+            if user is not None:
+                return profiling.profile(self.get_response, request, user)
+
+        return self.get_response(request)
+
+
+class QueryDetectorMiddleware:
+    """Log or fail requests that run N+1 or duplicate queries, as set by
+    QUERY_DETECTOR, see core/queries.py
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = getattr(settings, 'QUERY_DETECTOR', None)
+        if not mode:
+            return self.get_response(request)
+
+        with queries.detect_queries() as detector:
+            response = self.get_response(request)
+        queries.check(
+            detector, mode, f'{request.method} {request.get_full_path()}'
+        )
+
+        return response
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:07
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_auto_20191208_2056'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bovid',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to=core.models.bovid_image_file_path),
+        ),
+        migrations.AddIndex(
+            model_name='bovid',
+            index=models.Index(fields=['user', 'created'], name='bovid_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lifeevent',
+            index=models.Index(fields=['bovid', 'event_date'], name='lifeevent_bovid_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'name'], name='tag_user_name_idx'),
+        ),
+    ]
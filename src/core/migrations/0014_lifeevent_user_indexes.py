@@ -0,0 +1,25 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lifeevent',
+            index=models.Index(fields=['user', 'created'], name='lifeevent_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lifeevent',
+            index=models.Index(fields=['user', 'event_date'], name='lifeevent_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lifeevent',
+            index=models.Index(fields=['user', 'event_type', 'event_date'], name='lifeevent_user_type_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_lifeevent_user_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bovid',
+            name='import_ref',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='lifeevent',
+            name='import_ref',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='bovid',
+            constraint=models.UniqueConstraint(fields=('user', 'import_ref'), name='bovid_user_import_ref_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='lifeevent',
+            constraint=models.UniqueConstraint(fields=('user', 'import_ref'), name='lifeevent_user_import_ref_uniq'),
+        ),
+    ]
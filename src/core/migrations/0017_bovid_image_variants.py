@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_herdstatistic'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bovid',
+            name='image_variants_ready',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_bovid_photos_and_uploads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bovid',
+            name='dam',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='dam_offspring', to='core.Bovid'),
+        ),
+        migrations.AddField(
+            model_name='bovid',
+            name='sire',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sire_offspring', to='core.Bovid'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+# The expressions must match core.search.SearchDocument and NotesMatch
+# for the planner to use the indexes
+CREATE_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE EXTENSION IF NOT EXISTS btree_gin',
+    'CREATE INDEX bovid_search_trgm_idx ON core_bovid USING gin ('
+    "user_id, (name || ' ' || breed || ' ' || breeder || ' ' || "
+    "mothers_name || ' ' || fathers_name) gin_trgm_ops)",
+    'CREATE INDEX lifeevent_notes_search_idx ON core_lifeevent '
+    "USING gin (user_id, to_tsvector('simple'::regconfig, notes))",
+]
+
+DROP_SQL = [
+    'DROP INDEX IF EXISTS lifeevent_notes_search_idx',
+    'DROP INDEX IF EXISTS bovid_search_trgm_idx',
+]
+
+
+def run_on_postgresql(statements):
+    """Return a RunPython function running SQL on PostgreSQL only, the
+    search falls back to unindexed matching elsewhere
+    """
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_bovid_parents'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgresql(CREATE_SQL),
+            run_on_postgresql(DROP_SQL)
+        ),
+    ]
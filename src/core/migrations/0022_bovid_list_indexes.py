@@ -0,0 +1,33 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bovid',
+            index=models.Index(fields=['user', 'date_of_birth'], name='bovid_user_birth_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bovid',
+            index=models.Index(condition=models.Q(('date_of_death__isnull', True), ('date_sold__isnull', True)), fields=['user', 'type_of_bovid', 'breed'], name='bovid_living_facets_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bovid',
+            index=models.Index(condition=models.Q(('date_of_death__isnull', True), ('date_sold__isnull', True)), fields=['user', '-created'], name='bovid_living_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bovid',
+            index=models.Index(condition=models.Q(('date_of_death__isnull', True), ('date_sold__isnull', True)), fields=['user', 'name'], name='bovid_living_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bovid',
+            index=models.Index(condition=models.Q(('date_of_death__isnull', True), ('date_sold__isnull', True)), fields=['user', 'price'], name='bovid_living_price_idx'),
+        ),
+    ]
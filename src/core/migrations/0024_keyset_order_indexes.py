@@ -0,0 +1,37 @@
+# Generated by Django 2.2.28 on 2026-10-18 15:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_request_profile'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bovid',
+            name='bovid_user_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='lifeevent',
+            name='lifeevent_bovid_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tag',
+            name='tag_user_name_idx',
+        ),
+        migrations.AddIndex(
+            model_name='bovid',
+            index=models.Index(fields=['user', 'created', 'id'], name='bovid_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lifeevent',
+            index=models.Index(fields=['bovid', 'event_date', 'id'], name='lifeevent_bovid_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'name', 'id'], name='tag_user_name_idx'),
+        ),
+    ]
@@ -1,5 +1,6 @@
-import uuid
+import math
 import os
+import uuid
 
 from django.db import models
 from django.utils import timezone
@@ -7,14 +8,23 @@ from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
                                         PermissionsMixin
 from django.conf import settings
 
+from core.storage import ContentAddressedStorage, file_sha256
+
 
 # helper function for creating image paths
 def bovid_image_file_path(instance, filename):
-    """Generate file path for new bovid image"""
-    ext = filename.split('.')[-1]
-    filename = f'{uuid.uuid4()}.{ext}'
+    """Generate the content-addressed file path of a bovid image, so
+    identical uploads share one file
+    """
+    content = instance.image.file
+    # Pillow's format when the upload was validated as an image, or when
+    # an upload session was assembled, see cattle/uploads.py
+    image = getattr(content, 'image', None)
+    image_format = image.format if image else getattr(content, 'format', None)
+    ext = (image_format or filename.split('.')[-1]).lower()
+    digest = file_sha256(content)
 
-    return os.path.join('uploads/bovid/', filename)
+    return os.path.join('uploads/bovid/', digest[:2], f'{digest}.{ext}')
 
 
 class UserManager(BaseUserManager):
@@ -60,6 +70,15 @@ class Tag(models.Model):
         on_delete=models.CASCADE,
     )
 
+    class Meta:
+        indexes = [
+            # Serves the tag list in its (name, id) keyset order
+            models.Index(
+                fields=['user', 'name', 'id'],
+                name='tag_user_name_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -77,20 +96,98 @@ class LifeEvent(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    # id of the event in the system it was imported from, see import_herd
+    import_ref = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'import_ref'],
+                name='lifeevent_user_import_ref_uniq'
+            ),
+        ]
+        indexes = [
+            # Serves a bovid's timeline in its (event_date, id) order
+            models.Index(
+                fields=['bovid', 'event_date', 'id'],
+                name='lifeevent_bovid_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'created'],
+                name='lifeevent_user_created_idx'
+            ),
+            models.Index(
+                fields=['user', 'event_date'],
+                name='lifeevent_user_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'event_type', 'event_date'],
+                name='lifeevent_user_type_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.event_type
 
 
+# Conditions a bovid's status is derived from, dead before sold
+BOVID_STATUSES = {
+    'alive': models.Q(date_of_death__isnull=True, date_sold__isnull=True),
+    'sold': models.Q(date_of_death__isnull=True, date_sold__isnull=False),
+    'dead': models.Q(date_of_death__isnull=False),
+}
+
+
+class BovidQuerySet(models.QuerySet):
+
+    def living(self):
+        """Return the bovids that are still alive and in the herd"""
+        return self.filter(BOVID_STATUSES['alive'])
+
+    def with_status(self, *statuses):
+        """Return the bovids whose status is one of the given ones"""
+        condition = models.Q()
+        for status in statuses:
+            condition |= BOVID_STATUSES[status]
+        return self.filter(condition)
+
+    def annotate_status(self, name='status'):
+        """Annotate each bovid with its status, 'alive', 'sold' or 'dead'"""
+        return self.annotate(**{name: models.Case(
+            models.When(BOVID_STATUSES['dead'], then=models.Value('dead')),
+            models.When(BOVID_STATUSES['sold'], then=models.Value('sold')),
+            default=models.Value('alive'),
+            output_field=models.CharField()
+        )})
+
+
 class Bovid(models.Model):
     """This model will hold the cows in their various shapes and form"""
 
     image = models.ImageField(null=True,
                               upload_to=bovid_image_file_path,
+                              storage=ContentAddressedStorage(),
                               blank=True
                               )
+    # set once core.images has generated the thumbnails of `image`
+    image_variants_ready = models.BooleanField(default=False)
     mothers_name = models.CharField(max_length=150, blank=True)
     fathers_name = models.CharField(max_length=150, blank=True)
+    # parents in the herd, the names also cover animals that are not
+    dam = models.ForeignKey(
+        'self',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='dam_offspring'
+    )
+    sire = models.ForeignKey(
+        'self',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='sire_offspring'
+    )
     type_of_bovid = models.CharField(max_length=100)
     breed = models.CharField(max_length=100, blank=True)
     name = models.CharField(max_length=255)
@@ -112,6 +209,220 @@ class Bovid(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    # id of the animal in the system it was imported from, see import_herd
+    import_ref = models.CharField(max_length=64, null=True, blank=True)
+
+    objects = BovidQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'import_ref'],
+                name='bovid_user_import_ref_uniq'
+            ),
+        ]
+        indexes = [
+            # Serves the bovid list in its (created, id) keyset order
+            models.Index(
+                fields=['user', 'created', 'id'],
+                name='bovid_user_created_idx'
+            ),
+            models.Index(
+                fields=['user', 'date_of_birth'],
+                name='bovid_user_birth_idx'
+            ),
+            # The herd list mostly shows the living animals, see
+            # cattle.filters.BovidFacetFilter
+            models.Index(
+                fields=['user', 'type_of_bovid', 'breed'],
+                name='bovid_living_facets_idx',
+                condition=BOVID_STATUSES['alive']
+            ),
+            models.Index(
+                fields=['user', '-created'],
+                name='bovid_living_created_idx',
+                condition=BOVID_STATUSES['alive']
+            ),
+            models.Index(
+                fields=['user', 'name'],
+                name='bovid_living_name_idx',
+                condition=BOVID_STATUSES['alive']
+            ),
+            models.Index(
+                fields=['user', 'price'],
+                name='bovid_living_price_idx',
+                condition=BOVID_STATUSES['alive']
+            ),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class HerdStatistic(models.Model):
+    """Running count and price total of a user's bovids for one statistic,
+    eg ('breed', 'Nguni'), kept up to date by core.signals
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    dimension = models.CharField(max_length=20)
+    key = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+    price_total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0
+    )
+
+    class Meta:
+        unique_together = (('user', 'dimension', 'key'),)
+
+    def __str__(self):
+        return f'{self.dimension} {self.key}: {self.count}'
+
+
+class StoredImage(models.Model):
+    """Number of bovids using an image file, kept up to date by
+    core.signals so unused files can be deleted by collect_images
+    """
+    name = models.CharField(max_length=255, unique=True)
+    refcount = models.IntegerField(default=0)
+    updated = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'{self.name}: {self.refcount}'
+
+
+class BovidPhoto(models.Model):
+    """Photo in the gallery of a bovid"""
+    bovid = models.ForeignKey(
+        'Bovid',
+        on_delete=models.CASCADE,
+        related_name='photos'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    image = models.ImageField(
+        upload_to=bovid_image_file_path,
+        storage=ContentAddressedStorage()
+    )
+    # set once core.images has generated the thumbnails of `image`
+    image_variants_ready = models.BooleanField(default=False)
+    caption = models.CharField(max_length=255, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.caption or self.image.name
+
+
+class UploadSession(models.Model):
+    """Resumable upload of a bovid photo, received in numbered chunks of
+    chunk_size bytes that are written into a part file
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    bovid = models.ForeignKey('Bovid', on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    caption = models.CharField(max_length=255, blank=True)
+    size = models.BigIntegerField()
+    chunk_size = models.IntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField()
+
+    @property
+    def chunk_count(self):
+        """Return the number of chunks of the upload"""
+        return math.ceil(self.size / self.chunk_size)
+
+    @property
+    def part_path(self):
+        """Return the path of the file the chunks are written into"""
+        return os.path.join(settings.CHUNKED_UPLOAD_DIR, f'{self.id}.part')
+
+    def chunk_length(self, index):
+        """Return the number of bytes of a chunk"""
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def missing_chunks(self):
+        """Return the indexes of the chunks not received yet"""
+        received = set(self.chunks.values_list('index', flat=True))
+        return [
+            index for index in range(self.chunk_count)
+            if index not in received
+        ]
+
+    def discard(self):
+        """Delete the session and its part file"""
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+        self.delete()
+
+    def __str__(self):
+        return f'{self.filename} ({self.size} bytes)'
+
+
+class UploadChunk(models.Model):
+    """Chunk of an upload session that has been written"""
+    session = models.ForeignKey(
+        'UploadSession',
+        on_delete=models.CASCADE,
+        related_name='chunks'
+    )
+    index = models.IntegerField()
+
+    class Meta:
+        unique_together = (('session', 'index'),)
+
+    def __str__(self):
+        return f'{self.session_id} #{self.index}'
+
+
+class RequestProfile(models.Model):
+    """Profile of one request made by a staff user who asked for it, kept
+    as files in PROFILE_DIR, see core/profiling.py
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+    )
+    method = models.CharField(max_length=10)
+    path = models.TextField()
+    status = models.IntegerField()
+    duration = models.FloatField(help_text='Seconds')
+    queries = models.IntegerField(null=True)
+    samples = models.IntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('-created', '-id')
+
+    @property
+    def stats_path(self):
+        """Return the path of the cProfile statistics, for pstats"""
+        return os.path.join(settings.PROFILE_DIR, f'{self.id}.prof')
+
+    @property
+    def stacks_path(self):
+        """Return the path of the sampled stacks in the collapsed format
+        of flamegraph tools
+        """
+        return os.path.join(settings.PROFILE_DIR, f'{self.id}.collapsed')
+
+    def discard(self):
+        """Delete the profile and its files"""
+        for path in (self.stats_path, self.stacks_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.delete()
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.duration * 1000:.0f} ms)'
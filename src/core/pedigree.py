@@ -0,0 +1,81 @@
+from django.db import connection
+
+from core.models import Bovid
+
+
+ANCESTORS_SQL = """
+    WITH RECURSIVE ancestry (id, generation) AS (
+        SELECT id, 0 FROM {table} WHERE id = %s AND user_id = %s
+        UNION
+        SELECT parent.id, ancestry.generation + 1
+        FROM ancestry
+        JOIN {table} AS child ON child.id = ancestry.id
+        JOIN {table} AS parent
+            ON parent.id IN (child.dam_id, child.sire_id)
+        WHERE ancestry.generation < %s
+        AND parent.user_id = %s
+    )
+    SELECT bovid.*, pedigree.generation
+    FROM (
+        SELECT id, min(generation) AS generation FROM ancestry GROUP BY id
+    ) AS pedigree
+    JOIN {table} AS bovid ON bovid.id = pedigree.id
+    ORDER BY pedigree.generation, bovid.id
+"""
+
+DESCENDANTS_SQL = """
+    WITH RECURSIVE descent (id, generation) AS (
+        SELECT id, 0 FROM {table} WHERE id = %s AND user_id = %s
+        UNION
+        SELECT child.id, descent.generation + 1
+        FROM descent
+        JOIN {table} AS child
+            ON child.dam_id = descent.id OR child.sire_id = descent.id
+        WHERE descent.generation < %s
+        AND child.user_id = %s
+    )
+    SELECT bovid.*, pedigree.generation
+    FROM (
+        SELECT id, min(generation) AS generation FROM descent GROUP BY id
+    ) AS pedigree
+    JOIN {table} AS bovid ON bovid.id = pedigree.id
+    ORDER BY pedigree.generation, bovid.id
+"""
+
+
+def name_key(name):
+    """Return the form parent names are matched to bovid names in"""
+    return ' '.join(name.split()).casefold()
+
+
+def _pedigree(sql, user_id, bovid_id, generations):
+    """Return the bovids found by a pedigree query, including the bovid
+    itself as generation 0, or None if the user has no such bovid
+    """
+    rows = list(Bovid.objects.raw(
+        sql.format(table=connection.ops.quote_name(Bovid._meta.db_table)),
+        [bovid_id, user_id, generations, user_id]
+    ))
+
+    return rows or None
+
+
+def ancestors(user_id, bovid_id, generations):
+    """Return a bovid and its ancestors up to the given generation, each
+    with its `generation`, in one recursive query
+    """
+    return _pedigree(ANCESTORS_SQL, user_id, bovid_id, generations)
+
+
+def descendants(user_id, bovid_id, generations):
+    """Return a bovid and its descendants up to the given generation, each
+    with its `generation`, in one recursive query
+    """
+    return _pedigree(DESCENDANTS_SQL, user_id, bovid_id, generations)
+
+
+def descendant_ids(user_id, bovid_id, generations):
+    """Return the ids of a bovid and its descendants"""
+    return {
+        bovid.id for bovid in descendants(user_id, bovid_id, generations) or []
+    }
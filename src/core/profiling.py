@@ -0,0 +1,162 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.models import RequestProfile
+from user.authentication import CachedTokenAuthentication
+
+
+logger = logging.getLogger(__name__)
+
+# A request is profiled when it has this header or query parameter
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+
+
+def requested(request):
+    """Return True if the request asks to be profiled"""
+    return bool(request.META.get(PROFILE_HEADER) or
+                PROFILE_PARAM in request.GET)
+
+
+def staff_user(request):
+    """Return the active staff user making a request by session or API
+    token, or None
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        try:
+            authenticated = CachedTokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            authenticated = None
+        user = authenticated[0] if authenticated else None
+
+    if user is not None and user.is_active and user.is_staff:
+        return user
+
+    return None
+
+
+def frame_name(frame):
+    """Return the module and function of a stack frame"""
+    return f'{frame.f_globals.get("__name__", "?")}:{frame.f_code.co_name}'
+
+
+def collapse(frame):
+    """Return the stack of a frame as semicolon separated names, the
+    outermost first, as in the collapsed format of flamegraph tools
+    """
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+
+    return ';'.join(reversed(names))
+
+
+class StackSampler(threading.Thread):
+    """Thread counting the stacks of another thread every interval"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def stop(self):
+        """Stop sampling and wait for the thread to end"""
+        self.done.set()
+        self.join()
+
+
+def profile(get_response, request, user):
+    """Return the response of a request run under cProfile and a stack
+    sampler, saving the profile as a RequestProfile.
+
+    Streamed response content is produced after this returns, so it is
+    not part of the profile.
+    """
+    profiler = cProfile.Profile()
+    sampler = StackSampler(
+        threading.get_ident(),
+        getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.005)
+    )
+    sampler.start()
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        response = get_response(request)
+    finally:
+        profiler.disable()
+        duration = time.perf_counter() - started
+        sampler.stop()
+
+    timer = getattr(request, 'metrics_timer', None)
+    try:
+        saved = save(
+            profiler, sampler.stacks,
+            user=user,
+            method=request.method,
+            path=request.get_full_path(),
+            status=response.status_code,
+            duration=duration,
+            queries=timer.queries if timer else None,
+        )
+    except OSError:
+        logger.exception('Could not save the profile of %s', request.path)
+    else:
+        response['X-Profile-Id'] = str(saved.id)
+
+    return response
+
+
+def save(profiler, stacks, **fields):
+    """Write a profile's files and keep only the newest PROFILE_KEEP"""
+    saved = RequestProfile.objects.create(
+        samples=sum(stacks.values()),
+        **fields
+    )
+    try:
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(saved.stats_path)
+        with open(saved.stacks_path, 'w') as target:
+            for stack, count in sorted(stacks.items()):
+                target.write(f'{stack} {count}\n')
+    except OSError:
+        saved.discard()
+        raise
+
+    keep = getattr(settings, 'PROFILE_KEEP', 50)
+    for old in RequestProfile.objects.all()[keep:]:
+        old.discard()
+
+    return saved
+
+
+def summary(profile, limit=40):
+    """Return the functions of a profile taking the most cumulative
+    time, as printed by pstats
+    """
+    out = io.StringIO()
+    pstats.Stats(profile.stats_path, stream=out).sort_stats(
+        'cumulative'
+    ).print_stats(limit)
+
+    return out.getvalue()
@@ -0,0 +1,129 @@
+import logging
+import re
+import traceback
+from collections import Counter, namedtuple
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+# One kind of problem found by QueryDetector: 'N+1' for a statement run
+# with different values threshold times or more, 'duplicate' for the
+# same statement with the same values run more than once
+QueryProblem = namedtuple('QueryProblem', 'kind sql count stack')
+
+LITERALS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+class QueryProblemsError(AssertionError):
+    """Raised for a request with N+1 or duplicate queries when
+    QUERY_DETECTOR is 'raise'
+    """
+
+
+def fingerprint(sql):
+    """Return a statement with its literals and parameter placeholders
+    replaced, so statements differing only in values are equal
+    """
+    for pattern, replacement in LITERALS:
+        sql = pattern.sub(replacement, sql)
+
+    return sql.strip()
+
+
+def caller_stack():
+    """Return the frames of this project that led to a query, innermost
+    last, or the last frames if none are the project's
+    """
+    frames = traceback.extract_stack()[:-3]
+    own = [
+        frame for frame in frames
+        if frame.filename.startswith(settings.BASE_DIR) and
+        frame.filename != __file__
+    ]
+
+    return traceback.format_list(own or frames[-10:])
+
+
+class QueryDetector:
+    """Database execute wrapper recording the SELECT statements run and
+    the stack that ran each one first
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.fingerprints = Counter()
+        self.statements = Counter()
+        self.stacks = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip()[:6].upper() == 'SELECT':
+            key = fingerprint(sql)
+            self.fingerprints[key] += 1
+            self.statements[(sql, repr(params))] += 1
+            if key not in self.stacks:
+                self.stacks[key] = caller_stack()
+
+        return execute(sql, params, many, context)
+
+    def problems(self):
+        """Return the N+1 and duplicate queries recorded"""
+        problems = [
+            QueryProblem('N+1', key, count, self.stacks[key])
+            for key, count in self.fingerprints.items()
+            if count >= self.threshold
+        ]
+        repeated = {problem.sql for problem in problems}
+        for (sql, params), count in self.statements.items():
+            key = fingerprint(sql)
+            if count > 1 and key not in repeated:
+                problems.append(QueryProblem(
+                    'duplicate', f'{sql} {params}', count, self.stacks[key]
+                ))
+
+        return problems
+
+    def report(self, problems=None):
+        """Return a description of the problems and where they came from"""
+        lines = []
+        for problem in problems or self.problems():
+            lines.append(f'{problem.kind} query run {problem.count} times: '
+                         f'{problem.sql}')
+            lines.append(''.join(problem.stack).rstrip())
+
+        return '\n'.join(lines)
+
+
+@contextmanager
+def detect_queries(threshold=None):
+    """Record the queries run on all connections in the block, yielding
+    the QueryDetector
+    """
+    detector = QueryDetector(
+        threshold or getattr(settings, 'QUERY_DETECTOR_THRESHOLD', 5)
+    )
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(detector))
+        yield detector
+
+
+def check(detector, mode, description):
+    """Log or, when mode is 'raise', raise the problems of a detector"""
+    problems = detector.problems()
+    if not problems:
+        return
+
+    report = f'{description}:\n{detector.report(problems)}'
+    if mode == 'raise':
+        raise QueryProblemsError(report)
+    logger.warning(report)
@@ -0,0 +1,95 @@
+from django.db import connection
+from django.db.models import BooleanField, Case, F, FloatField, Func, Q, \
+                             TextField, Value, When
+
+from core.models import LifeEvent
+
+
+# Bovid fields searched by name, in the order of the indexed document,
+# see migration 0021_search_indexes
+SEARCH_FIELDS = ('name', 'breed', 'breeder', 'mothers_name', 'fathers_name')
+
+# Longest search term used, the rest is ignored
+MAX_SEARCH_LENGTH = 100
+
+
+class SearchDocument(Func):
+    """The searched bovid fields joined with spaces, exactly as in the
+    trigram index expression so PostgreSQL can use the index
+    """
+    arg_joiner = " || ' ' || "
+    template = '(%(expressions)s)'
+    output_field = TextField()
+
+    def __init__(self):
+        super().__init__(*[F(field) for field in SEARCH_FIELDS])
+
+
+class WordSimilar(Func):
+    """PostgreSQL `term <% document`: true when a word of the document
+    is similar enough to the term, served by a pg_trgm GIN index
+    """
+    arg_joiner = ' <%% '
+    template = '(%(expressions)s)'
+    output_field = BooleanField()
+
+
+class WordSimilarity(Func):
+    """PostgreSQL word_similarity(term, document), from 0 to 1"""
+    function = 'word_similarity'
+    output_field = FloatField()
+
+
+class NotesMatch(Func):
+    """PostgreSQL full text match of event notes and a search term with
+    the 'simple' configuration, as in the notes index expression
+    """
+    output_field = BooleanField()
+
+    def as_sql(self, compiler, connection):
+        (notes, notes_params), (term, term_params) = [
+            compiler.compile(expression)
+            for expression in self.get_source_expressions()
+        ]
+        return (
+            f"(to_tsvector('simple'::regconfig, {notes}) @@ "
+            f"plainto_tsquery('simple'::regconfig, {term}))",
+            notes_params + term_params
+        )
+
+
+def search_bovids(queryset, user_id, term):
+    """Filter bovids to those matching a search term, annotated with a
+    `search_rank` (higher is better).
+
+    A bovid matches when its names, breed or breeder contain a word
+    similar to the term, or when notes of its events contain the words
+    of the term. On PostgreSQL both are served by indexes and the rank
+    is the trigram word similarity; elsewhere matching is by substring
+    and bovids whose own fields match rank first.
+    """
+    term = ' '.join(term.split())[:MAX_SEARCH_LENGTH]
+    events = LifeEvent.objects.filter(user_id=user_id)
+
+    if connection.vendor == 'postgresql':
+        events = events.annotate(
+            search_match=NotesMatch('notes', Value(term))
+        ).filter(search_match=True)
+        queryset = queryset.annotate(
+            search_match=WordSimilar(Value(term), SearchDocument()),
+            search_rank=WordSimilarity(Value(term), SearchDocument())
+        )
+        matches = Q(search_match=True)
+    else:
+        events = events.filter(notes__icontains=term)
+        queryset = queryset.annotate(search_document=SearchDocument())
+        matches = Q(search_document__icontains=term)
+        queryset = queryset.annotate(search_rank=Case(
+            When(matches, then=Value(1.0)),
+            default=Value(0.0),
+            output_field=FloatField()
+        ))
+
+    return queryset.filter(
+        matches | Q(pk__in=events.values('bovid_id'))
+    )
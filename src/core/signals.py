@@ -0,0 +1,141 @@
+from django.db.models import Q
+from django.db.models.signals import pre_save, post_save, pre_delete, \
+                                     post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core import images, statistics
+from core.cache import herd_cache
+from core.models import Bovid, BovidPhoto, Tag, LifeEvent, User
+
+
+def touch_bovids(queryset):
+    """Mark bovids as updated, eg when their tags change"""
+    now = timezone.now()
+    queryset.update(updated=now)
+
+    return now
+
+
+@receiver(pre_save, sender=Bovid)
+def remember_stored_values(sender, instance, **kwargs):
+    """Keep the stored statistic values and image of a bovid that is
+    about to change
+    """
+    instance._stored_values = None
+    if instance.pk is not None:
+        instance._stored_values = Bovid.objects.filter(
+            pk=instance.pk
+        ).values(*statistics.STATISTIC_FIELDS, 'image').first()
+
+
+@receiver(post_save, sender=Bovid)
+def update_statistics_on_save(sender, instance, raw=False, **kwargs):
+    """Move a saved bovid's contribution to the herd statistics"""
+    if raw:
+        return
+
+    changes = statistics.changes_for(statistics.bovid_values(instance))
+    old_values = getattr(instance, '_stored_values', None)
+    if old_values:
+        statistics.merge(changes, statistics.changes_for(old_values, -1))
+    statistics.apply_changes(instance.user_id, changes)
+
+
+@receiver(post_delete, sender=Bovid)
+def update_statistics_on_delete(sender, instance, **kwargs):
+    """Remove a deleted bovid from the herd statistics"""
+    statistics.apply_changes(
+        instance.user_id,
+        statistics.changes_for(statistics.bovid_values(instance), -1)
+    )
+
+
+@receiver(post_save, sender=Bovid)
+def update_image_references_on_save(sender, instance, raw=False,
+                                    **kwargs):
+    """Move a reference from a bovid's old image file to its new one"""
+    old_values = getattr(instance, '_stored_values', None)
+    old_name = old_values['image'] if old_values else None
+    if raw or instance.image.name == old_name:
+        return
+
+    if instance.image:
+        images.add_reference(instance.image.name)
+    if old_name:
+        images.remove_reference(old_name)
+
+
+@receiver(post_save, sender=BovidPhoto)
+def add_photo_reference(sender, instance, created, raw=False, **kwargs):
+    """Count the image file of a new gallery photo"""
+    if created and not raw:
+        images.add_reference(instance.image.name)
+
+
+@receiver(post_delete, sender=Bovid)
+@receiver(post_delete, sender=BovidPhoto)
+def update_image_references_on_delete(sender, instance, **kwargs):
+    """Release the image file of a deleted bovid or gallery photo"""
+    if instance.image:
+        images.remove_reference(instance.image.name)
+
+
+@receiver(m2m_changed, sender=Bovid.tags.through)
+def touch_bovids_on_tags_change(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    """Bump `updated` of bovids whose tags were added or removed, so
+    conditional requests see the change
+    """
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        instance.updated = touch_bovids(Bovid.objects.filter(pk=instance.pk))
+    elif reverse and action in ('post_add', 'post_remove') and pk_set:
+        touch_bovids(Bovid.objects.filter(pk__in=pk_set))
+    elif reverse and action == 'pre_clear':
+        touch_bovids(Bovid.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=Tag)
+def touch_bovids_on_tag_save(sender, instance, created, raw=False, **kwargs):
+    """Bump `updated` of the bovids showing a renamed tag"""
+    if not created and not raw:
+        touch_bovids(Bovid.objects.filter(tags=instance))
+
+
+@receiver(pre_delete, sender=Tag)
+def touch_bovids_on_tag_delete(sender, instance, **kwargs):
+    """Bump `updated` of the bovids losing a deleted tag"""
+    touch_bovids(Bovid.objects.filter(tags=instance))
+
+
+@receiver(pre_delete, sender=Bovid)
+def touch_offspring_on_parent_delete(sender, instance, **kwargs):
+    """Bump `updated` of the bovids losing a deleted dam or sire"""
+    touch_bovids(Bovid.objects.filter(Q(dam=instance) | Q(sire=instance)))
+
+
+@receiver(post_save, sender=Bovid)
+@receiver(post_delete, sender=Bovid)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=LifeEvent)
+@receiver(post_delete, sender=LifeEvent)
+@receiver(post_save, sender=BovidPhoto)
+@receiver(post_delete, sender=BovidPhoto)
+def bump_herd_version(sender, instance, **kwargs):
+    """Retire the cached API data of the owner of a changed object"""
+    herd_cache.bump(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Bovid.tags.through)
+def bump_herd_version_on_tags_change(sender, instance, action, **kwargs):
+    """Retire the cached API data of a user whose bovid tags changed"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        herd_cache.bump(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def start_herd_version(sender, instance, created, **kwargs):
+    """Give a new user a fresh version, in case the id was used before"""
+    if created:
+        herd_cache.bump(instance.pk)
@@ -0,0 +1,241 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from core.models import Bovid, HerdStatistic
+
+
+# Bovid fields the statistics are computed from
+STATISTIC_FIELDS = (
+    'type_of_bovid', 'breed', 'price', 'date_of_birth', 'date_of_death',
+    'date_sold',
+)
+
+UPSERT_SQL = """
+    INSERT INTO core_herdstatistic AS statistic
+        (user_id, dimension, key, count, price_total)
+    VALUES {values}
+    ON CONFLICT (user_id, dimension, key) DO UPDATE SET
+        count = statistic.count + EXCLUDED.count,
+        price_total = statistic.price_total + EXCLUDED.price_total
+"""
+
+DECREMENT_SQL = """
+    UPDATE core_herdstatistic AS statistic SET
+        count = statistic.count + change.count,
+        price_total = statistic.price_total + change.price_total
+    FROM (VALUES {values}) AS change(dimension, key, count, price_total)
+    WHERE statistic.user_id = %s AND statistic.dimension = change.dimension
+    AND statistic.key = change.key
+"""
+
+
+def bovid_status(values):
+    """Return 'dead', 'sold' or 'alive' for a bovid's values"""
+    if values['date_of_death']:
+        return 'dead'
+    if values['date_sold']:
+        return 'sold'
+
+    return 'alive'
+
+
+def statistic_keys(values):
+    """Return the (dimension, key) statistics a bovid counts towards.
+
+    Every bovid counts towards its status and birth month, living ones
+    also towards the headcount of their type and breed.
+    """
+    status = bovid_status(values)
+    keys = [('status', status)]
+    if status == 'alive':
+        keys.append(('type_of_bovid', values['type_of_bovid']))
+        keys.append(('breed', values['breed']))
+    if values['date_of_birth']:
+        keys.append(('birth_month', str(values['date_of_birth'])[:7]))
+
+    return keys
+
+
+def bovid_values(bovid):
+    """Return the statistic fields of a bovid instance as a dict"""
+    return {field: getattr(bovid, field) for field in STATISTIC_FIELDS}
+
+
+def changes_for(values, sign=1):
+    """Return {(dimension, key): [count, price]} for a bovid's values"""
+    price = Decimal(str(values['price'] or 0))
+    return {
+        key: [sign, sign * price] for key in statistic_keys(values)
+    }
+
+
+def merge(changes, other):
+    """Add the counts and prices of other into changes"""
+    for key, (count, price) in other.items():
+        total = changes.setdefault(key, [0, Decimal(0)])
+        total[0] += count
+        total[1] += price
+
+    return changes
+
+
+def apply_changes(user_id, changes):
+    """Add the changes to the user's statistics rows"""
+    changes = {
+        key: change for key, change in changes.items() if any(change)
+    }
+    if connection.vendor == 'postgresql':
+        _apply_changes_postgresql(user_id, changes)
+        return
+
+    for (dimension, key), (count, price) in changes.items():
+        rows = HerdStatistic.objects.filter(
+            user_id=user_id,
+            dimension=dimension,
+            key=key
+        )
+        if rows.update(count=F('count') + count,
+                       price_total=F('price_total') + price):
+            continue
+        if count < 0:
+            # Nothing to take away from; rebuild_herd_statistics repairs it
+            continue
+        try:
+            with transaction.atomic():
+                HerdStatistic.objects.create(
+                    user_id=user_id,
+                    dimension=dimension,
+                    key=key,
+                    count=count,
+                    price_total=price
+                )
+        except IntegrityError:
+            # Created concurrently, so add to that row instead
+            rows.update(count=F('count') + count,
+                        price_total=F('price_total') + price)
+
+
+def _apply_changes_postgresql(user_id, changes):
+    """Apply the changes with one upsert and one update statement.
+
+    Decrements only update existing rows, so deleting the bovids of a
+    user that is itself being deleted never inserts rows for it.
+    """
+    increments = [
+        (user_id, dimension, key, count, price)
+        for (dimension, key), (count, price) in changes.items() if count >= 0
+    ]
+    decrements = [
+        (dimension, key, count, price)
+        for (dimension, key), (count, price) in changes.items() if count < 0
+    ]
+
+    with connection.cursor() as cursor:
+        if increments:
+            values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(increments))
+            cursor.execute(
+                UPSERT_SQL.format(values=values),
+                [value for row in increments for value in row]
+            )
+        if decrements:
+            values = ', '.join(['(%s, %s, %s, %s)'] * len(decrements))
+            cursor.execute(
+                DECREMENT_SQL.format(values=values),
+                [value for row in decrements for value in row] + [user_id]
+            )
+
+
+def record_created(bovids):
+    """Count newly created bovids, eg after a bulk_create"""
+    by_user = defaultdict(dict)
+    for bovid in bovids:
+        merge(by_user[bovid.user_id], changes_for(bovid_values(bovid)))
+
+    for user_id, changes in by_user.items():
+        apply_changes(user_id, changes)
+
+
+def rebuild(user_ids=None):
+    """Recompute the statistics of the given users (or everyone) with
+    grouped queries over their bovids
+    """
+    bovids = Bovid.objects.all()
+    statistics = HerdStatistic.objects.all()
+    if user_ids is not None:
+        bovids = bovids.filter(user_id__in=user_ids)
+        statistics = statistics.filter(user_id__in=user_ids)
+
+    groups = (
+        ('status', bovids.annotate_status('key')),
+        ('type_of_bovid', bovids.living().annotate(key=F('type_of_bovid'))),
+        ('breed', bovids.living().annotate(key=F('breed'))),
+        ('birth_month', bovids.filter(date_of_birth__isnull=False).annotate(
+            key=TruncMonth('date_of_birth')
+        )),
+    )
+
+    rows = []
+    for dimension, queryset in groups:
+        totals = queryset.values('user_id', 'key').annotate(
+            total=Count('id'),
+            price_total=Sum('price')
+        ).order_by()
+        for total in totals:
+            key = total['key']
+            if dimension == 'birth_month':
+                key = key.strftime('%Y-%m')
+            rows.append(HerdStatistic(
+                user_id=total['user_id'],
+                dimension=dimension,
+                key=key,
+                count=total['total'],
+                price_total=total['price_total'] or 0
+            ))
+
+    with transaction.atomic():
+        statistics.delete()
+        HerdStatistic.objects.bulk_create(rows, batch_size=1000)
+
+    return len(rows)
+
+
+def summary(user):
+    """Return the dashboard statistics of a user's herd"""
+    totals = defaultdict(dict)
+    for row in HerdStatistic.objects.filter(user=user, count__gt=0):
+        totals[row.dimension][row.key] = row
+
+    status = {
+        key: totals['status'][key].count if key in totals['status'] else 0
+        for key in ('alive', 'sold', 'dead')
+    }
+    alive = totals['status'].get('alive')
+    price_total = alive.price_total if alive else Decimal('0.00')
+    price_average = None
+    if alive:
+        price_average = str(
+            (price_total / alive.count).quantize(Decimal('0.01'))
+        )
+
+    return {
+        'total': sum(status.values()),
+        'alive': status['alive'],
+        'sold': status['sold'],
+        'dead': status['dead'],
+        'price_total': str(price_total),
+        'price_average': price_average,
+        'by_type': {
+            key: row.count for key, row in totals['type_of_bovid'].items()
+        },
+        'by_breed': {
+            key: row.count for key, row in totals['breed'].items()
+        },
+        'births_per_month': {
+            key: totals['birth_month'][key].count
+            for key in sorted(totals['birth_month'])
+        },
+    }
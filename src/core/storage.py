@@ -0,0 +1,74 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def file_sha256(content):
+    """Return the SHA-256 hex digest of a Django File, reading it in
+    chunks.
+
+    Uploads that went through cattle.uploads.HashingFileUploadHandler
+    were hashed while they streamed in and are not read again.
+    """
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+
+    sha256 = hashlib.sha256()
+    for chunk in content.chunks():
+        sha256.update(chunk)
+    content.seek(0)
+
+    return sha256.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage for names derived from the file contents.
+
+    Saving a name that already exists keeps the existing (identical)
+    file, so every distinct image is stored once. New files are moved
+    or written next to their final path and renamed into place, so a
+    concurrent save of the same content never leaves a partial file.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        """Return the name unchanged, an existing file has the same
+        contents
+        """
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            # Mark the file as used again, see core.images.collect_garbage
+            os.utime(full_path)
+            return name
+
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                os.close(fd)
+                file_move_safe(
+                    content.temporary_file_path(),
+                    temp_path,
+                    allow_overwrite=True
+                )
+            else:
+                with os.fdopen(fd, 'wb') as destination:
+                    for chunk in content.chunks():
+                        destination.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return name
@@ -0,0 +1,29 @@
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class QueryDetectorRunner(DiscoverRunner):
+    """Test runner failing requests that run N+1 or duplicate queries,
+    with the file caches in a temporary directory
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.test_settings = override_settings(
+            QUERY_DETECTOR='raise',
+            CACHES={
+                alias: dict(cache, LOCATION=self.cache_dir.name)
+                if cache['BACKEND'].endswith('FileBasedCache') else cache
+                for alias, cache in settings.CACHES.items()
+            }
+        )
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        self.cache_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
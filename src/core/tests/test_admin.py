@@ -3,8 +3,11 @@ from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import Client
 
+from core.models import Bovid, LifeEvent
+from core.tests.utils import QueryBudgetMixin
 
-class AdminSiteTests(TestCase):
+
+class AdminSiteTests(QueryBudgetMixin, TestCase):
 
     def setUp(self):
         self.client = Client()
@@ -40,3 +43,28 @@ class AdminSiteTests(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+    def test_life_events_listed_in_constant_queries(self):
+        """Test the life event list does not query each bovid and user"""
+        url = reverse('admin:core_lifeevent_changelist')
+
+        def add_events():
+            for i in range(5):
+                cow = Bovid.objects.create(
+                    user=self.user,
+                    type_of_bovid='koei',
+                    name=f'koei {i}'
+                )
+                LifeEvent.objects.create(
+                    user=self.user,
+                    bovid=cow,
+                    event_type='weighed',
+                    event_date='2019-12-01'
+                )
+
+        add_events()
+        self.assertQueryBudget(
+            10,
+            lambda: self.client.get(url),
+            add_events
+        )
@@ -0,0 +1,100 @@
+import multiprocessing
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from core.cache import HerdCache
+from core.models import Bovid, Tag, LifeEvent
+
+
+class HerdCacheTests(TestCase):
+    """Test the versioned herd cache"""
+
+    def setUp(self):
+        self.cache = HerdCache(size=2, timeout=60, alias='default')
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrown.com',
+            'testpass'
+        )
+
+    def test_bump_retires_entries(self):
+        """Test entries are not read after the user's version is bumped"""
+        key = self.cache.key(self.user.pk, 'tags')
+        self.cache.set(key, ['a'])
+        self.assertEqual(self.cache.get(key), ['a'])
+
+        self.cache.bump(self.user.pk)
+
+        self.assertNotEqual(self.cache.key(self.user.pk, 'tags'), key)
+
+    def test_writes_bump_version(self):
+        """Test bovid, tag, tagging and life event writes bump the version"""
+        versions = [self.cache.version(self.user.pk)]
+        bovid = Bovid.objects.create(
+            user=self.user,
+            type_of_bovid='koei',
+            name='Bessie'
+        )
+        versions.append(self.cache.version(self.user.pk))
+        tag = Tag.objects.create(user=self.user, name='Dip')
+        versions.append(self.cache.version(self.user.pk))
+        bovid.tags.add(tag)
+        versions.append(self.cache.version(self.user.pk))
+        LifeEvent.objects.create(
+            user=self.user,
+            bovid=bovid,
+            event_type='weighed',
+            event_date='2019-11-01'
+        )
+        versions.append(self.cache.version(self.user.pk))
+
+        self.assertEqual(len(set(versions)), 5)
+
+    def test_least_recently_used_evicted(self):
+        """Test each process keeps at most size entries"""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+
+        self.assertEqual(list(self.cache._entries), ['a', 'c'])
+        self.assertEqual(self.cache.stats()['entries'], 2)
+
+    def test_shared_entries(self):
+        """Test another process reads entries from the Django cache"""
+        other = HerdCache(size=2, timeout=60, alias='default')
+        key = self.cache.key(self.user.pk, 'bovid', 1)
+        self.cache.set(key, {'id': 1})
+
+        self.assertEqual(other.get(key), {'id': 1})
+        self.assertEqual(other.get(key), {'id': 1})
+        self.assertIsNone(other.get(key + ':nope'))
+        self.assertEqual(other.stats()['hits'], 1)
+        self.assertEqual(other.stats()['shared_hits'], 1)
+        self.assertEqual(other.stats()['misses'], 1)
+
+    def test_versions_shared_between_processes(self):
+        """Test a version bumped in a forked worker retires entries here"""
+        key = self.cache.key(self.user.pk, 'tags')
+        worker = multiprocessing.get_context('fork').Process(
+            target=self.cache.bump,
+            args=(self.user.pk,)
+        )
+        worker.start()
+        worker.join()
+
+        self.assertEqual(worker.exitcode, 0)
+        self.assertNotEqual(self.cache.key(self.user.pk, 'tags'), key)
+
+    @patch('time.monotonic')
+    def test_entries_expire(self, monotonic):
+        """Test local entries are dropped after the timeout"""
+        monotonic.return_value = 100
+        self.cache.set('a', 1)
+        self.cache.shared.delete('a')
+
+        monotonic.return_value = 159
+        self.assertEqual(self.cache.get('a'), 1)
+        monotonic.return_value = 161
+        self.assertIsNone(self.cache.get('a'))
@@ -1,9 +1,22 @@
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import skipUnless
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.db.utils import OperationalError
 from django.test import TestCase
 
+from core.management.commands.benchmark_api import percentile
+from core.management.commands.import_herd import read_rows, stage_value
+from core.models import Bovid, HerdStatistic, LifeEvent, Tag
+
 
 class CommandsTestCase(TestCase):
 
@@ -23,3 +36,353 @@ class CommandsTestCase(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+
+BOVIDS_CSV = """id,mother,father,type_of_bovid,name,price,date_of_birth,tags
+1,,,koei,Bessie,12.50,2015-01-01,Dip|Brand
+2,1,,kalf,Kleintjie,,2018-06-01,Dip
+2,1,,kalf,Kleintjie,,2018-06-02,Dip
+"""
+
+EVENTS_NDJSON = [
+    {'id': 'e1', 'bovid': '1', 'event_type': 'birth',
+     'event_date': '2015-01-01'},
+    {'id': 'e2', 'bovid': '2', 'event_type': 'birth',
+     'event_date': '2018-06-01', 'notes': 'twin'},
+    {'bovid': '2', 'event_type': 'weighed', 'event_date': '2018-07-01'},
+    {'bovid': '99', 'event_type': 'weighed', 'event_date': '2018-07-01'},
+]
+
+
+class TemporaryFilesMixin:
+    """Give each test a temporary directory to write import files to"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, content):
+        """Write a file to the temporary directory and return its path"""
+        path = os.path.join(self.directory.name, name)
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(path, 'wt') as source:
+            source.write(content)
+
+        return path
+
+
+class ImportFilesTests(TemporaryFilesMixin, TestCase):
+    """Test reading import files"""
+
+    def test_read_csv_and_gzipped_ndjson(self):
+        """Test rows are read from CSV and gzipped NDJSON files"""
+        csv_rows = list(read_rows(self.write('bovids.csv', BOVIDS_CSV)))
+        ndjson = '\n'.join(json.dumps(row) for row in EVENTS_NDJSON)
+        json_rows = list(read_rows(self.write('events.ndjson.gz', ndjson)))
+
+        self.assertEqual(len(csv_rows), 3)
+        self.assertEqual(csv_rows[0]['tags'], 'Dip|Brand')
+        self.assertEqual(json_rows, EVENTS_NDJSON)
+
+    def test_stage_value(self):
+        """Test values are converted to COPY CSV text"""
+        self.assertEqual(stage_value({'id': 7}, 'ref'), '7')
+        self.assertEqual(stage_value({'dam': 3}, 'mother'), '3')
+        self.assertEqual(stage_value({'tags': ['a', 'b']}, 'tags'), 'a|b')
+        self.assertEqual(stage_value({'price': None}, 'price'), '')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'COPY needs PostgreSQL')
+class ImportHerdCommandTests(TemporaryFilesMixin, TestCase):
+    """Test the import_herd command"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+        self.bovids = self.write('bovids.csv', BOVIDS_CSV)
+        self.events = self.write('events.ndjson', '\n'.join(
+            json.dumps(row) for row in EVENTS_NDJSON
+        ))
+
+    def import_herd(self, *args):
+        """Run the import for the test user and return its output"""
+        out = StringIO()
+        call_command(
+            'import_herd',
+            self.user.email,
+            '--bovids', self.bovids,
+            '--events', self.events,
+            '--batch-size', '2',
+            *args,
+            stdout=out
+        )
+
+        return out.getvalue()
+
+    def test_import_herd(self):
+        """Test bovids, tags, parents and events are imported"""
+        self.import_herd()
+
+        calf = Bovid.objects.get(user=self.user, import_ref='2')
+        self.assertEqual(calf.mothers_name, 'Bessie')
+        self.assertEqual(calf.dam.import_ref, '1')
+        self.assertEqual(str(calf.date_of_birth), '2018-06-02')
+        self.assertEqual(
+            sorted(calf.tags.values_list('name', flat=True)),
+            ['Dip']
+        )
+        cow = Bovid.objects.get(user=self.user, import_ref='1')
+        self.assertEqual(str(cow.price), '12.50')
+        self.assertEqual(cow.tags.count(), 2)
+        self.assertEqual(self.user.tag_set.count(), 2)
+        self.assertEqual(LifeEvent.objects.filter(bovid=calf).count(), 2)
+        self.assertEqual(LifeEvent.objects.count(), 3)
+
+    def test_import_herd_is_idempotent(self):
+        """Test importing the same ids again updates instead of copying"""
+        self.import_herd()
+        self.import_herd()
+
+        self.assertEqual(Bovid.objects.count(), 2)
+        self.assertEqual(self.user.tag_set.count(), 2)
+        self.assertEqual(LifeEvent.objects.count(), 3)
+
+    def test_import_herd_twice_keeps_events_without_ids(self):
+        """Test events without an id are not copied by a second import"""
+        self.import_herd()
+        weighed = LifeEvent.objects.get(event_type='weighed')
+        self.import_herd()
+
+        self.assertEqual(LifeEvent.objects.count(), 3)
+        self.assertEqual(
+            LifeEvent.objects.get(event_type='weighed').pk,
+            weighed.pk
+        )
+        self.assertTrue(weighed.import_ref.startswith('#'))
+
+    def test_import_herd_dry_run(self):
+        """Test a dry run saves nothing"""
+        out = self.import_herd('--dry-run')
+
+        self.assertIn('Dry run', out)
+        self.assertFalse(Bovid.objects.exists())
+        self.assertFalse(LifeEvent.objects.exists())
+
+    def test_import_herd_resumes_from_checkpoint(self):
+        """Test a checkpoint skips the work that was already done"""
+        checkpoint = os.path.join(self.directory.name, 'checkpoint.json')
+        with open(checkpoint, 'w') as progress:
+            json.dump({
+                'user': self.user.email,
+                'bovids_file': self.bovids,
+                'events_file': self.events,
+                'bovids': False,
+                'events': 2,
+            }, progress)
+
+        out = self.import_herd('--checkpoint', checkpoint)
+
+        self.assertIn('Resuming', out)
+        self.assertEqual(Bovid.objects.count(), 2)
+        self.assertEqual(LifeEvent.objects.count(), 1)
+        with open(checkpoint) as progress:
+            self.assertEqual(json.load(progress)['events'], 4)
+
+
+class LinkPedigreeCommandTests(TestCase):
+    """Test the link_pedigree command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+
+    def sample_bovid(self, name, **params):
+        """Create a bovid of the test user"""
+        return Bovid.objects.create(
+            user=self.user,
+            type_of_bovid='koei',
+            name=name,
+            **params
+        )
+
+    def test_link_pedigree(self):
+        """Test unique names are linked and ambiguous ones are not"""
+        bessie = self.sample_bovid('Bessie', date_of_birth='2015-01-01')
+        calf = self.sample_bovid(
+            'Kalfie',
+            mothers_name=' bessie',
+            fathers_name='Bul',
+            date_of_birth='2018-01-01'
+        )
+        self.sample_bovid('Bul')
+        self.sample_bovid('Bul')
+        later = self.sample_bovid(
+            'Laat',
+            mothers_name='Kalfie',
+            date_of_birth='2017-01-01'
+        )
+        out = StringIO()
+
+        call_command('link_pedigree', stdout=out)
+
+        calf.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual(calf.dam, bessie)
+        self.assertIsNone(calf.sire)
+        self.assertIsNone(later.dam)
+        self.assertIn(
+            'Linked 1 parents, 1 names match several',
+            out.getvalue()
+        )
+
+    def test_link_pedigree_avoids_cycles(self):
+        """Test names that would make a bovid its own ancestor are skipped"""
+        first = self.sample_bovid('Een', mothers_name='Twee')
+        second = self.sample_bovid('Twee', mothers_name='Een')
+
+        call_command('link_pedigree', stdout=StringIO())
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(
+            [first.dam_id, second.dam_id].count(None),
+            1
+        )
+
+
+class SeedHerdCommandTests(TestCase):
+    """Test the seed_herd command"""
+
+    def seed(self, *args):
+        """Seed herds and return the command output"""
+        out = StringIO()
+        call_command('seed_herd', '--batch-size', '25', *args, stdout=out)
+
+        return out.getvalue()
+
+    def test_seed_herd(self):
+        """Test users get bovids with pedigrees, tags and events"""
+        out = self.seed('--users', '2', '--bovids', '60', '--events', '2',
+                        '--tags', '5')
+
+        self.assertIn('Seeded 2 users, 120 bovids, 10 tags', out)
+        user = get_user_model().objects.get(email='seed1@threecows.test')
+        self.assertTrue(user.check_password('seedpass'))
+        self.assertTrue(user.auth_token.key)
+        bovids = Bovid.objects.filter(user=user)
+        self.assertEqual(bovids.count(), 60)
+        self.assertEqual(Tag.objects.filter(user=user).count(), 5)
+        self.assertTrue(LifeEvent.objects.filter(user=user).exists())
+        self.assertTrue(HerdStatistic.objects.filter(user=user).exists())
+
+        calves = bovids.filter(dam__isnull=False).select_related('dam')
+        self.assertTrue(calves.exists())
+        for calf in calves:
+            self.assertEqual(calf.dam.user_id, user.id)
+            self.assertEqual(calf.mothers_name, calf.dam.name)
+            self.assertLess(calf.dam.date_of_birth, calf.date_of_birth)
+
+    def test_seed_herd_is_repeatable(self):
+        """Test the same seed gives the same herd"""
+        self.seed('--bovids', '30', '--prefix', 'een')
+        self.seed('--bovids', '30', '--prefix', 'twee')
+
+        def herd(prefix):
+            return list(Bovid.objects.filter(
+                user__email=f'{prefix}0@threecows.test'
+            ).order_by('import_ref').values_list(
+                'name', 'date_of_birth', 'mothers_name', 'price'
+            ))
+
+        self.assertEqual(herd('een'), herd('twee'))
+
+    def test_seed_herd_existing_user(self):
+        """Test seeding again with the same users fails"""
+        self.seed('--bovids', '5')
+
+        with self.assertRaises(CommandError):
+            self.seed('--bovids', '5')
+
+
+class BenchmarkApiCommandTests(TemporaryFilesMixin, TestCase):
+    """Test the benchmark_api command"""
+
+    def setUp(self):
+        super().setUp()
+        call_command('seed_herd', '--bovids', '40', '--events', '2',
+                     stdout=StringIO())
+
+    def benchmark(self, *args):
+        """Benchmark the seeded user and return the command output"""
+        out = StringIO()
+        call_command('benchmark_api', 'seed0@threecows.test',
+                     '--requests', '3', '--warmup', '1', *args, stdout=out)
+
+        return out.getvalue()
+
+    def test_percentile(self):
+        """Test percentiles interpolate between ranks"""
+        values = [10, 20, 30, 40, 50]
+
+        self.assertEqual(percentile(values, 50), 30)
+        self.assertEqual(percentile(values, 95), 48)
+        self.assertEqual(percentile(values, 100), 50)
+        self.assertEqual(percentile([7], 99), 7)
+
+    def test_benchmark_writes_results(self):
+        """Test every scenario is measured and written as JSON"""
+        output = os.path.join(self.directory.name, 'results.json')
+
+        self.benchmark('--output', output)
+
+        with open(output) as results_file:
+            results = json.load(results_file)
+        self.assertEqual(results['dataset']['bovids'], 40)
+        self.assertEqual(results['requests'], 3)
+        for name, result in results['scenarios'].items():
+            self.assertEqual(result['statuses'], {'200': 3}, name)
+            latency = result['latency_ms']
+            self.assertLessEqual(latency['p50'], latency['p99'])
+            self.assertGreater(result['throughput_rps'], 0)
+        self.assertGreater(
+            results['scenarios']['bovids']['queries_per_request'], 0
+        )
+
+    def test_benchmark_compare(self):
+        """Test a run is compared with earlier results"""
+        output = os.path.join(self.directory.name, 'results.json')
+        self.benchmark('--scenarios', 'bovids', 'tags', '--output', output)
+
+        out = self.benchmark('--scenarios', 'bovids', '--compare', output)
+
+        self.assertIn('Compared with', out)
+        self.assertRegex(out, r'bovids +p95 .* -> ')
+        self.assertNotRegex(out, r'tags +p95 .* -> ')
+
+    def test_benchmark_unknown_user(self):
+        """Test benchmarking a user that does not exist fails"""
+        with self.assertRaises(CommandError):
+            call_command('benchmark_api', 'nobody@threecows.test')
+
+
+class BenchmarkSerializersCommandTests(TestCase):
+    """Test the benchmark_serializers command"""
+
+    def test_benchmark_serializers(self):
+        """Test both serializers are timed and render the same"""
+        call_command('seed_herd', '--bovids', '30', '--events', '0',
+                     stdout=StringIO())
+        out = StringIO()
+
+        call_command('benchmark_serializers', 'seed0@threecows.test',
+                     '--rows', '20', '--repeat', '1', stdout=out)
+
+        self.assertIn('BovidValuesSerializer', out.getvalue())
+        self.assertIn('output identical: True', out.getvalue())
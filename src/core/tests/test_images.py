@@ -0,0 +1,232 @@
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core import images
+from core.cache import herd_cache
+from core.models import Bovid, StoredImage
+
+from cattle.serializers import BovidSerializer
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def sample_jpeg(size=(2000, 1000), orientation=None, color='red'):
+    """Return the bytes of a JPEG, optionally with an EXIF orientation"""
+    buffer = io.BytesIO()
+    options = {}
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        options['exif'] = exif.tobytes()
+    Image.new('RGB', size, color).save(buffer, 'JPEG', **options)
+
+    return buffer.getvalue()
+
+
+class RenderVariantsTests(TestCase):
+    """Test rendering image variants"""
+
+    def test_variant_sizes(self):
+        """Test each variant fits its size and keeps the aspect ratio"""
+        rendered = images.render_variants(io.BytesIO(sample_jpeg()))
+
+        sizes = {
+            (variant, extension): Image.open(io.BytesIO(content)).size
+            for variant, extension, content in rendered
+        }
+        self.assertEqual(sizes[('full', 'jpeg')], (1600, 800))
+        self.assertEqual(sizes[('card', 'webp')], (480, 240))
+        self.assertEqual(sizes[('thumb', 'jpeg')], (160, 80))
+        self.assertEqual(len(sizes), 6)
+
+    def test_orientation_applied_and_metadata_stripped(self):
+        """Test EXIF orientation is applied and no EXIF is kept"""
+        source = sample_jpeg(size=(400, 200), orientation=6)
+
+        for variant, extension, content in images.render_variants(
+                io.BytesIO(source)):
+            image = Image.open(io.BytesIO(content))
+            self.assertLess(image.size[0], image.size[1])
+            self.assertNotIn('exif', image.info)
+
+    def test_small_images_not_enlarged(self):
+        """Test images smaller than a variant are not scaled up"""
+        rendered = images.render_variants(io.BytesIO(sample_jpeg((100, 50))))
+
+        for variant, extension, content in rendered:
+            self.assertEqual(Image.open(io.BytesIO(content)).size, (100, 50))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class GenerateVariantsTests(TestCase):
+    """Test storing the variants of bovid images"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrown.com',
+            'testpass'
+        )
+        self.bovid = Bovid.objects.create(
+            user=self.user,
+            type_of_bovid='koei',
+            name='Bessie',
+            image=SimpleUploadedFile('koei.jpg', sample_jpeg())
+        )
+
+    def test_generate_variants(self):
+        """Test the variants are stored and exposed by the serializer"""
+        self.assertIsNone(BovidSerializer(self.bovid).data['image_variants'])
+        version = herd_cache.version(self.user.pk)
+
+        images.generate_variants(
+            self.bovid.id,
+            self.user.id,
+            self.bovid.image.name
+        )
+
+        self.bovid.refresh_from_db()
+        self.assertTrue(self.bovid.image_variants_ready)
+        self.assertNotEqual(herd_cache.version(self.user.pk), version)
+        variants = BovidSerializer(self.bovid).data['image_variants']
+        self.assertEqual(set(variants), {'thumb', 'card', 'full'})
+        self.assertTrue(variants['thumb']['webp'].endswith('/thumb.webp'))
+        storage = images.image_storage()
+        name = images.variant_name(self.bovid.image.name, 'thumb', 'webp')
+        self.assertTrue(storage.exists(name))
+
+    def test_replaced_image_not_marked_ready(self):
+        """Test variants of an image replaced meanwhile are not marked ready"""
+        old_name = self.bovid.image.name
+        self.bovid.image = SimpleUploadedFile(
+            'nuut.jpg',
+            sample_jpeg(color='blue')
+        )
+        self.bovid.save()
+
+        images.generate_variants(self.bovid.id, self.user.id, old_name)
+
+        self.bovid.refresh_from_db()
+        self.assertFalse(self.bovid.image_variants_ready)
+
+    def test_generate_image_variants_command(self):
+        """Test the command generates missing variants"""
+        out = StringIO()
+        call_command('generate_image_variants', stdout=out)
+
+        self.bovid.refresh_from_db()
+        self.assertTrue(self.bovid.image_variants_ready)
+        self.assertIn('variants of 1 images', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ImageReferenceTests(TestCase):
+    """Test sharing and collecting content-addressed image files"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrown.com',
+            'testpass'
+        )
+
+    def sample_bovid(self, content, name='koei.jpg'):
+        """Create a bovid with an image"""
+        return Bovid.objects.create(
+            user=self.user,
+            type_of_bovid='koei',
+            name='Bessie',
+            image=SimpleUploadedFile(name, content)
+        )
+
+    def refcount(self, name):
+        """Return the reference count of an image file"""
+        return StoredImage.objects.get(name=name).refcount
+
+    def test_identical_images_share_a_file(self):
+        """Test identical uploads are stored once and counted twice"""
+        content = sample_jpeg((20, 20))
+        first = self.sample_bovid(content)
+        second = self.sample_bovid(content, name='ander.jpg')
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.refcount(first.image.name), 2)
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(directory), [
+            os.path.basename(first.image.name)
+        ])
+
+    def test_references_follow_image_changes(self):
+        """Test replacing and deleting images moves the references"""
+        bovid = self.sample_bovid(sample_jpeg((20, 20)))
+        old_name = bovid.image.name
+
+        bovid.image = SimpleUploadedFile('nuut.jpg', sample_jpeg((30, 30)))
+        bovid.save()
+        self.assertEqual(self.refcount(old_name), 0)
+        self.assertEqual(self.refcount(bovid.image.name), 1)
+
+        bovid.delete()
+        self.assertEqual(self.refcount(bovid.image.name), 0)
+
+    def test_collect_garbage(self):
+        """Test only unused files past the minimum age are deleted"""
+        kept = self.sample_bovid(sample_jpeg((20, 20)))
+        removed = self.sample_bovid(sample_jpeg((30, 30)))
+        images.generate_variants(
+            removed.id,
+            self.user.id,
+            removed.image.name
+        )
+        path = removed.image.path
+        removed.delete()
+
+        self.assertEqual(images.collect_garbage(timedelta(hours=1)), [])
+        collected = images.collect_garbage(timedelta(seconds=-1))
+
+        self.assertEqual(collected, [removed.image.name])
+        self.assertFalse(os.path.exists(path))
+        storage = images.image_storage()
+        name = images.variant_name(removed.image.name, 'thumb', 'jpeg')
+        self.assertFalse(storage.exists(name))
+        self.assertTrue(os.path.exists(kept.image.path))
+        self.assertFalse(
+            StoredImage.objects.filter(name=removed.image.name).exists()
+        )
+
+    def test_collect_images_command_recount(self):
+        """Test the command can repair the reference counts first"""
+        bovid = self.sample_bovid(sample_jpeg((20, 20)))
+        StoredImage.objects.all().delete()
+        out = StringIO()
+
+        call_command(
+            'collect_images',
+            '--recount',
+            '--min-age=-1',
+            stdout=out
+        )
+
+        self.assertEqual(self.refcount(bovid.image.name), 1)
+        self.assertIn('Deleted 0 unused images', out.getvalue())
+        self.assertTrue(os.path.exists(bovid.image.path))
@@ -0,0 +1,191 @@
+import random
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from core import kinship
+from core.models import Bovid
+
+
+UNKNOWN = kinship.UNKNOWN
+
+
+def reference_relationship(dams, sires):
+    """Return the relationship matrix by the recursive definition, for
+    animals whose parents come before them
+    """
+    memo = {}
+
+    def relationship(first, second):
+        if first == UNKNOWN or second == UNKNOWN:
+            return 0.0
+        if first < second:
+            first, second = second, first
+        if (first, second) not in memo:
+            dam, sire = dams[first], sires[first]
+            if first == second:
+                value = 1 + 0.5 * relationship(dam, sire)
+            else:
+                value = 0.5 * (relationship(dam, second) +
+                               relationship(sire, second))
+            memo[first, second] = value
+        return memo[first, second]
+
+    return [
+        [relationship(first, second) for second in range(len(dams))]
+        for first in range(len(dams))
+    ]
+
+
+def relationships_of(ids, dams, sires):
+    """Return the Kinship of a pedigree, its relationships by bovid id"""
+    return kinship.Kinship(kinship.Pedigree(ids, dams, sires)).relationship
+
+
+class RelationshipTests(TestCase):
+    """Test computing additive relationships"""
+
+    def test_known_relationships(self):
+        """Test textbook relationships and inbreeding coefficients"""
+        # 1, 2 and 3 founders; 4, 5 full sibs of 1 x 2; 6 of 3 x 2 a half
+        # sib; 7 a calf of the full sibs; 8 of 7 back to its sire 5
+        relationship = relationships_of(
+            [1, 2, 3, 4, 5, 6, 7, 8],
+            [UNKNOWN, UNKNOWN, UNKNOWN, 0, 0, 2, 3, 6],
+            [UNKNOWN, UNKNOWN, UNKNOWN, 1, 1, 1, 4, 4]
+        )
+
+        self.assertEqual(relationship(1, 2), 0)
+        self.assertEqual(relationship(1, 4), 0.5)
+        self.assertEqual(relationship(4, 5), 0.5)
+        self.assertEqual(relationship(4, 6), 0.25)
+        self.assertEqual(relationship(7, 7), 1.25)
+        self.assertAlmostEqual(relationship(8, 8), 1 + 0.5 * 0.75)
+
+    def test_parents_listed_after_offspring(self):
+        """Test animals are reordered so parents are computed first"""
+        relationship = relationships_of(
+            [30, 20, 10],
+            [1, 2, UNKNOWN],
+            [UNKNOWN, UNKNOWN, UNKNOWN]
+        )
+
+        self.assertEqual(relationship(30, 10), 0.25)
+        self.assertEqual(relationship(30, 20), 0.5)
+
+    def test_matches_recursive_definition(self):
+        """Test relationships and whole rows on a random pedigree"""
+        rng = random.Random(7)
+        dams, sires = [], []
+        for animal in range(150):
+            dams.append(rng.randrange(animal) if animal > 10 else UNKNOWN)
+            sires.append(rng.randrange(animal) if animal > 10 else UNKNOWN)
+        # Listed youngest first so the pedigree has to sort them
+        ids = list(range(150, 0, -1))
+        expected = reference_relationship(dams, sires)
+
+        herd = kinship.Kinship(kinship.Pedigree(
+            ids,
+            [len(ids) - 1 - dam if dam != UNKNOWN else UNKNOWN
+             for dam in dams][::-1],
+            [len(ids) - 1 - sire if sire != UNKNOWN else UNKNOWN
+             for sire in sires][::-1]
+        ))
+
+        for first in range(150):
+            row = herd.relationships(first + 1)
+            for second in range(150):
+                self.assertAlmostEqual(
+                    herd.relationship(first + 1, second + 1),
+                    expected[first][second]
+                )
+                self.assertAlmostEqual(
+                    row[herd.positions[second + 1]],
+                    expected[first][second]
+                )
+
+    def test_cycles_are_broken(self):
+        """Test a pedigree with a cycle still gives relationships"""
+        relationship = relationships_of([1, 2, 3], [1, 0, 0], [UNKNOWN] * 3)
+
+        self.assertEqual(relationship(1, 1), 1)
+        self.assertEqual(relationship(3, 1), 0.5)
+
+
+class HerdKinshipTests(TestCase):
+    """Test loading and caching herd kinships"""
+
+    def setUp(self):
+        kinship.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+
+    def tearDown(self):
+        kinship.clear()
+
+    def sample_bovid(self, name, **params):
+        """Create a bovid of the test user"""
+        return Bovid.objects.create(
+            user=self.user,
+            type_of_bovid='koei',
+            name=name,
+            **params
+        )
+
+    def test_parent_names(self):
+        """Test parents named but not linked are matched by name"""
+        mother = self.sample_bovid('Ma', date_of_birth=date(2015, 1, 1))
+        first = self.sample_bovid(
+            'Een',
+            mothers_name=' ma ',
+            fathers_name='Buurman se Bul'
+        )
+        second = self.sample_bovid('Twee', fathers_name='Buurman se  bul')
+        third = self.sample_bovid(
+            'Drie',
+            mothers_name='Ma',
+            date_of_birth=date(2014, 1, 1)
+        )
+
+        herd = kinship.herd_kinship(self.user.pk)
+
+        self.assertEqual(herd.relationship(mother.pk, first.pk), 0.5)
+        # Half sibs through a bull that is not in the herd
+        self.assertEqual(herd.relationship(first.pk, second.pk), 0.25)
+        # Born before the only Ma, so not hers
+        self.assertEqual(herd.relationship(mother.pk, third.pk), 0)
+
+    def test_cached_until_herd_changes(self):
+        """Test the kinship is computed once per herd version"""
+        dam = self.sample_bovid('Ma')
+        calf = self.sample_bovid('Kalf')
+        herd = kinship.herd_kinship(self.user.pk)
+
+        with self.assertNumQueries(0):
+            self.assertIs(kinship.herd_kinship(self.user.pk), herd)
+        self.assertEqual(herd.relationship(dam.pk, calf.pk), 0)
+
+        calf.dam = dam
+        calf.save()
+        herd = kinship.herd_kinship(self.user.pk)
+
+        self.assertEqual(herd.relationship(dam.pk, calf.pk), 0.5)
+
+    def test_other_herds_excluded(self):
+        """Test another user's bovids are not in the kinship"""
+        other = get_user_model().objects.create_user(
+            'other@holmegrownsoftware.com',
+            'testpass'
+        )
+        bovid = Bovid.objects.create(
+            user=other,
+            type_of_bovid='koei',
+            name='Ander'
+        )
+
+        herd = kinship.herd_kinship(self.user.pk)
+
+        self.assertNotIn(bovid.pk, herd.positions)
@@ -0,0 +1,190 @@
+import multiprocessing
+import os
+import re
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.metrics import RETIRED, MetricsRegistry, RequestTimer, \
+                         exposition, merge, metrics
+from core.models import Bovid
+
+
+BOVIDS_URL = reverse('cattle:bovid-list')
+METRICS_URL = reverse('metrics')
+BOVIDS_COUNT = (
+    'threecows_request_duration_seconds_count{method="GET",'
+    'route="cattle:bovid-list",status="2xx"}'
+)
+
+
+def observe_in_child(count):
+    """Record requests in a forked worker and write them out"""
+    for _ in range(count):
+        metrics.record('cattle:bovid-list', 'GET', 200, RequestTimer(), 0.2)
+    metrics.flush()
+
+
+class RequestMetricsTests(TestCase):
+    """Test the Server-Timing header and the /metrics/ endpoint"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.old_directory = metrics.directory
+        metrics.directory = self.directory.name
+        metrics.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.scraper = Client()
+        self.scraper.force_login(get_user_model().objects.create_user(
+            'staff@holmegrownsoftware.com',
+            'testpass',
+            is_staff=True
+        ))
+
+    def tearDown(self):
+        metrics.clear()
+        metrics.directory = self.old_directory
+        self.directory.cleanup()
+
+    def sample_count(self, text, sample):
+        """Return the value of a sample in an exposition"""
+        found = re.search(re.escape(sample) + r' (\S+)', text)
+        self.assertIsNotNone(found, f'{sample} not in\n{text}')
+
+        return float(found.group(1))
+
+    def test_server_timing_header(self):
+        """Test responses carry their total, database and render times"""
+        Bovid.objects.create(user=self.user, name='Daisy',
+                             type_of_bovid='koei')
+
+        res = self.client.get(BOVIDS_URL)
+
+        self.assertRegex(
+            res['Server-Timing'],
+            r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries", '
+            r'render;dur=[\d.]+$'
+        )
+
+    @override_settings(SERVER_TIMING=False)
+    def test_server_timing_disabled(self):
+        """Test the header can be turned off"""
+        res = self.client.get(BOVIDS_URL)
+
+        self.assertNotIn('Server-Timing', res)
+
+    def test_route_histograms(self):
+        """Test requests are counted per route in Prometheus format"""
+        self.client.get(BOVIDS_URL)
+        self.client.get(BOVIDS_URL)
+        self.client.get('/no/such/page/')
+
+        res = self.scraper.get(METRICS_URL)
+        text = res.content.decode()
+
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        self.assertIn(
+            '# TYPE threecows_request_duration_seconds histogram', text
+        )
+        labels = 'method="GET",route="cattle:bovid-list"'
+        self.assertEqual(self.sample_count(
+            text,
+            f'threecows_request_duration_seconds_count{{{labels},'
+            f'status="2xx"}}'
+        ), 2)
+        self.assertEqual(self.sample_count(
+            text,
+            f'threecows_db_queries_bucket{{{labels},le="+Inf"}}'
+        ), 2)
+        self.assertGreater(self.sample_count(
+            text, f'threecows_db_queries_sum{{{labels}}}'
+        ), 0)
+        self.assertEqual(self.sample_count(
+            text,
+            'threecows_request_duration_seconds_count{method="GET",'
+            'route="unmatched",status="4xx"}'
+        ), 1)
+
+    def test_merges_worker_processes(self):
+        """Test /metrics/ adds up the requests of forked workers"""
+        self.client.get(BOVIDS_URL)
+        context = multiprocessing.get_context('fork')
+        worker = context.Process(target=observe_in_child, args=(3,))
+        worker.start()
+        worker.join()
+        self.assertEqual(worker.exitcode, 0)
+
+        text = self.scraper.get(METRICS_URL).content.decode()
+
+        self.assertEqual(self.sample_count(text, BOVIDS_COUNT), 4)
+
+    def test_stopped_workers_retired(self):
+        """Test the files of stopped workers are folded into one, and a
+        reused PID does not replace a stopped worker's counts
+        """
+        context = multiprocessing.get_context('fork')
+        worker = context.Process(target=observe_in_child, args=(3,))
+        worker.start()
+        worker.join()
+        earlier = MetricsRegistry(self.directory.name, 1.0)
+        earlier.started = 1
+        for _ in range(2):
+            earlier.record('cattle:bovid-list', 'GET', 200, RequestTimer(),
+                           0.2)
+        earlier.flush()
+
+        for _ in range(2):
+            text = exposition(metrics.collect())
+            self.assertEqual(self.sample_count(text, BOVIDS_COUNT), 5)
+
+        self.assertEqual(
+            sorted(os.listdir(self.directory.name)),
+            sorted([RETIRED, 'retire.lock', os.path.basename(earlier.path),
+                    os.path.basename(metrics.path)])
+        )
+
+    def test_metrics_staff_only(self):
+        """Test only staff users can read /metrics/ without a token"""
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 403)
+
+        res = self.scraper.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+
+    @override_settings(METRICS_TOKEN='scrape')
+    def test_metrics_token(self):
+        """Test a configured bearer token is required"""
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 401)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer scrape')
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_exposition_buckets(self):
+        """Test buckets are cumulative and bounded by the count"""
+        metrics.observe('db_queries', {'route': 'r'}, 2)
+        metrics.observe('db_queries', {'route': 'r'}, 7)
+        metrics.observe('db_queries', {'route': 'r'}, 1000)
+
+        text = exposition(merge([metrics.snapshot()]))
+
+        self.assertIn('threecows_db_queries_bucket{route="r",le="2"} 1', text)
+        self.assertIn('threecows_db_queries_bucket{route="r",le="10"} 2', text)
+        self.assertIn(
+            'threecows_db_queries_bucket{route="r",le="200"} 2', text
+        )
+        self.assertIn(
+            'threecows_db_queries_bucket{route="r",le="+Inf"} 3', text
+        )
+        self.assertIn('threecows_db_queries_sum{route="r"} 1009.0', text)
@@ -1,6 +1,7 @@
 import datetime
+import hashlib
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
-from unittest.mock import patch
 from django.contrib.auth import get_user_model
 
 from core import models
@@ -85,12 +86,12 @@ class ModelTests(TestCase):
         )
         self.assertEqual(str(event), event.event_type)
 
-    @patch('uuid.uuid4')
-    def test_bovid_file_name_uuid(self, mock_uuid):
-        """Test that image is saved in the correct location"""
-        uuid = 'test-uuid'
-        mock_uuid.return_value = uuid
-        file_path = models.bovid_image_file_path(None, 'myimage.jpg')
+    def test_bovid_file_name_content_hash(self):
+        """Test that image is saved under the hash of its contents"""
+        bovid = models.Bovid(image=SimpleUploadedFile('myimage.JPG', b'koei'))
+        digest = hashlib.sha256(b'koei').hexdigest()
 
-        exp_path = f'uploads/bovid/{uuid}.jpg'
+        file_path = models.bovid_image_file_path(bovid, 'myimage.JPG')
+
+        exp_path = f'uploads/bovid/{digest[:2]}/{digest}.jpg'
         self.assertEqual(file_path, exp_path)
@@ -0,0 +1,143 @@
+import os
+import pstats
+import tempfile
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import RequestProfile
+from core.profiling import StackSampler
+
+
+BOVIDS_URL = reverse('cattle:bovid-list')
+
+
+def busy(seconds):
+    """Keep the thread running Python code for some seconds"""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(100))
+
+
+class RequestProfilingTests(TestCase):
+    """Test profiling the requests of staff users"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = override_settings(PROFILE_DIR=self.directory.name)
+        self.settings.enable()
+        self.staff = get_user_model().objects.create_user(
+            'staff@holmegrownsoftware.com',
+            'testpass',
+            is_staff=True
+        )
+        self.client = APIClient()
+        token = Token.objects.create(user=self.staff)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def tearDown(self):
+        self.settings.disable()
+        self.directory.cleanup()
+
+    def test_profile_staff_request(self):
+        """Test a staff request with the header is profiled to disk"""
+        res = self.client.get(BOVIDS_URL, HTTP_X_PROFILE='1')
+
+        self.assertEqual(res.status_code, 200)
+        profile = RequestProfile.objects.get()
+        self.assertEqual(res['X-Profile-Id'], str(profile.id))
+        self.assertEqual(profile.user, self.staff)
+        self.assertEqual(profile.path, BOVIDS_URL)
+        self.assertEqual(profile.status, 200)
+        self.assertGreater(profile.duration, 0)
+        self.assertGreater(profile.queries, 0)
+        stats = pstats.Stats(profile.stats_path)
+        self.assertTrue(any(
+            function == 'list' for _, _, function in stats.stats
+        ))
+        with open(profile.stacks_path) as stacks:
+            for line in stacks:
+                self.assertRegex(line, r'^\S+(;\S+)* \d+$')
+
+    def test_profile_query_parameter(self):
+        """Test the query parameter asks for a profile as well"""
+        self.client.get(BOVIDS_URL, {'profile': '1'})
+
+        self.assertEqual(RequestProfile.objects.count(), 1)
+
+    def test_no_profile_for_others(self):
+        """Test requests of other users and unasked ones are not profiled"""
+        user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        res = client.get(BOVIDS_URL, HTTP_X_PROFILE='1')
+        self.client.get(BOVIDS_URL)
+        APIClient().get(BOVIDS_URL, HTTP_X_PROFILE='1')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn('X-Profile-Id', res)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILE_KEEP=2)
+    def test_profiles_are_a_ring(self):
+        """Test only the newest profiles and their files are kept"""
+        for _ in range(3):
+            self.client.get(BOVIDS_URL, HTTP_X_PROFILE='1')
+
+        profiles = list(RequestProfile.objects.order_by('id'))
+        self.assertEqual(len(profiles), 2)
+        self.assertEqual(
+            sorted(os.listdir(self.directory.name)),
+            sorted(
+                os.path.basename(path) for profile in profiles
+                for path in (profile.stats_path, profile.stacks_path)
+            )
+        )
+
+    def test_stack_sampler(self):
+        """Test the sampler counts stacks of the sampled thread"""
+        sampler = StackSampler(threading.get_ident(), 0.001)
+        sampler.start()
+        busy(0.05)
+        sampler.stop()
+
+        self.assertGreater(sum(sampler.stacks.values()), 0)
+        self.assertTrue(any(
+            stack.endswith('test_profiling:busy')
+            for stack in sampler.stacks
+        ))
+
+    def test_admin_lists_profiles(self):
+        """Test profiles are listed, shown and downloadable in the admin"""
+        self.client.get(BOVIDS_URL, HTTP_X_PROFILE='1')
+        profile = RequestProfile.objects.get()
+        admin = Client()
+        admin.force_login(get_user_model().objects.create_superuser(
+            'admin@holmegrownsoftware.com',
+            'testpass'
+        ))
+
+        res = admin.get(reverse('admin:core_requestprofile_changelist'))
+        self.assertContains(res, BOVIDS_URL)
+
+        res = admin.get(
+            reverse('admin:core_requestprofile_change', args=[profile.id])
+        )
+        self.assertContains(res, 'cumulative')
+
+        for kind in ('stats', 'stacks'):
+            res = admin.get(reverse('admin:core_requestprofile_download',
+                                    args=[profile.id, kind]))
+            self.assertEqual(res.status_code, 200)
+            self.assertIn('attachment', res['Content-Disposition'])
+            res.close()
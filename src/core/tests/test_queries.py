@@ -0,0 +1,119 @@
+import logging
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from cattle import serializers
+from cattle.views import BovidViewSet
+from core.models import Bovid, Tag
+from core.queries import QueryProblemsError, detect_queries, fingerprint
+from core.tests.utils import QueryBudgetMixin
+
+
+BOVIDS_URL = reverse('cattle:bovid-list')
+
+
+def without_prefetch(self, request):
+    """BovidViewSet.list_values serializing models without prefetching
+    their tags
+    """
+    return Response(serializers.BovidSerializer(
+        Bovid.objects.filter(user=request.user).order_by('-id'),
+        many=True
+    ).data)
+
+
+class QueryDetectorTests(QueryBudgetMixin, TestCase):
+    """Test detecting N+1 and duplicate queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrownsoftware.com',
+            'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        tag = Tag.objects.create(user=self.user, name='Dip')
+        for i in range(5):
+            bovid = Bovid.objects.create(
+                user=self.user,
+                type_of_bovid='koei',
+                name=f'Koei {i}'
+            )
+            bovid.tags.add(tag)
+
+    def test_fingerprint(self):
+        """Test statements differing only in values are equal"""
+        self.assertEqual(
+            fingerprint('SELECT * FROM "t" WHERE "a" = %s AND "b" IN '
+                        "(%s, %s) AND c = 'x''y' LIMIT 21"),
+            'SELECT * FROM "t" WHERE "a" = ? AND "b" IN (...) AND c = ? '
+            'LIMIT ?'
+        )
+        self.assertEqual(
+            fingerprint('SELECT "core_bovid"."id" FROM "core_bovid" '
+                        'WHERE "T3"."id" IN (%s)'),
+            'SELECT "core_bovid"."id" FROM "core_bovid" '
+            'WHERE "T3"."id" IN (...)'
+        )
+
+    def test_detect_n_plus_one(self):
+        """Test a query per row is found, with the line running it"""
+        with detect_queries(threshold=5) as detector:
+            for bovid in Bovid.objects.all():
+                list(bovid.tags.all())
+
+        problems = detector.problems()
+        self.assertEqual([problem.kind for problem in problems], ['N+1'])
+        self.assertEqual(problems[0].count, 5)
+        self.assertIn('list(bovid.tags.all())', ''.join(problems[0].stack))
+        self.assertIn('test_queries.py', detector.report())
+
+    def test_detect_duplicates(self):
+        """Test the same query with the same values run twice is found"""
+        with detect_queries(threshold=5) as detector:
+            Bovid.objects.filter(name='Koei 1').exists()
+            Bovid.objects.filter(name='Koei 1').exists()
+            Bovid.objects.filter(name='Koei 2').exists()
+
+        problems = detector.problems()
+        self.assertEqual([problem.kind for problem in problems],
+                         ['duplicate'])
+        self.assertEqual(problems[0].count, 2)
+        self.assertIn('Koei 1', problems[0].sql)
+
+    def test_serializers_have_no_problems(self):
+        """Test the bovid serializers query the rows once"""
+        bovids = Bovid.objects.prefetch_related('tags')
+
+        self.assertNoQueryProblems(
+            lambda: serializers.BovidSerializer(bovids, many=True).data
+        )
+        self.assertNoQueryProblems(
+            lambda: serializers.BovidDetailSerializer(bovids.first()).data
+        )
+
+    @patch.object(BovidViewSet, 'list_values', without_prefetch)
+    def test_request_fails(self):
+        """Test a request with N+1 queries fails when set to raise"""
+        with override_settings(QUERY_DETECTOR='raise'):
+            with self.assertRaises(QueryProblemsError) as raised:
+                self.client.get(BOVIDS_URL)
+
+        self.assertIn(f'GET {BOVIDS_URL}', str(raised.exception))
+        self.assertIn('N+1 query run 5 times', str(raised.exception))
+
+    @patch.object(BovidViewSet, 'list_values', without_prefetch)
+    def test_request_warns(self):
+        """Test a request with N+1 queries is logged when set to warn"""
+        with override_settings(QUERY_DETECTOR='warn'):
+            with self.assertLogs('core.queries', logging.WARNING) as logs:
+                res = self.client.get(BOVIDS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('N+1', logs.output[0])
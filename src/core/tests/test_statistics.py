@@ -0,0 +1,103 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from core import statistics
+from core.models import Bovid, HerdStatistic
+
+
+def sample_bovid(user, **params):
+    """Create and return a sample bovid"""
+    defaults = {
+        'type_of_bovid': 'koei',
+        'breed': 'Nguni',
+        'name': 'Bessie',
+        'price': '100.00',
+        'date_of_birth': '2019-01-15',
+    }
+    defaults.update(params)
+
+    return Bovid.objects.create(user=user, **defaults)
+
+
+def statistic_rows(user):
+    """Return the user's non-empty statistics as comparable tuples"""
+    return sorted(
+        HerdStatistic.objects.filter(user=user, count__gt=0).values_list(
+            'dimension', 'key', 'count', 'price_total'
+        )
+    )
+
+
+class HerdStatisticsTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@holmegrown.com',
+            'testpass'
+        )
+
+    def test_statistics_follow_saves_and_deletes(self):
+        """Test incremental statistics match a full rebuild"""
+        cow = sample_bovid(self.user)
+        sample_bovid(self.user, breed='Brahman', price='50.00')
+        calf = sample_bovid(self.user, date_of_birth='2019-02-01')
+        sample_bovid(self.user, date_sold='2019-06-01')
+
+        cow.date_of_death = '2019-07-01'
+        cow.save()
+        calf.breed = 'Brahman'
+        calf.price = '20.00'
+        calf.save()
+        Bovid.objects.filter(breed='Brahman', price=50).get().delete()
+
+        incremental = statistic_rows(self.user)
+        statistics.rebuild([self.user.id])
+        self.assertEqual(incremental, statistic_rows(self.user))
+
+    def test_summary(self):
+        """Test the dashboard summary of a herd"""
+        sample_bovid(self.user)
+        sample_bovid(self.user, breed='Brahman', price='50.00')
+        sample_bovid(self.user, date_of_death='2019-07-01')
+        sample_bovid(self.user, date_sold='2019-07-01', date_of_birth=None)
+
+        summary = statistics.summary(self.user)
+
+        self.assertEqual(summary['total'], 4)
+        self.assertEqual(summary['alive'], 2)
+        self.assertEqual(summary['sold'], 1)
+        self.assertEqual(summary['dead'], 1)
+        self.assertEqual(summary['price_total'], '150.00')
+        self.assertEqual(summary['price_average'], '75.00')
+        self.assertEqual(summary['by_type'], {'koei': 2})
+        self.assertEqual(summary['by_breed'], {'Nguni': 1, 'Brahman': 1})
+        self.assertEqual(summary['births_per_month'], {'2019-01': 3})
+
+    def test_summary_empty_herd(self):
+        """Test the summary of a user without bovids"""
+        summary = statistics.summary(self.user)
+
+        self.assertEqual(summary['total'], 0)
+        self.assertIsNone(summary['price_average'])
+
+    def test_summary_is_constant_queries(self):
+        """Test the summary reads one query regardless of herd size"""
+        for i in range(5):
+            sample_bovid(self.user, breed=f'breed {i}')
+
+        with self.assertNumQueries(1):
+            statistics.summary(self.user)
+
+    def test_rebuild_command(self):
+        """Test the rebuild command repairs the statistics"""
+        sample_bovid(self.user)
+        HerdStatistic.objects.update(count=42)
+        out = StringIO()
+
+        call_command('rebuild_herd_statistics', self.user.email, stdout=out)
+
+        self.assertIn('Rebuilt', out.getvalue())
+        self.assertEqual(statistics.summary(self.user)['alive'], 1)
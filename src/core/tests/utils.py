@@ -0,0 +1,62 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+from core.queries import detect_queries
+
+
+class QueryBudgetMixin:
+    """TestCase mixin asserting upper bounds on the SQL queries a request
+    issues, independent of how much data the user owns
+    """
+
+    def count_queries(self, func, using=DEFAULT_DB_ALIAS):
+        """Call func and return its result and the queries it issued"""
+        with CaptureQueriesContext(connections[using]) as context:
+            result = func()
+
+        return result, context.captured_queries
+
+    def assertQueryBudget(self, budget, func, grow=None,
+                          using=DEFAULT_DB_ALIAS):
+        """Assert func issues at most budget queries.
+
+        If grow is given it is called between two runs of func to add
+        more rows, and both runs must issue the same number of queries.
+        """
+        result, queries = self.count_queries(func, using)
+        self._assert_within_budget(budget, queries)
+        if grow is None:
+            return result
+
+        grow()
+        result, grown_queries = self.count_queries(func, using)
+        self._assert_within_budget(budget, grown_queries)
+        self.assertEqual(
+            len(queries), len(grown_queries),
+            'Query count grows with the data:\n%s' % '\n'.join(
+                query['sql'] for query in grown_queries
+            )
+        )
+
+        return result
+
+    def assertNoQueryProblems(self, func, threshold=None):
+        """Assert func runs no N+1 or duplicate queries, see
+        core.queries
+        """
+        with detect_queries(threshold) as detector:
+            result = func()
+        problems = detector.problems()
+        self.assertFalse(problems, detector.report(problems))
+
+        return result
+
+    def _assert_within_budget(self, budget, queries):
+        """Fail listing the queries if there are more than budget"""
+        self.assertLessEqual(
+            len(queries), budget,
+            '%d queries issued, budget is %d:\n%s' % (
+                len(queries), budget,
+                '\n'.join(query['sql'] for query in queries)
+            )
+        )
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+
+from core.metrics import exposition, metrics
+
+
+@require_GET
+def metrics_view(request):
+    """Serve the request histograms of all processes to Prometheus, or
+    to staff users signed in to the admin when no METRICS_TOKEN is set
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and not constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+    ):
+        return HttpResponse(status=401)
+    if not token and not request.user.is_staff:
+        return HttpResponse(status=403)
+
+    return HttpResponse(
+        exposition(metrics.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
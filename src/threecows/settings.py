@@ -48,11 +48,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.QueryDetectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.RequestProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -132,4 +135,89 @@ STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media/'
 STATIC_ROOT = '/vol/web/static/'
-AUTH_USER_MODEL = 'core.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'core.User'
+
+# Keyset pagination for the cattle API, see cattle/pagination.py
+CATTLE_PAGE_SIZE = 100
+CATTLE_MAX_PAGE_SIZE = 1000
+
+# Largest list accepted by the bulk bovid create endpoint
+CATTLE_BULK_CREATE_LIMIT = 5000
+
+# Token -> user cache of user.authentication.CachedTokenAuthentication. Set
+# AUTH_TOKEN_CACHE_ALIAS to a CACHES alias to share it between processes.
+AUTH_TOKEN_CACHE_SIZE = 1024
+AUTH_TOKEN_CACHE_TTL = 60
+AUTH_TOKEN_CACHE_ALIAS = None
+
+# A file cache in CACHE_DIR, so every process of the app sees the same
+# entries and herd data versions
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', '/vol/web/cache/'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+# Versioned cache of serialized bovid details and tag lists, see
+# core/cache.py. The CACHES alias must be shared by all processes, so a
+# version bump reaches them all; SIZE bounds each process's LRU in front.
+CATTLE_CACHE_ALIAS = 'default'
+CATTLE_CACHE_SIZE = 1024
+CATTLE_CACHE_TIMEOUT = 300
+
+# Threads generating bovid image thumbnails after upload, see core/images.py
+BOVID_IMAGE_WORKERS = 2
+
+# Largest accepted bovid image upload, in bytes
+BOVID_IMAGE_MAX_SIZE = 20 * 1024 * 1024
+
+# Resumable photo uploads, see cattle/uploads.py. Chunks are written into
+# part files in CHUNKED_UPLOAD_DIR, which should not be served publicly.
+CHUNKED_UPLOAD_DIR = '/vol/web/uploads/'
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_SESSION_TTL = 24 * 60 * 60
+
+# Generations returned by the pedigree endpoints by default and at most
+PEDIGREE_GENERATIONS = 10
+PEDIGREE_MAX_GENERATIONS = 50
+
+# Inbreeding and sire suggestions, see core/kinship.py. Each cached herd
+# takes about 100 bytes per animal, and computing one takes about 8 bytes
+# per CHUNK_SIZE relationship a few times over; SIRE_TYPES are the types
+# of bovid suggested as sires besides those that have sired calves.
+KINSHIP_CACHE_SIZE = 8
+KINSHIP_CHUNK_SIZE = 2 ** 19
+KINSHIP_SIRE_TYPES = ('bul', 'bull')
+KINSHIP_SIRES = 10
+KINSHIP_MAX_SIRES = 100
+
+# Most ids accepted by a list filter such as ?tags_all=
+CATTLE_MAX_FILTER_IDS = 100
+
+# Per-request timings, see core/middleware.py and core/metrics.py. Each
+# process writes its histograms to METRICS_DIR at most every
+# METRICS_FLUSH_INTERVAL seconds and /metrics/ merges them; the directory
+# must not be shared between hosts or containers. Prometheus must send
+# METRICS_TOKEN as a bearer token; without one only staff users signed
+# in to the admin can read /metrics/.
+SERVER_TIMING = True
+METRICS_DIR = os.environ.get('METRICS_DIR', '/vol/web/metrics/')
+METRICS_FLUSH_INTERVAL = 1.0
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Request profiles of staff users, see core/profiling.py. The newest
+# PROFILE_KEEP are kept in PROFILE_DIR and listed in the admin; stacks
+# are sampled every PROFILE_SAMPLE_INTERVAL seconds.
+PROFILE_DIR = '/vol/web/profiles/'
+PROFILE_KEEP = 50
+PROFILE_SAMPLE_INTERVAL = 0.005
+
+# N+1 and duplicate query detection, see core/queries.py. A request
+# running a SELECT QUERY_DETECTOR_THRESHOLD times with different values,
+# or twice with the same, is logged ('warn') or fails ('raise'). The
+# tests always raise, see core/tests/runner.py.
+QUERY_DETECTOR = 'warn' if DEBUG else None
+QUERY_DETECTOR_THRESHOLD = 5
+TEST_RUNNER = 'core.tests.runner.QueryDetectorRunner'
@@ -16,9 +16,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from core.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/user/', include('user.urls')),
     path('api-auth/', include('rest_framework.urls')),
     path('api/v1/cattle/', include('cattle.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 ]
@@ -0,0 +1,119 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+    """Process-local LRU of token key -> (user, token) with a TTL,
+    optionally backed by one of Django's caches so other processes
+    can share entries
+    """
+
+    def __init__(self, size, ttl, alias=None):
+        self.size = size
+        self.ttl = ttl
+        self.alias = alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        """Return the Django cache backing this cache, if any"""
+        return caches[self.alias] if self.alias else None
+
+    def shared_key(self, key):
+        """Return the Django cache key for a token, without the token"""
+        return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        """Return the cached (user, token) for a token key or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+        if self.shared is not None:
+            value = self.shared.get(self.shared_key(key))
+            if value is not None:
+                self._store(key, value, now)
+                return value
+
+        return None
+
+    def set(self, key, value):
+        """Cache the (user, token) of a token key"""
+        self._store(key, value, time.monotonic())
+        if self.shared is not None:
+            self.shared.set(self.shared_key(key), value, self.ttl)
+
+    def _store(self, key, value, now):
+        """Store an entry locally, evicting the least recently used"""
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys=(), user_id=None):
+        """Forget the given token keys and every token of a user"""
+        keys = set(keys)
+        with self._lock:
+            if user_id is not None:
+                keys.update(
+                    key for key, (expires, (user, token))
+                    in self._entries.items() if user.pk == user_id
+                )
+            for key in keys:
+                self._entries.pop(key, None)
+
+        if self.shared is not None and keys:
+            self.shared.delete_many([self.shared_key(key) for key in keys])
+
+    def clear(self):
+        """Forget every cached token"""
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(
+    size=getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 60),
+    alias=getattr(settings, 'AUTH_TOKEN_CACHE_ALIAS', None)
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that skips the token and user query for
+    recently seen tokens.
+
+    Entries are dropped when the token is deleted or its user is saved or
+    deleted (see user.signals). Other processes only see that through the
+    shared Django cache, so the TTL bounds how stale a local entry can be.
+    """
+    cache = token_cache
+
+    def authenticate_credentials(self, key):
+        cached = self.cache.get(key)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            self.cache.set(key, cached)
+
+        user, token = cached
+        # Each request gets its own copy, views may change request.user
+        user = copy.copy(user)
+        user._state = copy.copy(user._state)
+        user._state.fields_cache = {}
+
+        return (user, token)
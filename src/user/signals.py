@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from user.authentication import token_cache
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    """Drop a changed or deleted token from the token cache"""
+    token_cache.invalidate(keys=[instance.key], user_id=instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def forget_user_tokens(sender, instance, **kwargs):
+    """Drop the tokens of a changed, deactivated or deleted user"""
+    keys = []
+    if token_cache.shared is not None:
+        keys = Token.objects.filter(user_id=instance.pk).values_list(
+            'key',
+            flat=True
+        )
+    token_cache.invalidate(keys=keys, user_id=instance.pk)
@@ -0,0 +1,120 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import TokenCache, token_cache
+
+
+ME_URL = reverse('user:me')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test authenticating with cached tokens"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@holmegrown.com',
+            password='testpass',
+            name='fname',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_second_request_skips_auth_query(self):
+        """Test the token and user are only queried on the first request"""
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.data['email'], self.user.email)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_invalid_token(self):
+        """Test unknown tokens are rejected and not cached"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token nope')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIsNone(token_cache.get('nope'))
+
+    def test_deleted_token_is_forgotten(self):
+        """Test a deleted token stops working straight away"""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_forgotten(self):
+        """Test a deactivated user's token stops working straight away"""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_update_is_seen(self):
+        """Test changes made through the me endpoint are not served stale"""
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {'name': 'new name'})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'new name')
+
+
+class TokenCacheTests(TestCase):
+    """Test the token cache"""
+
+    def test_least_recently_used_evicted(self):
+        """Test the cache keeps at most size entries"""
+        cache = TokenCache(size=2, ttl=60)
+        cache.set('a', (None, 'a'))
+        cache.set('b', (None, 'b'))
+        cache.get('a')
+        cache.set('c', (None, 'c'))
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), (None, 'a'))
+        self.assertEqual(cache.get('c'), (None, 'c'))
+
+    @patch('time.monotonic')
+    def test_entries_expire(self, monotonic):
+        """Test entries are dropped after the TTL"""
+        cache = TokenCache(size=2, ttl=60)
+        monotonic.return_value = 100
+        cache.set('a', (None, 'a'))
+
+        monotonic.return_value = 159
+        self.assertIsNotNone(cache.get('a'))
+        monotonic.return_value = 161
+        self.assertIsNone(cache.get('a'))
+
+    def test_shared_cache(self):
+        """Test processes share entries through a Django cache"""
+        first = TokenCache(size=2, ttl=60, alias='default')
+        second = TokenCache(size=2, ttl=60, alias='default')
+
+        first.set('a', (None, 'a'))
+        self.assertEqual(second.get('a'), (None, 'a'))
+
+        first.invalidate(keys=['a'])
+        second.clear()
+        self.assertIsNone(second.get('a'))